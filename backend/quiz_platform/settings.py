@@ -35,7 +35,7 @@ INSTALLED_APPS = [
 MIDDLEWARE = [
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.security.SecurityMiddleware',
-    'whitenoise.middleware.WhiteNoiseMiddleware',  # Serve static files in production
+    'quiz_platform.middleware.WhiteNoiseMiddleware',  # Serve static files in production (WSGI and ASGI)
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -74,6 +74,85 @@ DATABASES = {
     )
 }
 
+# --- CACHE ---
+# Local memory per process by default; set REDIS_URL to share the cache between workers.
+# 'throttle' holds the rate limit buckets, so clearing 'default' does not reset them.
+if os.getenv('REDIS_URL'):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': os.getenv('REDIS_URL'),
+        },
+        'throttle': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': os.getenv('REDIS_URL'),
+            'KEY_PREFIX': 'throttle',
+        },
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        },
+        'throttle': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'LOCATION': 'throttle',
+        },
+    }
+
+# Seconds a quiz's answer key stays cached; keys are versioned so this only bounds memory
+ANSWER_KEY_CACHE_TIMEOUT = int(os.getenv('ANSWER_KEY_CACHE_TIMEOUT', 60 * 60))
+
+# Rendered JSON of the public quiz detail and list pages (quizzes.response_cache).
+# MAX_BYTES bounds each process's LRU tier, whose entries other workers' writes
+# can't reach, so they last LOCAL_TTL seconds (None: forever, for a single process).
+# SHARED names a cache alias for a tier all workers share, None for none.
+QUIZ_RESPONSE_CACHE = {
+    'MAX_BYTES': int(os.getenv('QUIZ_RESPONSE_CACHE_MAX_BYTES', 32 * 1024 * 1024)),
+    'LOCAL_TTL': 5,
+    'SHARED': 'default' if os.getenv('REDIS_URL') else None,
+    'SHARED_TTL': 60 * 60,
+}
+
+# In-process copies of the leaderboards as sorted lists (quizzes.leaderboard).
+# A board is reloaded TTL seconds after loading, which bounds how long other
+# workers' scores stay missing from it. Off by default: every board a process
+# serves is held whole in its memory.
+LEADERBOARD_CACHE = {
+    'ENABLED': os.getenv('LEADERBOARD_CACHE', 'False') == 'True',
+    'TTL': 60,
+}
+
+# --- AI QUIZ GENERATION ---
+# quizzes.llm backend class and its options (timeouts in seconds)
+LLM_BACKEND = {
+    'BACKEND': os.getenv('LLM_BACKEND', 'quizzes.llm.GeminiBackend'),
+    'OPTIONS': {
+        'model': 'gemini-2.5-flash',
+        'connect_timeout': 5,
+        'read_timeout': 60,
+        'max_retries': 3,
+        'failure_threshold': 5,
+        'reset_timeout': 30,
+    },
+}
+QUIZ_GENERATION_MAX_QUESTIONS = 100
+# Large quizzes are requested in chunks of this many questions, at most
+# QUIZ_GENERATION_CONCURRENCY chunks in flight per process
+QUIZ_GENERATION_CHUNK_SIZE = 5
+QUIZ_GENERATION_CONCURRENCY = int(os.getenv('QUIZ_GENERATION_CONCURRENCY', 8))
+# Identical generation requests within TTL seconds reuse one LLM call. CLONE gives
+# each requester its own copy of the quiz instead of the same quiz.
+QUIZ_GENERATION_CACHE = {
+    'MAX_ENTRIES': 256,
+    'TTL': 60 * 60,
+    'CLONE': True,
+}
+# Threads running generation jobs in each server process
+GENERATION_WORKERS = int(os.getenv('GENERATION_WORKERS', 4))
+# Run jobs inline in the request instead of on the worker pool (tests, debugging)
+GENERATION_JOBS_EAGER = os.getenv('GENERATION_JOBS_EAGER', 'False') == 'True'
+
 # --- PASSWORD VALIDATION ---
 AUTH_PASSWORD_VALIDATORS = [
     {'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator'},
@@ -107,6 +186,14 @@ REST_FRAMEWORK = {
     'DEFAULT_PERMISSION_CLASSES': ['rest_framework.permissions.AllowAny'],
     'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',
     'PAGE_SIZE': 6,
+    # Token buckets (quiz_platform.throttling): 'N/period' holds N tokens refilled at N per period.
+    # Generation spends one token per requested question.
+    'DEFAULT_THROTTLE_RATES': {
+        'generation': os.getenv('THROTTLE_GENERATION', '200/hour'),
+        'generation_global': os.getenv('THROTTLE_GENERATION_GLOBAL', '5000/hour'),
+        'submission': os.getenv('THROTTLE_SUBMISSION', '30/min'),
+        'login': os.getenv('THROTTLE_LOGIN', '10/min'),
+    },
 }
 
 SIMPLE_JWT = {
@@ -116,6 +203,14 @@ SIMPLE_JWT = {
     "BLACKLIST_AFTER_ROTATION": True,
     "ALGORITHM": "HS256",
     "AUTH_HEADER_TYPES": ("Bearer",),
+    # Adds the username and is_staff claims users.authentication reads
+    "TOKEN_OBTAIN_SERIALIZER": "users.serializers.ClaimsTokenObtainPairSerializer",
+}
+
+# Users of tokens without those claims, as StatelessJWTAuthentication resolves them
+JWT_USER_CACHE = {
+    'TIMEOUT': 30,
+    'MAX_ENTRIES': 10000,
 }
 
 # --- DEFAULT AUTO FIELD ---
@@ -0,0 +1,114 @@
+"""
+Token bucket throttles for DRF views.
+
+A scope's rate in ``DEFAULT_THROTTLE_RATES`` reads as a bucket: ``'20/min'``
+holds up to 20 tokens and refills 20 per minute, continuously. A request spends
+``cost()`` tokens, so short bursts are allowed while the long-run rate holds.
+Each key keeps one ``(tokens, timestamp)`` pair in the ``throttle`` cache, and
+refused requests get a ``Retry-After`` header from DRF.
+"""
+import math
+import threading
+
+from django.conf import settings
+from django.core.cache import caches
+from rest_framework.settings import api_settings
+from rest_framework.throttling import SimpleRateThrottle
+
+
+class TokenBucketThrottle(SimpleRateThrottle):
+    # Serializes the read-modify-write per process. Across processes sharing a
+    # cache, concurrent requests for one key can occasionally both spend a token.
+    lock = threading.Lock()
+
+    @property
+    def cache(self):
+        return caches['throttle']
+
+    def get_rate(self):
+        # Read per request, not at import time, so rate changes apply immediately
+        return api_settings.DEFAULT_THROTTLE_RATES.get(self.scope)
+
+    def get_cache_key(self, request, view):
+        if request.user and request.user.is_authenticated:
+            ident = request.user.pk
+        else:
+            ident = self.get_ident(request)
+        return self.cache_format % {'scope': self.scope, 'ident': ident}
+
+    def cost(self, request, view):
+        return 1
+
+    def buckets(self, request, view):
+        """(cache key, rate) of each bucket the request spends from."""
+        return [(self.get_cache_key(request, view), self.rate)]
+
+    def allow_request(self, request, view):
+        buckets = [
+            (key, self.parse_rate(rate))
+            for key, rate in self.buckets(request, view)
+            if key is not None and rate is not None
+        ]
+        if not buckets:
+            return True
+
+        cost = self.cost(request, view)
+        with self.lock:
+            now = self.timer()
+            states = self.cache.get_many([key for key, _ in buckets])
+            updates = {}
+            waits = []
+            for key, (capacity, duration) in buckets:
+                refill = capacity / duration
+                # A request larger than the bucket waits for a full bucket instead of never passing
+                spend = min(cost, capacity)
+                tokens, updated = states.get(key, (capacity, now))
+                tokens = min(capacity, tokens + (now - updated) * refill)
+                if tokens < spend:
+                    waits.append((spend - tokens) / refill)
+                # Once the bucket would be full again the entry can expire: a missing key is a full bucket
+                updates[key] = (tokens - spend, math.ceil((capacity - tokens + spend) / refill) + 1)
+            # Nothing is spent unless every bucket has room
+            if waits:
+                self.wait_seconds = max(waits)
+                return False
+            for key, (tokens, timeout) in updates.items():
+                self.cache.set(key, (tokens, now), timeout)
+        return True
+
+    def wait(self):
+        return self.wait_seconds
+
+
+class GenerationThrottle(TokenBucketThrottle):
+    """
+    One token per requested question, from the user's bucket and from the
+    'generation_global' bucket shared by everyone, which bounds the load on the LLM.
+    """
+    scope = 'generation'
+    global_scope = 'generation_global'
+
+    def buckets(self, request, view):
+        global_key = self.cache_format % {'scope': self.global_scope, 'ident': 'all'}
+        return super().buckets(request, view) + [
+            (global_key, api_settings.DEFAULT_THROTTLE_RATES.get(self.global_scope)),
+        ]
+
+    def cost(self, request, view):
+        try:
+            num_questions = int(request.data.get('num_questions', 5))
+        except (TypeError, ValueError, AttributeError):
+            return 1
+        return max(1, min(num_questions, settings.QUIZ_GENERATION_MAX_QUESTIONS))
+
+
+class SubmissionThrottle(TokenBucketThrottle):
+    scope = 'submission'
+
+
+class LoginThrottle(TokenBucketThrottle):
+    """Per client address, so failed logins for any username count."""
+    scope = 'login'
+
+    def get_cache_key(self, request, view):
+        return self.cache_format % {'scope': self.scope, 'ident': self.get_ident(request)}
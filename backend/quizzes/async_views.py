@@ -0,0 +1,105 @@
+"""
+Async versions of the endpoints that spend most of their time waiting on I/O.
+
+Served by an ASGI server (see the README), one worker holds any number of
+in-flight Gemini calls instead of one per thread. DRF views are synchronous, so
+these are plain Django async views that reuse DRF's authentication, parsers,
+serializers and JSON renderer; responses match their sync counterparts.
+"""
+from asgiref.sync import sync_to_async
+from django.http import HttpResponse
+from django.views import View
+from django.views.decorators.csrf import csrf_exempt
+from rest_framework import exceptions, status
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+from rest_framework.settings import api_settings
+
+from quiz_platform.throttling import GenerationThrottle
+from . import stats
+from .generation import GenerationError, agenerate_quiz
+from .models import Quiz
+from .serializers import QuizSerializer, GenerateQuizRequestSerializer
+
+
+def render(data, status=status.HTTP_200_OK):
+    return HttpResponse(JSONRenderer().render(data), status=status, content_type='application/json')
+
+
+class AsyncAPIView(View):
+    """Authenticated async view: DRF authentication, throttling and errors, IsAuthenticated only."""
+    throttle_classes = []
+
+    @classmethod
+    def as_view(cls, **initkwargs):
+        # Token authenticated like DRF's APIView, so exempt from CSRF the same way
+        return csrf_exempt(super().as_view(**initkwargs))
+
+    async def dispatch(self, request, *args, **kwargs):
+        request = Request(
+            request,
+            parsers=[parser() for parser in api_settings.DEFAULT_PARSER_CLASSES],
+            authenticators=[auth() for auth in api_settings.DEFAULT_AUTHENTICATION_CLASSES],
+        )
+        try:
+            # Authenticators look the user up with the sync ORM
+            user = await sync_to_async(lambda: request.user)()
+            if not user.is_authenticated:
+                raise exceptions.NotAuthenticated()
+            await self.check_throttles(request)
+            return await super().dispatch(request, *args, **kwargs)
+        except exceptions.APIException as e:
+            # As DRF's exception handler renders them
+            data = e.detail if isinstance(e.detail, (list, dict)) else {'detail': e.detail}
+            response = render(data, status=e.status_code)
+            if getattr(e, 'wait', None):
+                response['Retry-After'] = '%d' % e.wait
+            if isinstance(e, (exceptions.NotAuthenticated, exceptions.AuthenticationFailed)):
+                authenticators = request.authenticators
+                header = authenticators[0].authenticate_header(request) if authenticators else None
+                if header:
+                    response['WWW-Authenticate'] = header
+                else:
+                    response.status_code = status.HTTP_403_FORBIDDEN
+            return response
+
+    async def check_throttles(self, request):
+        waits = []
+        for throttle in [throttle_class() for throttle_class in self.throttle_classes]:
+            if not await sync_to_async(throttle.allow_request)(request, self):
+                waits.append(throttle.wait())
+        if waits:
+            raise exceptions.Throttled(max(waits))
+
+
+class AsyncGenerateQuizView(AsyncAPIView):
+    throttle_classes = [GenerationThrottle]
+
+    async def post(self, request):
+        params = GenerateQuizRequestSerializer(data=request.data)
+        if not params.is_valid():
+            return render(params.errors, status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            quiz = await agenerate_quiz(params.validated_data["topic"], params.validated_data["num_questions"])
+        except GenerationError as e:
+            return render(e.payload, status=e.status)
+
+        quiz = await QuizSerializer.setup_eager_loading(Quiz.objects.filter(pk=quiz.pk)).aget()
+        return render(QuizSerializer(quiz).data, status=status.HTTP_201_CREATED)
+
+
+class AsyncDashboardAPIView(AsyncAPIView):
+    async def get(self, request):
+        user = request.user
+        summary, materialized = await stats.auser_summary(user)
+        payload = {
+            "user_name": user.username,
+            "total_attempts": summary["total_attempts"],
+            "avg_score": summary["avg_score"],
+            "recent_attempts": await stats.arecent_attempts(user),
+            "correct_answers": summary["correct_answers"],
+            "wrong_answers": summary["wrong_answers"],
+            "per_quiz_list": await stats.aquiz_averages(user, materialized=materialized),
+        }
+        return render(payload)
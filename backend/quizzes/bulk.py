@@ -0,0 +1,100 @@
+"""
+Quiz import and export as newline-delimited JSON, one quiz per line.
+
+Lines have the shape QuizNestedCreateSerializer accepts. Exported lines are the
+quiz detail representation, which imports as is: ids and the other read-only
+fields are ignored, so an import always creates new quizzes. Both directions
+work in chunks so memory stays flat however many quizzes pass through. The
+import validates a batch of lines and writes it in its own transaction with one
+bulk INSERT per model; the export reads the table with ``.iterator()``.
+"""
+import json
+from collections import namedtuple
+from itertools import islice
+
+from django.db import transaction
+from rest_framework.exceptions import ValidationError
+from rest_framework.parsers import BaseParser
+
+from .fast_serializers import FastJSONRenderer, quiz_data
+from .models import Quiz, Question, Choice
+from .serializers import QuizNestedCreateSerializer
+from .signals import forget_responses
+
+NDJSON_MEDIA_TYPE = 'application/x-ndjson'
+
+ImportProgress = namedtuple('ImportProgress', ['lines', 'created', 'failed'])
+
+
+def batches(iterable, size):
+    iterator = iter(iterable)
+    while batch := list(islice(iterator, size)):
+        yield batch
+
+
+def import_quizzes(lines, batch_size=500, progress=None):
+    """
+    Create a quiz for every valid line of ``lines`` (str or bytes) and return
+    ``(created, errors)``, with ``(line number, error detail)`` for each line
+    skipped. ``progress`` is called with an ImportProgress after every batch.
+    """
+    # One serializer validates every line, instead of building its fields per line
+    validator = QuizNestedCreateSerializer()
+    created = 0
+    errors = []
+    line_number = 0
+    for batch in batches(lines, batch_size):
+        valid = []
+        for line in batch:
+            line_number += 1
+            if not line.strip():
+                continue
+            try:
+                valid.append(validator.run_validation(json.loads(line)))
+            except ValueError as e:
+                errors.append((line_number, {'non_field_errors': [f'Invalid JSON: {e}']}))
+            except ValidationError as e:
+                errors.append((line_number, e.detail))
+        created += len(save_quizzes(valid))
+        if progress is not None:
+            progress(ImportProgress(line_number, created, len(errors)))
+    return created, errors
+
+
+def save_quizzes(validated):
+    """Write validated quizzes in one transaction, with one bulk INSERT per model."""
+    quizzes, questions, choices = [], [], []
+    for validated_data in validated:
+        quiz, quiz_questions, quiz_choices = QuizNestedCreateSerializer.build(validated_data)
+        quizzes.append(quiz)
+        questions.extend(quiz_questions)
+        choices.extend(quiz_choices)
+    if not quizzes:
+        return []
+    with transaction.atomic():
+        Quiz.objects.bulk_create(quizzes)
+        Question.objects.bulk_create(questions)
+        Choice.objects.bulk_create(choices)
+        # bulk_create sends no post_save, and new quizzes change every list page
+        forget_responses(quizzes[0].pk, lists=True)
+    return quizzes
+
+
+def export_quizzes(quizzes=None, chunk_size=500):
+    """Yield one NDJSON line (bytes) per quiz, loading ``chunk_size`` quizzes at a time."""
+    if quizzes is None:
+        quizzes = Quiz.objects.all()
+    renderer = FastJSONRenderer()
+    rows = quizzes.order_by('created_at', 'id').iterator(chunk_size=chunk_size)
+    for chunk in batches(rows, chunk_size):
+        # Questions and choices of the whole chunk in two queries
+        for data in quiz_data(chunk):
+            yield renderer.render(data) + b'\n'
+
+
+class NDJSONParser(BaseParser):
+    media_type = NDJSON_MEDIA_TYPE
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        # The lines are read as they are consumed, never the whole body at once
+        return stream if stream is not None else []
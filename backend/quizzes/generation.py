@@ -0,0 +1,587 @@
+import asyncio
+import copy
+import hashlib
+import json
+import logging
+import queue
+import threading
+import time
+from collections import OrderedDict
+from contextlib import closing, contextmanager
+import re
+from concurrent.futures import Future, ThreadPoolExecutor
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.db import transaction
+from django.dispatch import receiver
+
+from . import llm
+from .models import Quiz, Question, Choice
+from .serializers import QuestionCreateSerializer, QuizNestedCreateSerializer
+from .streaming import QuizStreamParser
+
+logger = logging.getLogger(__name__)
+
+# Bump whenever build_prompt changes so cached quizzes from the old prompt are not reused
+PROMPT_VERSION = 2
+
+
+class GenerationError(Exception):
+    """A failed generation, carrying the error payload and HTTP status to report."""
+
+    def __init__(self, payload, status=500):
+        super().__init__(payload.get("error", "AI generation failed") if isinstance(payload, dict) else payload)
+        self.payload = payload
+        self.status = status
+
+
+def build_prompt(topic, num_questions, part=1, parts=1):
+    # Chunks of one large quiz are asked for different angles to keep duplicates down
+    focus = f"This is part {part} of {parts} of a larger quiz, so focus on a distinct aspect of the topic." if parts > 1 else ""
+    return f"""
+        Generate a quiz on the topic '{topic}' with {num_questions} multiple-choice questions.
+        {focus}
+        Provide JSON in this format:
+        {{
+            "title": "{topic} Quiz",
+            "description": "Quiz description",
+            "questions": [
+                {{
+                    "text": "Question text",
+                    "choices": [
+                        {{"text": "Choice 1", "is_correct": true}},
+                        {{"text": "Choice 2", "is_correct": false}}
+                    ]
+                }}
+            ]
+        }}
+        """
+
+
+@contextmanager
+def translate_llm_errors():
+    """Turn LLM client errors into GenerationErrors with the payloads the API reports."""
+    try:
+        yield
+    except llm.LLMConfigurationError:
+        raise GenerationError({"error":"Google Gemini API key not configured"}, status=500)
+    except llm.CircuitOpenError as e:
+        raise GenerationError({"error": "AI generation temporarily unavailable", "details": str(e)}, status=503)
+    except llm.LLMHTTPError as e:
+        if e.status_code == 400:
+            raise GenerationError({
+                "error": "Bad request to Gemini API",
+                "details": e.json().get("error", {}).get("message", e.body)
+            }, status=400)
+        elif e.status_code == 403:
+            raise GenerationError({
+                "error": "API key invalid or quota exceeded",
+                "details": "Check your GOOGLE_GEMINI_API_KEY and usage limits"
+            }, status=403)
+        raise GenerationError({
+            "error": "AI generation failed",
+            "details": e.body,
+            "status_code": e.status_code
+        }, status=500)
+    except llm.LLMConnectionError as e:
+        raise GenerationError({
+            "error": "Network error connecting to Gemini API",
+            "details": str(e)
+        }, status=500)
+    except llm.LLMError as e:
+        raise GenerationError({"error": "No content generated", "details": str(e)}, status=500)
+
+
+def complete(prompt):
+    """Send the prompt to the configured LLM backend and return the generated text."""
+    with translate_llm_errors():
+        return llm.get_backend().generate(prompt)
+
+
+def stream_text(prompt):
+    """Like complete(), but yield the text in fragments as the backend streams it."""
+    with translate_llm_errors():
+        yield from llm.get_backend().stream(prompt)
+
+
+async def astream_text(prompt):
+    with translate_llm_errors():
+        async for fragment in llm.get_backend().astream(prompt):
+            yield fragment
+
+
+class GenerationCache:
+    """
+    In-process cache of generated quizzes with TTL expiry and LRU eviction.
+
+    Concurrent misses on the same key are coalesced: the first caller computes
+    the value while the others wait for its result, so only one upstream call
+    is in flight per key.
+    """
+
+    def __init__(self, max_entries=256, ttl=60 * 60, clock=time.monotonic):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.clock = clock
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self._entries = OrderedDict()
+        self._inflight = {}
+        self._lock = threading.Lock()
+
+    def _claim(self, key):
+        # ('hit', value), ('wait', future) for a key another caller is computing,
+        # or ('compute', future) when this caller has to compute it
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                expires_at, value = entry
+                if expires_at > self.clock():
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return 'hit', value
+                del self._entries[key]
+            future = self._inflight.get(key)
+            if future is not None:
+                self.coalesced += 1
+                return 'wait', future
+            future = self._inflight[key] = Future()
+            self.misses += 1
+            return 'compute', future
+
+    def _fail(self, key, future, error):
+        with self._lock:
+            del self._inflight[key]
+        future.set_exception(error)
+
+    def _store(self, key, future, value, cacheable):
+        # Callers already waiting get the value either way
+        with self._lock:
+            if cacheable is None or cacheable(value):
+                self._entries[key] = (self.clock() + self.ttl, value)
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+            del self._inflight[key]
+        future.set_result(value)
+
+    def get_or_compute(self, key, compute, cacheable=None):
+        """
+        The cached value for ``key``, or ``compute()``'s, which is kept unless
+        ``cacheable(value)`` is false.
+        """
+        state, value = self._claim(key)
+        if state == 'hit':
+            return value
+        if state == 'wait':
+            return value.result()
+        try:
+            result = compute()
+        except BaseException as e:
+            self._fail(key, value, e)
+            raise
+        self._store(key, value, result, cacheable)
+        return result
+
+    async def aget_or_compute(self, key, compute, cacheable=None):
+        """get_or_compute() for async callers; ``compute`` is a coroutine function."""
+        state, value = self._claim(key)
+        if state == 'hit':
+            return value
+        if state == 'wait':
+            return await asyncio.wrap_future(value)
+        try:
+            result = await compute()
+        except BaseException as e:
+            self._fail(key, value, e)
+            raise
+        self._store(key, value, result, cacheable)
+        return result
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.hits = self.misses = self.coalesced = 0
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses + self.coalesced
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "coalesced": self.coalesced,
+                "hit_ratio": (self.hits + self.coalesced) / lookups if lookups else 0,
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+            }
+
+
+_generation_cache = None
+
+
+def get_generation_cache():
+    global _generation_cache
+    if _generation_cache is None:
+        config = settings.QUIZ_GENERATION_CACHE
+        _generation_cache = GenerationCache(config['MAX_ENTRIES'], config['TTL'])
+    return _generation_cache
+
+
+@receiver(setting_changed)
+def reset_generation_cache(setting, **kwargs):
+    global _generation_cache
+    if setting == 'QUIZ_GENERATION_CACHE':
+        _generation_cache = None
+
+
+def generation_cache_key(topic, num_questions):
+    normalized_topic = ' '.join(topic.casefold().split())
+    model = settings.LLM_BACKEND.get('OPTIONS', {}).get('model', '')
+    raw = json.dumps([normalized_topic, num_questions, model, PROMPT_VERSION])
+    return hashlib.sha256(raw.encode()).hexdigest()
+
+
+_chunk_executor = None
+
+
+def get_chunk_executor():
+    # Shared by every request so the process never has more than
+    # QUIZ_GENERATION_CONCURRENCY calls to the LLM in flight
+    global _chunk_executor
+    if _chunk_executor is None:
+        _chunk_executor = ThreadPoolExecutor(
+            max_workers=settings.QUIZ_GENERATION_CONCURRENCY,
+            thread_name_prefix='quiz-generation-chunk',
+        )
+    return _chunk_executor
+
+
+def chunk_sizes(num_questions, chunk_size):
+    full, rest = divmod(num_questions, chunk_size)
+    return [chunk_size] * full + ([rest] if rest else [])
+
+
+def question_fingerprint(question):
+    text = question.get("text", "") if isinstance(question, dict) else ""
+    return re.sub(r"[\W_]+", " ", str(text).casefold()).strip()
+
+
+def stream_chunk(topic, num_questions, part=1, parts=1):
+    """
+    Yield ``(header, question)`` for each question of one chunk as soon as its JSON
+    object closes. If the stream breaks off, the questions already complete are kept.
+    """
+    parser = QuizStreamParser()
+    try:
+        for fragment in stream_text(build_prompt(topic, num_questions, part, parts)):
+            for question in parser.feed(fragment):
+                yield parser.header, question
+            if parser.done:
+                return
+    except GenerationError:
+        if not parser.count:
+            raise
+        logger.warning('Generation stream for %r broke off after %d questions', topic, parser.count, exc_info=True)
+        return
+    if not parser.count:
+        raise incomplete_response(parser)
+
+
+def incomplete_response(parser):
+    return GenerationError({
+        "error": "Incomplete JSON response from AI",
+        "details": "Response was truncated. Try reducing the number of questions.",
+        "raw_content": parser.preview + "..."
+    }, status=500)
+
+
+async def astream_chunk(topic, num_questions, part=1, parts=1):
+    parser = QuizStreamParser()
+    try:
+        async for fragment in astream_text(build_prompt(topic, num_questions, part, parts)):
+            for question in parser.feed(fragment):
+                yield parser.header, question
+            if parser.done:
+                return
+    except GenerationError:
+        if not parser.count:
+            raise
+        logger.warning('Generation stream for %r broke off after %d questions', topic, parser.count, exc_info=True)
+        return
+    if not parser.count:
+        raise incomplete_response(parser)
+
+
+def _chunk_failed(topic, error):
+    # GenerationErrors are the LLM's doing; anything else is a bug worth a traceback
+    # even when the other chunks make up for it
+    if not isinstance(error, GenerationError):
+        logger.error('Generation chunk for %r crashed', topic, exc_info=error)
+
+
+def stream_questions(topic, num_questions):
+    """
+    Yield ``(header, question)`` pairs for the whole quiz as they are parsed.
+
+    Quizzes larger than QUIZ_GENERATION_CHUNK_SIZE are requested in chunks that
+    stream concurrently, so large quizzes neither hit the output token limit nor
+    take proportionally longer; questions are yielded in arrival order. Failed
+    chunks are dropped as long as one produces questions.
+    """
+    sizes = chunk_sizes(num_questions, settings.QUIZ_GENERATION_CHUNK_SIZE)
+    if len(sizes) == 1:
+        yield from stream_chunk(topic, num_questions)
+        return
+
+    results = queue.Queue()
+    finished = object()
+    # Set once nobody reads the results any more (the writer is full, the client
+    # went away, an error), so producers stop calling the LLM like astream_questions' tasks
+    stopped = threading.Event()
+
+    def produce(size, part):
+        try:
+            if stopped.is_set():
+                return
+            with closing(stream_chunk(topic, size, part, len(sizes))) as chunk:
+                for item in chunk:
+                    if stopped.is_set():
+                        return
+                    results.put(item)
+        except BaseException as e:
+            # Not only GenerationError: nobody reads the future, so anything left there is lost
+            results.put(e)
+        finally:
+            results.put(finished)
+
+    futures = [get_chunk_executor().submit(produce, size, part) for part, size in enumerate(sizes, start=1)]
+    try:
+        running = len(sizes)
+        errors = []
+        produced = False
+        while running:
+            item = results.get()
+            if item is finished:
+                running -= 1
+            elif isinstance(item, BaseException):
+                _chunk_failed(topic, item)
+                errors.append(item)
+            else:
+                produced = True
+                yield item
+        if not produced:
+            raise errors[0]
+    finally:
+        stopped.set()
+        # Chunks still waiting for a worker never start
+        for future in futures:
+            future.cancel()
+
+
+async def astream_questions(topic, num_questions):
+    """stream_questions() for async callers: chunks run as tasks on the event loop."""
+    sizes = chunk_sizes(num_questions, settings.QUIZ_GENERATION_CHUNK_SIZE)
+    if len(sizes) == 1:
+        async for item in astream_chunk(topic, num_questions):
+            yield item
+        return
+
+    results = asyncio.Queue()
+    finished = object()
+
+    async def produce(size, part):
+        try:
+            async for item in astream_chunk(topic, size, part, len(sizes)):
+                await results.put(item)
+        except asyncio.CancelledError:
+            # How the reader stops the chunks it no longer needs
+            raise
+        except BaseException as e:
+            await results.put(e)
+        finally:
+            await results.put(finished)
+
+    tasks = [asyncio.create_task(produce(size, part)) for part, size in enumerate(sizes, start=1)]
+    try:
+        running = len(sizes)
+        errors = []
+        produced = False
+        while running:
+            item = await results.get()
+            if item is finished:
+                running -= 1
+            elif isinstance(item, BaseException):
+                _chunk_failed(topic, item)
+                errors.append(item)
+            else:
+                produced = True
+                yield item
+        if not produced:
+            raise errors[0]
+    finally:
+        for task in tasks:
+            task.cancel()
+
+
+class QuizWriter:
+    """
+    Saves a generated quiz question by question, as the questions arrive.
+
+    The quiz row is created with the first valid question. Questions that fail
+    validation or repeat an earlier one are skipped, and nothing past
+    ``num_questions`` is saved. ``quiz_json`` collects what was saved.
+    """
+
+    def __init__(self, topic, num_questions):
+        self.topic = topic
+        self.num_questions = num_questions
+        self.quiz = None
+        self.quiz_json = {"questions": []}
+        self.invalid = None
+        self._seen = set()
+
+    @property
+    def full(self):
+        return len(self.quiz_json["questions"]) >= self.num_questions
+
+    def create_quiz(self, header):
+        title = str(header.get("title") or f"{self.topic} Quiz")[:Quiz._meta.get_field('title').max_length]
+        description = str(header.get("description") or "")
+        self.quiz_json.update(title=title, description=description)
+        return Quiz.objects.create(title=title, description=description)
+
+    def add(self, header, question_data):
+        """Validate and save one question; returns it, or None when it was skipped."""
+        if self.full:
+            return None
+        serializer = QuestionCreateSerializer(data=question_data)
+        if not serializer.is_valid():
+            self.invalid = self.invalid or serializer.errors
+            return None
+        fingerprint = question_fingerprint(question_data)
+        if fingerprint in self._seen:
+            return None
+        self._seen.add(fingerprint)
+
+        validated = dict(serializer.validated_data)
+        choices_data = validated.pop('choices', [])
+        with transaction.atomic():
+            if self.quiz is None:
+                self.quiz = self.create_quiz(header)
+            question = Question.objects.create(quiz=self.quiz, **validated)
+            Choice.objects.bulk_create([Choice(question=question, **c_data) for c_data in choices_data])
+        self.quiz_json["questions"].append(question_data)
+        return question
+
+    def write(self, items):
+        """Save questions from ``(header, question)`` pairs, yielding each one saved."""
+        with closing(items):
+            for header, question_data in items:
+                question = self.add(header, question_data)
+                if question is not None:
+                    yield question
+                if self.full:
+                    return
+
+    async def awrite(self, items):
+        """write() for an async iterator; the database work runs on the ORM's thread."""
+        add = sync_to_async(self.add)
+        try:
+            async for header, question_data in items:
+                question = await add(header, question_data)
+                if question is not None:
+                    yield question
+                if self.full:
+                    return
+        finally:
+            await items.aclose()
+
+    def finish(self):
+        if self.quiz is None:
+            if self.invalid:
+                raise GenerationError(self.invalid, status=400)
+            raise GenerationError({"error": "Incomplete JSON response from AI"}, status=500)
+        return self.quiz
+
+
+def save_quiz(quiz_json):
+    serializer = QuizNestedCreateSerializer(data=quiz_json)
+    if not serializer.is_valid():
+        raise GenerationError(serializer.errors, status=400)
+    return serializer.save()
+
+
+def generate_quiz_stream(topic, num_questions):
+    """
+    Generate a quiz, yielding ``(quiz, question)`` as each question is saved.
+
+    Unlike generate_quiz() this skips the generation cache: a cached quiz has
+    nothing left to stream, and coalescing would hold followers until the
+    leader finished.
+    """
+    writer = QuizWriter(topic, num_questions)
+    for question in writer.write(stream_questions(topic, num_questions)):
+        yield writer.quiz, question
+    writer.finish()
+
+
+def is_complete(generated):
+    # A quiz short of questions (failed chunks, a truncated stream) is returned to
+    # its request but not served to the identical ones after it
+    return generated["complete"]
+
+
+def generate_quiz(topic, num_questions):
+    """
+    Generate a quiz with the configured LLM backend and persist it. Questions
+    are saved as they stream in, and a truncated response keeps every question
+    that was complete.
+
+    Identical requests (same normalized topic, question count, model and prompt
+    version) share one LLM call: later ones get a fresh copy of the cached quiz,
+    or the same quiz when QUIZ_GENERATION_CACHE['CLONE'] is off.
+    """
+    created = []
+
+    def generate():
+        writer = QuizWriter(topic, num_questions)
+        for _ in writer.write(stream_questions(topic, num_questions)):
+            pass
+        quiz = writer.finish()
+        created.append(quiz)
+        return {"quiz_json": writer.quiz_json, "quiz_id": quiz.pk, "complete": writer.full}
+
+    cached = get_generation_cache().get_or_compute(generation_cache_key(topic, num_questions), generate, is_complete)
+    if created:
+        return created[0]
+    if not settings.QUIZ_GENERATION_CACHE['CLONE']:
+        quiz = Quiz.objects.filter(pk=cached["quiz_id"]).first()
+        if quiz is not None:
+            return quiz
+    return save_quiz(copy.deepcopy(cached["quiz_json"]))
+
+
+async def agenerate_quiz(topic, num_questions):
+    """generate_quiz() for async views: the LLM calls don't hold a thread while waiting."""
+    created = []
+
+    async def generate():
+        writer = QuizWriter(topic, num_questions)
+        async for _ in writer.awrite(astream_questions(topic, num_questions)):
+            pass
+        quiz = writer.finish()
+        created.append(quiz)
+        return {"quiz_json": writer.quiz_json, "quiz_id": quiz.pk, "complete": writer.full}
+
+    cached = await get_generation_cache().aget_or_compute(
+        generation_cache_key(topic, num_questions), generate, is_complete,
+    )
+    if created:
+        return created[0]
+    if not settings.QUIZ_GENERATION_CACHE['CLONE']:
+        quiz = await Quiz.objects.filter(pk=cached["quiz_id"]).afirst()
+        if quiz is not None:
+            return quiz
+    return await sync_to_async(save_quiz)(copy.deepcopy(cached["quiz_json"]))
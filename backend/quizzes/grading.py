@@ -0,0 +1,110 @@
+import uuid
+from collections import namedtuple
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+from .leaderboard import record_score
+from .models import Question, QuizAttempt, UserAnswer
+from .stats import record_attempt_stats
+
+
+class GradingError(Exception):
+    pass
+
+
+Grade = namedtuple('Grade', ['selections', 'correct', 'total', 'score'])
+
+
+class AnswerKey:
+    """
+    Every question of a quiz mapped to its choices, ``{question_id: {choice_id: is_correct}}``,
+    so a whole submission can be validated and scored in memory.
+    """
+
+    def __init__(self, choices_by_question):
+        self.choices_by_question = choices_by_question
+
+    @classmethod
+    def load(cls, quiz):
+        choices_by_question = {}
+        rows = Question.objects.filter(quiz=quiz).values_list('id', 'choice__id', 'choice__is_correct')
+        for question_id, choice_id, is_correct in rows:
+            choices = choices_by_question.setdefault(question_id, {})
+            # Questions without choices still count towards the total
+            if choice_id is not None:
+                choices[choice_id] = is_correct
+        return cls(choices_by_question)
+
+    @property
+    def total_questions(self):
+        return len(self.choices_by_question)
+
+    def correct_choice_ids(self, question_id):
+        choices = self.choices_by_question.get(question_id, {})
+        return {choice_id for choice_id, is_correct in choices.items() if is_correct}
+
+    def grade(self, answers):
+        if not isinstance(answers, list):
+            raise GradingError('answers must be a list')
+
+        selections = []
+        answered = set()
+        correct = 0
+        for ans in answers:
+            try:
+                question_id = uuid.UUID(str(ans['question']))
+                choice_id = uuid.UUID(str(ans['choice']))
+            except (TypeError, KeyError, ValueError):
+                raise GradingError('Each answer needs a valid question and choice id')
+
+            choices = self.choices_by_question.get(question_id)
+            if choices is None:
+                raise GradingError(f'Question {question_id} does not belong to this quiz')
+            if choice_id not in choices:
+                raise GradingError(f'Choice {choice_id} does not belong to question {question_id}')
+            if question_id in answered:
+                raise GradingError(f'Question {question_id} was answered more than once')
+
+            answered.add(question_id)
+            selections.append((question_id, choice_id))
+            if choices[choice_id]:
+                correct += 1
+
+        total = self.total_questions
+        score = (correct / total * 100) if total > 0 else 0
+        return Grade(selections, correct, total, score)
+
+
+def answer_key_cache_key(quiz):
+    return f'quizzes:answer-key:{quiz.pk}:v{quiz.version}'
+
+
+def get_answer_key(quiz):
+    """
+    Answer key for the quiz's current content version, from the cache when possible.
+
+    Any write to the quiz, its questions or its choices bumps ``Quiz.version``
+    (see quizzes.signals), so stale keys are never read again and simply expire.
+    """
+    key = answer_key_cache_key(quiz)
+    choices_by_question = cache.get(key)
+    if choices_by_question is None:
+        answer_key = AnswerKey.load(quiz)
+        cache.set(key, answer_key.choices_by_question, settings.ANSWER_KEY_CACHE_TIMEOUT)
+        return answer_key
+    return AnswerKey(choices_by_question)
+
+
+def record_attempt(user, quiz, grade):
+    # By id: user can be the token-backed user of users.authentication
+    with transaction.atomic():
+        attempt = QuizAttempt.objects.create(user_id=user.pk, quiz=quiz, score=grade.score)
+        UserAnswer.objects.bulk_create([
+            UserAnswer(attempt=attempt, question_id=question_id, selected_choice_id=choice_id)
+            for question_id, choice_id in grade.selections
+        ])
+        record_attempt_stats(attempt, grade)
+        record_score(attempt, user.username)
+    return attempt
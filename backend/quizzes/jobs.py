@@ -0,0 +1,56 @@
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import connections, transaction
+
+from .generation import GenerationError, generate_quiz
+from .models import GenerationJob
+
+logger = logging.getLogger(__name__)
+
+_executor = None
+
+
+def get_executor():
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=settings.GENERATION_WORKERS,
+            thread_name_prefix='quiz-generation',
+        )
+    return _executor
+
+
+def enqueue(job):
+    """Run a pending job on the worker pool once the request's transaction commits."""
+    if settings.GENERATION_JOBS_EAGER:
+        run_job(job.pk)
+    else:
+        transaction.on_commit(lambda: get_executor().submit(_run_in_worker, job.pk))
+
+
+def _run_in_worker(job_id):
+    try:
+        run_job(job_id)
+    finally:
+        # Worker threads open their own connections; don't leave them dangling
+        connections.close_all()
+
+
+def run_job(job_id):
+    # Claim the job so it is never run twice
+    if not GenerationJob.objects.filter(pk=job_id, status=GenerationJob.PENDING).update(status=GenerationJob.RUNNING):
+        return
+    job = GenerationJob.objects.get(pk=job_id)
+    try:
+        job.quiz = generate_quiz(job.topic, job.num_questions)
+        job.status = GenerationJob.SUCCEEDED
+    except GenerationError as e:
+        job.status = GenerationJob.FAILED
+        job.error = e.payload
+    except Exception as e:
+        logger.exception('Quiz generation job %s crashed', job_id)
+        job.status = GenerationJob.FAILED
+        job.error = {"error": "AI generation failed", "details": str(e)}
+    job.save(update_fields=['status', 'quiz', 'error', 'updated_at'])
@@ -0,0 +1,289 @@
+"""
+Per-quiz and global leaderboards.
+
+Every submission goes through ``record_score``, in the transaction that writes
+the attempt: LeaderboardEntry keeps each user's best score on each quiz, and
+UserProfile the points summed over all attempts and the level they reach. Reads
+never aggregate attempts. A quiz's ranking is the leaderboard_quiz_rank_idx
+order (best score first, earlier first on equal scores), the global ranking the
+profile_total_score_idx order, so a top N reads N index entries and a rank
+counts only the rows ahead of the user. The profile is updated in a single
+UPDATE of F() expressions that works out the new level too, so submissions from
+several tabs or workers at once can't lose each other's points.
+
+With ``LEADERBOARD_CACHE['ENABLED']`` each process also keeps the boards it has
+served as sorted lists, which answer both queries with a slice or a bisection.
+Scores recorded in this process are applied as their transactions commit; other
+processes' only show up once a board is reloaded, ``TTL`` seconds after loading.
+"""
+import threading
+import time
+from bisect import bisect_left, insort
+
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.db import IntegrityError, transaction
+from django.db.models import Case, F, Q, Value, When
+from django.dispatch import receiver
+
+from users.models import LEVELS, UserProfile, level_for
+
+from .models import LeaderboardEntry
+from .stats import update_or_create_row
+
+GLOBAL = 'global'
+
+
+# -------------------- UPDATES --------------------
+def _record_best_score(attempt):
+    # True when the attempt is the user's new best on the quiz. Only a better score
+    # moves achieved_at, so an equal score later on doesn't lose the user places
+    lookup = {'user_id': attempt.user_id, 'quiz_id': attempt.quiz_id}
+    better = {'best_score': attempt.score, 'achieved_at': attempt.completed_at}
+    if LeaderboardEntry.objects.filter(**lookup, best_score__lt=attempt.score).update(**better):
+        return True
+    if LeaderboardEntry.objects.filter(**lookup).exists():
+        return False
+    try:
+        with transaction.atomic():
+            LeaderboardEntry.objects.create(**lookup, **better)
+    except IntegrityError:
+        # A concurrent first attempt created the row
+        return bool(LeaderboardEntry.objects.filter(**lookup, best_score__lt=attempt.score).update(**better))
+    return True
+
+
+def _level_case(points):
+    # The level the profile reaches once ``points`` are added, decided by the same
+    # UPDATE from the total it is about to replace
+    return Case(
+        *[When(total_score__gte=threshold - points, then=Value(level)) for threshold, level in LEVELS],
+        default=Value(LEVELS[-1][1]),
+    )
+
+
+def _record_points(attempt):
+    # One UPDATE with no read before it, so concurrent submissions can't lose each other's points
+    gained = points(attempt.score)
+    update_or_create_row(
+        UserProfile,
+        {'user_id': attempt.user_id},
+        {'total_score': F('total_score') + gained, 'level': _level_case(gained)},
+        {'total_score': gained, 'level': level_for(gained)},
+    )
+    return gained
+
+
+def points(score):
+    """Points an attempt adds to UserProfile.total_score: its percentage, rounded."""
+    return round(score)
+
+
+def record_score(attempt, username):
+    """Fold one graded attempt by ``username`` into the quiz's leaderboard and the user's profile."""
+    improved = _record_best_score(attempt)
+    gained = _record_points(attempt)
+
+    boards = get_leaderboard_cache()
+    if boards is not None:
+        def update_boards():
+            if improved:
+                boards.update(str(attempt.quiz_id), attempt.user_id, _quiz_row(username, attempt.score, attempt.completed_at))
+            boards.add_points(attempt.user_id, username, gained)
+        transaction.on_commit(update_boards)
+
+
+# -------------------- QUERIES --------------------
+def _quiz_row(username, best_score, achieved_at):
+    return {'username': username, 'best_score': best_score, 'achieved_at': achieved_at}
+
+
+def _global_row(username, total_score, level):
+    return {'username': username, 'total_score': total_score, 'level': level}
+
+
+def _quiz_key(row):
+    return (-row['best_score'], row['achieved_at'])
+
+
+def _global_key(row):
+    # Equal totals share a rank
+    return (-row['total_score'],)
+
+
+def _quiz_entries(quiz_id):
+    return LeaderboardEntry.objects.filter(quiz_id=quiz_id).order_by('-best_score', 'achieved_at')
+
+
+def _quiz_rows(queryset):
+    return [
+        (row['user_id'], _quiz_row(row['user__username'], row['best_score'], row['achieved_at']))
+        for row in queryset.values('user_id', 'user__username', 'best_score', 'achieved_at')
+    ]
+
+
+def _profiles():
+    return UserProfile.objects.order_by('-total_score', 'user_id')
+
+
+def _global_rows(queryset):
+    return [
+        (row['user_id'], _global_row(row['user__username'], row['total_score'], row['level']))
+        for row in queryset.values('user_id', 'user__username', 'total_score', 'level')
+    ]
+
+
+def _ranked(rows, key):
+    # Competition ranking: rows with equal keys share the rank of the first of them
+    ranked = []
+    previous = None
+    for position, row in enumerate(rows, 1):
+        if previous is None or key(row) != key(previous):
+            rank = position
+        ranked.append({'rank': rank, **row})
+        previous = row
+    return ranked
+
+
+def quiz_top(quiz_id, limit=10):
+    """The ``limit`` best scores on a quiz, one per user."""
+    board = _cached_board(quiz_id)
+    if board is not None:
+        return board.top(limit)
+    return _ranked([row for _, row in _quiz_rows(_quiz_entries(quiz_id)[:limit])], _quiz_key)
+
+
+def quiz_rank(quiz_id, user):
+    """The user's place on a quiz's leaderboard, or None before their first attempt."""
+    board = _cached_board(quiz_id)
+    if board is not None:
+        return board.rank(user.pk)
+    entry = LeaderboardEntry.objects.filter(quiz_id=quiz_id, user=user).values('best_score', 'achieved_at').first()
+    if entry is None:
+        return None
+    ahead = _quiz_entries(quiz_id).filter(
+        Q(best_score__gt=entry['best_score']) | Q(best_score=entry['best_score'], achieved_at__lt=entry['achieved_at'])
+    )
+    return {'rank': ahead.count() + 1, 'username': user.username, **entry}
+
+
+def global_top(limit=10):
+    """The ``limit`` users with the most points."""
+    board = _cached_board(GLOBAL)
+    if board is not None:
+        return board.top(limit)
+    return _ranked([row for _, row in _global_rows(_profiles()[:limit])], _global_key)
+
+
+def global_rank(user):
+    """The user's place on the global leaderboard, or None without a profile."""
+    board = _cached_board(GLOBAL)
+    if board is not None:
+        return board.rank(user.pk)
+    profile = UserProfile.objects.filter(user=user).values('total_score', 'level').first()
+    if profile is None:
+        return None
+    ahead = UserProfile.objects.filter(total_score__gt=profile['total_score']).count()
+    return {'rank': ahead + 1, 'username': user.username, **profile}
+
+
+# -------------------- IN-PROCESS CACHE --------------------
+class SortedBoard:
+    """One leaderboard in memory: ``(key, user_id)`` pairs in ranking order."""
+
+    def __init__(self, rows, key):
+        self.key = key
+        self._rows = dict(rows)
+        self._order = sorted((key(row), user_id) for user_id, row in self._rows.items())
+
+    def __len__(self):
+        return len(self._order)
+
+    def get(self, user_id, default=None):
+        return self._rows.get(user_id, default)
+
+    def update(self, user_id, row):
+        previous = self._rows.get(user_id)
+        if previous is not None:
+            del self._order[bisect_left(self._order, (self.key(previous), user_id))]
+        self._rows[user_id] = row
+        insort(self._order, (self.key(row), user_id))
+
+    def top(self, limit):
+        return _ranked([self._rows[user_id] for _, user_id in self._order[:limit]], self.key)
+
+    def rank(self, user_id):
+        row = self._rows.get(user_id)
+        if row is None:
+            return None
+        # Everything sorting before the key alone is strictly ahead
+        return {'rank': bisect_left(self._order, (self.key(row),)) + 1, **row}
+
+
+class LeaderboardCache:
+    def __init__(self, ttl=60, clock=time.monotonic):
+        self.ttl = ttl
+        self.clock = clock
+        self._boards = {}
+        self._lock = threading.Lock()
+
+    def board(self, name):
+        with self._lock:
+            loaded = self._boards.get(name)
+            if loaded is not None and (self.ttl is None or loaded[0] > self.clock()):
+                return loaded[1]
+        if name == GLOBAL:
+            board = SortedBoard(_global_rows(_profiles()), _global_key)
+        else:
+            board = SortedBoard(_quiz_rows(_quiz_entries(name)), _quiz_key)
+        expires_at = None if self.ttl is None else self.clock() + self.ttl
+        with self._lock:
+            self._boards[name] = (expires_at, board)
+        return board
+
+    def update(self, name, user_id, row):
+        # Boards not loaded yet read the change from the database when they are
+        with self._lock:
+            loaded = self._boards.get(name)
+            if loaded is not None:
+                loaded[1].update(user_id, row)
+
+    def add_points(self, user_id, username, gained):
+        # The new total isn't read back from the database, so the global board adds
+        # the points to its own copy
+        with self._lock:
+            loaded = self._boards.get(GLOBAL)
+            if loaded is not None:
+                board = loaded[1]
+                total = board.get(user_id, {}).get('total_score', 0) + gained
+                board.update(user_id, _global_row(username, total, level_for(total)))
+
+    def clear(self):
+        with self._lock:
+            self._boards.clear()
+
+
+_leaderboard_cache = None
+
+
+def get_leaderboard_cache():
+    """The process's LeaderboardCache, or None when LEADERBOARD_CACHE is disabled."""
+    global _leaderboard_cache
+    config = settings.LEADERBOARD_CACHE
+    if not config['ENABLED']:
+        return None
+    if _leaderboard_cache is None:
+        _leaderboard_cache = LeaderboardCache(config['TTL'])
+    return _leaderboard_cache
+
+
+def _cached_board(name):
+    boards = get_leaderboard_cache()
+    return None if boards is None else boards.board(str(name))
+
+
+@receiver(setting_changed)
+def reset_leaderboard_cache(setting, **kwargs):
+    global _leaderboard_cache
+    if setting == 'LEADERBOARD_CACHE':
+        _leaderboard_cache = None
@@ -0,0 +1,373 @@
+"""
+Client for the LLM that writes AI-generated quizzes.
+
+``get_backend()`` returns the process-wide backend configured by the
+``LLM_BACKEND`` setting. Backends either return the whole text (``generate``)
+or yield it in fragments as the model writes it (``stream``); ``agenerate`` and
+``astream`` are their async counterparts for ASGI views. ``GeminiBackend`` keeps
+one pooled ``requests.Session`` and applies connect/read timeouts, jittered
+exponential retries on 429/5xx and network errors, and a circuit breaker that
+fails fast while Gemini is down.
+
+The async methods go through an ``httpx.AsyncClient`` per event loop, with the
+same timeouts, retries and circuit breaker.
+"""
+import asyncio
+import json
+import os
+import random
+import threading
+import time
+import weakref
+
+import httpx
+import requests
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+from django.utils.module_loading import import_string
+from dotenv import load_dotenv
+from requests.adapters import HTTPAdapter
+
+load_dotenv()
+
+
+class LLMError(Exception):
+    pass
+
+
+class LLMHTTPError(LLMError):
+    def __init__(self, status_code, body):
+        super().__init__(f'LLM API returned {status_code}')
+        self.status_code = status_code
+        self.body = body
+
+    def json(self):
+        try:
+            return json.loads(self.body)
+        except ValueError:
+            return {}
+
+
+class LLMConnectionError(LLMError):
+    pass
+
+
+class LLMConfigurationError(LLMError):
+    pass
+
+
+class CircuitOpenError(LLMError):
+    pass
+
+
+class CircuitBreaker:
+    """
+    Opens after ``failure_threshold`` consecutive failures and rejects calls for
+    ``reset_timeout`` seconds, then lets a single trial call through (half-open).
+    """
+
+    TRIAL = 'trial'
+
+    def __init__(self, failure_threshold=5, reset_timeout=30, clock=time.monotonic):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.clock = clock
+        self.failures = 0
+        self.opened_at = None
+        self._trial_running = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        if self.opened_at is None:
+            return 'closed'
+        if self.clock() - self.opened_at >= self.reset_timeout:
+            return 'half-open'
+        return 'open'
+
+    def allow(self):
+        """Whether a call may go ahead: True, ``TRIAL`` for the half-open trial, or False."""
+        with self._lock:
+            state = self.state
+            if state == 'closed':
+                return True
+            if state == 'half-open' and not self._trial_running:
+                self._trial_running = True
+                return self.TRIAL
+            return False
+
+    def release_trial(self):
+        # The trial ended without telling whether the service is back (cancelled,
+        # or an unexpected error); the next call gets to try instead
+        with self._lock:
+            self._trial_running = False
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self._trial_running = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            self._trial_running = False
+            if self.failures >= self.failure_threshold:
+                self.opened_at = self.clock()
+
+
+class LLMBackend:
+    """Interface every LLM backend implements."""
+
+    def generate(self, prompt, temperature=0.7, max_output_tokens=2000):
+        """Return the text the model generates for ``prompt``."""
+        raise NotImplementedError
+
+    def stream(self, prompt, temperature=0.7, max_output_tokens=2000):
+        """Yield the generated text in fragments as the model writes it."""
+        yield self.generate(prompt, temperature=temperature, max_output_tokens=max_output_tokens)
+
+    async def agenerate(self, prompt, temperature=0.7, max_output_tokens=2000):
+        """Async generate(); by default runs generate() on a worker thread."""
+        return await sync_to_async(self.generate, thread_sensitive=False)(
+            prompt, temperature=temperature, max_output_tokens=max_output_tokens,
+        )
+
+    async def astream(self, prompt, temperature=0.7, max_output_tokens=2000):
+        """Async stream(); by default yields agenerate()'s text in one piece."""
+        yield await self.agenerate(prompt, temperature=temperature, max_output_tokens=max_output_tokens)
+
+    def list_models(self, api_version=None):
+        raise NotImplementedError
+
+
+class GeminiBackend(LLMBackend):
+    RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+    def __init__(self, api_key=None, base_url='https://generativelanguage.googleapis.com',
+                 api_version='v1', model='gemini-2.5-flash', connect_timeout=5, read_timeout=60,
+                 max_retries=3, backoff_base=0.5, backoff_max=8, pool_maxsize=10, async_max_connections=100,
+                 failure_threshold=5, reset_timeout=30, sleep=time.sleep, asleep=asyncio.sleep):
+        self.api_key = api_key or os.getenv('GOOGLE_GEMINI_API_KEY')
+        self.base_url = base_url.rstrip('/')
+        self.api_version = api_version
+        self.model = model
+        self.timeout = (connect_timeout, read_timeout)
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.sleep = sleep
+        self.asleep = asleep
+        self.breaker = CircuitBreaker(failure_threshold, reset_timeout)
+
+        # One keep-alive pool shared by every request thread in the process
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_maxsize)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+        if self.api_key:
+            self.session.headers['x-goog-api-key'] = self.api_key
+
+        # httpx clients belong to the event loop that created them, so async
+        # callers get one pool per loop (in practice, one per ASGI worker)
+        self.async_limits = httpx.Limits(max_connections=async_max_connections, max_keepalive_connections=pool_maxsize)
+        self._async_clients = weakref.WeakKeyDictionary()
+
+    def async_client(self):
+        loop = asyncio.get_running_loop()
+        client = self._async_clients.get(loop)
+        if client is None:
+            client = self._async_clients[loop] = httpx.AsyncClient(
+                headers={'x-goog-api-key': self.api_key} if self.api_key else {},
+                timeout=httpx.Timeout(self.timeout[1], connect=self.timeout[0]),
+                limits=self.async_limits,
+            )
+        return client
+
+    def backoff(self, attempt, response=None):
+        retry_after = response.headers.get('Retry-After') if response is not None else None
+        if retry_after and retry_after.isdigit():
+            return min(float(retry_after), self.backoff_max)
+        # Full jitter
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+
+    def endpoint(self, path, api_version=None):
+        """
+        The URL for ``path`` and whether the call is the circuit's half-open trial,
+        once the key is configured and the circuit lets a call through.
+        """
+        if not self.api_key:
+            raise LLMConfigurationError('GOOGLE_GEMINI_API_KEY is not set')
+        allowed = self.breaker.allow()
+        if not allowed:
+            raise CircuitOpenError('Gemini API is unavailable, not retrying until the circuit closes')
+        return f'{self.base_url}/{api_version or self.api_version}/{path}', allowed == CircuitBreaker.TRIAL
+
+    def request(self, method, path, api_version=None, **kwargs):
+        url, trial = self.endpoint(path, api_version)
+        try:
+            return self._request(method, url, **kwargs)
+        except BaseException:
+            # Success and failure release the trial themselves; anything else must too
+            if trial:
+                self.breaker.release_trial()
+            raise
+
+    def _request(self, method, url, **kwargs):
+        for attempt in range(self.max_retries + 1):
+            response = None
+            try:
+                response = self.session.request(method, url, timeout=self.timeout, **kwargs)
+            except (requests.ConnectionError, requests.Timeout) as e:
+                error = LLMConnectionError(str(e))
+            else:
+                if response.status_code == 200:
+                    self.breaker.record_success()
+                    return response
+                error = LLMHTTPError(response.status_code, response.text)
+                if response.status_code not in self.RETRY_STATUSES:
+                    # The request itself is wrong; Gemini is healthy
+                    self.breaker.record_success()
+                    raise error
+            if attempt < self.max_retries:
+                self.sleep(self.backoff(attempt, response))
+        self.breaker.record_failure()
+        raise error
+
+    async def arequest(self, method, path, api_version=None, stream=False, **kwargs):
+        url, trial = self.endpoint(path, api_version)
+        try:
+            return await self._arequest(method, url, stream, **kwargs)
+        except BaseException:
+            # Including the CancelledError of a client that went away mid-trial
+            if trial:
+                self.breaker.release_trial()
+            raise
+
+    async def _arequest(self, method, url, stream, **kwargs):
+        client = self.async_client()
+        for attempt in range(self.max_retries + 1):
+            response = None
+            try:
+                response = await client.send(client.build_request(method, url, **kwargs), stream=stream)
+            except httpx.TransportError as e:
+                error = LLMConnectionError(str(e))
+            else:
+                if response.status_code == 200:
+                    self.breaker.record_success()
+                    return response
+                body = (await response.aread()).decode(errors='replace')
+                await response.aclose()
+                error = LLMHTTPError(response.status_code, body)
+                if response.status_code not in self.RETRY_STATUSES:
+                    self.breaker.record_success()
+                    raise error
+            if attempt < self.max_retries:
+                await self.asleep(self.backoff(attempt, response))
+        self.breaker.record_failure()
+        raise error
+
+    def payload(self, prompt, temperature, max_output_tokens):
+        return {
+            "contents": [{
+                "parts": [{"text": prompt}]
+            }],
+            "generationConfig": {
+                "temperature": temperature,
+                "maxOutputTokens": max_output_tokens
+            }
+        }
+
+    def generate(self, prompt, temperature=0.7, max_output_tokens=2000):
+        data = self.payload(prompt, temperature, max_output_tokens)
+        response = self.request('POST', f'models/{self.model}:generateContent', json=data)
+        return self.response_text(response)
+
+    async def agenerate(self, prompt, temperature=0.7, max_output_tokens=2000):
+        data = self.payload(prompt, temperature, max_output_tokens)
+        response = await self.arequest('POST', f'models/{self.model}:generateContent', json=data)
+        return self.response_text(response)
+
+    def response_text(self, response):
+        try:
+            response_data = response.json()
+        except ValueError as e:
+            raise LLMError(f'Invalid JSON from Gemini API: {e}')
+        if not response_data.get("candidates"):
+            raise LLMError(f'No content generated: {response_data}')
+        try:
+            return response_data["candidates"][0]["content"]["parts"][0]["text"]
+        except (KeyError, IndexError) as e:
+            raise LLMError(f'Unexpected response shape: {e}')
+
+    def stream(self, prompt, temperature=0.7, max_output_tokens=2000):
+        # Server-sent events, one GenerateContentResponse per "data:" line. Retries
+        # only cover opening the stream; a stream cut off midway raises
+        data = self.payload(prompt, temperature, max_output_tokens)
+        response = self.request(
+            'POST', f'models/{self.model}:streamGenerateContent', params={'alt': 'sse'}, json=data, stream=True,
+        )
+        response.encoding = 'utf-8'
+        try:
+            for line in response.iter_lines(decode_unicode=True):
+                yield from self.event_text(line)
+        except (requests.ConnectionError, requests.Timeout, requests.exceptions.ChunkedEncodingError) as e:
+            raise LLMConnectionError(str(e))
+        finally:
+            response.close()
+
+    async def astream(self, prompt, temperature=0.7, max_output_tokens=2000):
+        data = self.payload(prompt, temperature, max_output_tokens)
+        response = await self.arequest(
+            'POST', f'models/{self.model}:streamGenerateContent', params={'alt': 'sse'}, json=data, stream=True,
+        )
+        try:
+            async for line in response.aiter_lines():
+                for text in self.event_text(line):
+                    yield text
+        except httpx.TransportError as e:
+            raise LLMConnectionError(str(e))
+        finally:
+            await response.aclose()
+
+    def event_text(self, line):
+        """The text fragments in one line of a streamGenerateContent event stream."""
+        if not line.startswith('data:'):
+            return []
+        try:
+            event = json.loads(line[5:])
+        except ValueError as e:
+            raise LLMError(f'Invalid JSON from Gemini API: {e}')
+        return [
+            part['text']
+            for candidate in event.get('candidates', [])[:1]
+            for part in candidate.get('content', {}).get('parts', [])
+            if part.get('text')
+        ]
+
+    def list_models(self, api_version=None):
+        return self.request('GET', 'models', api_version=api_version).json().get('models', [])
+
+
+_backend = None
+_backend_lock = threading.Lock()
+
+
+def get_backend():
+    """The backend configured by ``settings.LLM_BACKEND``, built once per process."""
+    global _backend
+    if _backend is None:
+        with _backend_lock:
+            if _backend is None:
+                config = settings.LLM_BACKEND
+                _backend = import_string(config['BACKEND'])(**config.get('OPTIONS', {}))
+    return _backend
+
+
+@receiver(setting_changed)
+def reset_backend(setting, **kwargs):
+    global _backend
+    if setting == 'LLM_BACKEND':
+        _backend = None
@@ -0,0 +1,146 @@
+import asyncio
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import connections
+from django.test import AsyncClient, Client
+from django.test.utils import override_settings
+from django.urls import reverse
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from quizzes.generation import get_generation_cache
+from quizzes.models import Quiz
+
+TOPIC_PREFIX = 'bench-concurrency'
+
+
+class SlowGemini:
+    """Local stand-in for Gemini that takes ``latency`` seconds to answer any prompt."""
+
+    def __init__(self, latency):
+        self.in_flight = 0
+        self.peak = 0
+        self.lock = threading.Lock()
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def do_POST(self):
+                body = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+                prompt = body['contents'][0]['parts'][0]['text']
+                topic = prompt.split("topic '")[1].split("'")[0]
+                num_questions = int(prompt.split(' with ')[1].split()[0])
+                with fake.lock:
+                    fake.in_flight += 1
+                    fake.peak = max(fake.peak, fake.in_flight)
+                time.sleep(latency)
+                with fake.lock:
+                    fake.in_flight -= 1
+                text = json.dumps({
+                    'title': f'{topic} Quiz',
+                    'description': '',
+                    'questions': [
+                        {'text': f'{topic} question {i}', 'choices': [
+                            {'text': 'Right', 'is_correct': True},
+                            {'text': 'Wrong', 'is_correct': False},
+                        ]}
+                        for i in range(num_questions)
+                    ],
+                })
+                event = {'candidates': [{'content': {'parts': [{'text': text}]}}]}
+                if 'streamGenerateContent' in self.path:
+                    data, content_type = f'data: {json.dumps(event)}\r\n\r\n'.encode(), 'text/event-stream'
+                else:
+                    data, content_type = json.dumps(event).encode(), 'application/json'
+                self.send_response(200)
+                self.send_header('Content-Type', content_type)
+                self.send_header('Content-Length', str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.url = f'http://127.0.0.1:{self.server.server_address[1]}'
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+class Command(BaseCommand):
+    help = (
+        'Compare how many slow generations one worker holds at once: the sync view on a '
+        'thread pool (a threaded WSGI worker) against the async view on one event loop '
+        '(an ASGI worker). Gemini is replaced by a local server with a fixed latency.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=20)
+        parser.add_argument('--latency', type=float, default=1.0, help='Seconds the fake Gemini takes per call')
+        parser.add_argument('--threads', type=int, default=4, help='Threads of the sync worker')
+        parser.add_argument('--questions', type=int, default=5)
+
+    def handle(self, *args, **options):
+        gemini = SlowGemini(options['latency'])
+        user = User.objects.create_user(username=f'{TOPIC_PREFIX}-{time.time_ns()}')
+        token = str(RefreshToken.for_user(user).access_token)
+        llm_backend = {
+            'BACKEND': 'quizzes.llm.GeminiBackend',
+            'OPTIONS': {'api_key': 'bench', 'base_url': gemini.url, 'pool_maxsize': options['threads']},
+        }
+        try:
+            with override_settings(LLM_BACKEND=llm_backend, ALLOWED_HOSTS=['*']):
+                get_generation_cache().clear()
+                self.stdout.write(f"{'path':>6} {'requests':>9} {'wall s':>8} {'req/s':>7} {'peak LLM calls':>15}")
+                for name, run in (('sync', self.run_sync), ('async', self.run_async)):
+                    gemini.peak = 0
+                    start = time.perf_counter()
+                    statuses = run(token, options)
+                    elapsed = time.perf_counter() - start
+                    failed = len([s for s in statuses if s != 201])
+                    self.stdout.write(
+                        f"{name:>6} {len(statuses):>9} {elapsed:>8.2f} {len(statuses) / elapsed:>7.1f} {gemini.peak:>15}"
+                        + (f'  ({failed} failed)' if failed else '')
+                    )
+        finally:
+            gemini.close()
+            Quiz.objects.filter(title__startswith=TOPIC_PREFIX).delete()
+            user.delete()
+
+    def payloads(self, name, options):
+        return [
+            {'topic': f'{TOPIC_PREFIX} {name} {i}', 'num_questions': options['questions']}
+            for i in range(options['requests'])
+        ]
+
+    def run_sync(self, token, options):
+        def post(payload):
+            try:
+                client = Client(HTTP_AUTHORIZATION=f'Bearer {token}')
+                return client.post(reverse('generate-quiz'), payload, content_type='application/json').status_code
+            finally:
+                connections.close_all()
+
+        with ThreadPoolExecutor(max_workers=options['threads']) as pool:
+            return list(pool.map(post, self.payloads('sync', options)))
+
+    def run_async(self, token, options):
+        async def main():
+            client = AsyncClient()
+            headers = {'Authorization': f'Bearer {token}'}
+            responses = await asyncio.gather(*[
+                client.post(reverse('generate-quiz-async'), payload, content_type='application/json', headers=headers)
+                for payload in self.payloads('async', options)
+            ])
+            return [response.status_code for response in responses]
+
+        return asyncio.run(main())
@@ -0,0 +1,127 @@
+import random
+import time
+from collections import Counter
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.db.models import Count, Sum
+
+from quizzes.models import Quiz, Question, Choice, QuizAttempt, UserAnswer
+from quizzes.stats import answer_counts, quiz_averages_query, recent_attempts_query
+
+PREFIX = 'bench-indexes'
+
+# Added by 0008_query_pattern_indexes for the queries below
+TUNED_INDEXES = {'choice_question_correct_idx', 'choice_correct_idx', 'attempt_quiz_user_idx'}
+
+
+def tuned_indexes():
+    for model in (Choice, QuizAttempt):
+        for index in model._meta.indexes:
+            if index.name in TUNED_INDEXES:
+                yield model, index
+
+
+def cases(user, quiz):
+    """The hot read queries, as querysets so they can be both timed and explained."""
+    return [
+        ('attempt history', recent_attempts_query(user, 5)),
+        ('quiz averages', quiz_averages_query(user, 10, materialized=False)),
+        ('quiz attempts by user', QuizAttempt.objects.filter(quiz=quiz).values('user').annotate(
+            total=Count('id'), score_sum=Sum('score'),
+        )),
+        ('answer counts by user', answer_counts(UserAnswer.objects.filter(attempt__quiz=quiz))),
+        ('answer key', Question.objects.filter(quiz=quiz).values_list('id', 'choice__id', 'choice__is_correct')),
+        ('correct choices', Choice.objects.filter(question__quiz=quiz, is_correct=True).values_list('id', flat=True)),
+    ]
+
+
+class Command(BaseCommand):
+    help = (
+        'Seed synthetic attempts and print EXPLAIN plans and timings of the hot queries '
+        'without and with the indexes of 0008_query_pattern_indexes. Everything is rolled back.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=500)
+        parser.add_argument('--quizzes', type=int, default=200)
+        parser.add_argument('--questions', type=int, default=10)
+        parser.add_argument('--choices', type=int, default=4)
+        parser.add_argument('--attempts', type=int, default=10000)
+        parser.add_argument('--repeat', type=int, default=20)
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            start = time.perf_counter()
+            user, quiz = self.seed(random.Random(options['seed']), options)
+            self.stdout.write(f'Seeded in {time.perf_counter() - start:.1f}s')
+
+            # Index DDL straight through the cursor: SQLite's schema editor refuses to run inside atomic()
+            editor = connection.schema_editor()
+            self.run_ddl([f'DROP INDEX {connection.ops.quote_name(index.name)}' for _, index in tuned_indexes()])
+            without = self.run('without the tuned indexes', user, quiz, options['repeat'])
+            self.run_ddl([index.create_sql(model, editor) for model, index in tuned_indexes()])
+            with_ = self.run('with the tuned indexes', user, quiz, options['repeat'])
+
+            self.stdout.write(f"\n{'query':<24} {'without ms':>11} {'with ms':>9} {'speedup':>8}")
+            for name, before in without.items():
+                after = with_[name]
+                self.stdout.write(f'{name:<24} {before:>11.2f} {after:>9.2f} {before / after:>7.1f}x')
+            transaction.set_rollback(True)
+
+    def run_ddl(self, statements):
+        with connection.cursor() as cursor:
+            for statement in statements:
+                cursor.execute(str(statement))
+            # Fresh statistics so the planner knows what the indexes are worth
+            cursor.execute('ANALYZE')
+
+    def run(self, title, user, quiz, repeat):
+        self.stdout.write(f'\n== {title} ==')
+        timings = {}
+        for name, queryset in cases(user, quiz):
+            best = float('inf')
+            for _ in range(repeat):
+                start = time.perf_counter()
+                list(queryset.all())
+                best = min(best, time.perf_counter() - start)
+            timings[name] = best * 1000
+            self.stdout.write(f'{name}: {timings[name]:.2f} ms')
+            for line in queryset.explain().splitlines():
+                self.stdout.write(f'    {line}')
+        return timings
+
+    def seed(self, rng, options):
+        users = User.objects.bulk_create(
+            [User(username=f'{PREFIX}-{i}') for i in range(options['users'])], batch_size=1000,
+        )
+        quizzes = Quiz.objects.bulk_create(
+            [Quiz(title=f'{PREFIX} {i}', description='') for i in range(options['quizzes'])], batch_size=1000,
+        )
+        questions = {quiz.pk: [Question(quiz=quiz, text=f'Question {i}') for i in range(options['questions'])] for quiz in quizzes}
+        Question.objects.bulk_create([q for qs in questions.values() for q in qs], batch_size=1000)
+        choices = {
+            question.pk: [Choice(question=question, text=f'Choice {j}', is_correct=j == 0) for j in range(options['choices'])]
+            for qs in questions.values() for question in qs
+        }
+        Choice.objects.bulk_create([c for cs in choices.values() for c in cs], batch_size=1000)
+
+        attempts, answers = [], []
+        for _ in range(options['attempts']):
+            quiz = rng.choice(quizzes)
+            attempt = QuizAttempt(user=rng.choice(users), quiz=quiz)
+            correct = 0
+            for question in questions[quiz.pk]:
+                choice = rng.choice(choices[question.pk])
+                correct += choice.is_correct
+                answers.append(UserAnswer(attempt=attempt, question=question, selected_choice=choice))
+            attempt.score = correct / options['questions'] * 100 if options['questions'] else 0
+            attempts.append(attempt)
+        QuizAttempt.objects.bulk_create(attempts, batch_size=1000)
+        UserAnswer.objects.bulk_create(answers, batch_size=1000)
+        # The busiest user and quiz, so every query has rows to find
+        [(user_id, _)] = Counter(a.user_id for a in attempts).most_common(1)
+        [(quiz_id, _)] = Counter(a.quiz_id for a in attempts).most_common(1)
+        return User.objects.get(pk=user_id), Quiz.objects.get(pk=quiz_id)
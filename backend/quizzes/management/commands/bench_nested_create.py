@@ -0,0 +1,74 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+
+from quizzes.models import Quiz, Question, Choice
+from quizzes.serializers import QuizNestedCreateSerializer
+
+
+def build_payload(num_questions, num_choices):
+    return {
+        'title': f'Benchmark quiz ({num_questions} questions)',
+        'description': '',
+        'questions': [
+            {
+                'text': f'Question {i}',
+                'choices': [
+                    {'text': f'Choice {j}', 'is_correct': j == 0}
+                    for j in range(num_choices)
+                ],
+            }
+            for i in range(num_questions)
+        ],
+    }
+
+
+def create_row_by_row(validated_data):
+    # The nested create as it was before bulk_create: one INSERT per row, no transaction
+    questions_data = validated_data.pop('questions', [])
+    quiz = Quiz.objects.create(**validated_data)
+    for q_data in questions_data:
+        choices_data = q_data.pop('choices', [])
+        question = Question.objects.create(quiz=quiz, **q_data)
+        for c_data in choices_data:
+            Choice.objects.create(question=question, **c_data)
+    return quiz
+
+
+class QueryCounter:
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        return execute(sql, params, many, context)
+
+
+def create_bulk(validated_data):
+    return QuizNestedCreateSerializer().create(validated_data)
+
+
+class Command(BaseCommand):
+    help = 'Compare row-by-row and bulk nested quiz creation. Everything is rolled back.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', type=int, nargs='+', default=[10, 100, 1000])
+        parser.add_argument('--choices', type=int, default=4)
+        parser.add_argument('--repeat', type=int, default=3)
+
+    def handle(self, *args, **options):
+        self.stdout.write(f"{'questions':>10} {'path':>12} {'queries':>8} {'best ms':>10}")
+        for size in options['sizes']:
+            for name, create in (('row-by-row', create_row_by_row), ('bulk', create_bulk)):
+                timings = []
+                for _ in range(options['repeat']):
+                    payload = build_payload(size, options['choices'])
+                    counter = QueryCounter()
+                    with transaction.atomic():
+                        with connection.execute_wrapper(counter):
+                            start = time.perf_counter()
+                            create(payload)
+                            timings.append(time.perf_counter() - start)
+                        transaction.set_rollback(True)
+                self.stdout.write(f'{size:>10} {name:>12} {counter.count:>8} {min(timings) * 1000:>10.1f}')
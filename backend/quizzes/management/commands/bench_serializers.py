@@ -0,0 +1,67 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from rest_framework.renderers import JSONRenderer
+
+from quizzes import fast_serializers
+from quizzes.fast_serializers import FastJSONRenderer, quiz_data
+from quizzes.management.commands.bench_nested_create import build_payload
+from quizzes.models import Quiz
+from quizzes.serializers import QuizNestedCreateSerializer, QuizSerializer
+
+
+def render_drf(quizzes):
+    quizzes = QuizSerializer.setup_eager_loading(quizzes)
+    return JSONRenderer().render(QuizSerializer(quizzes, many=True).data)
+
+
+def render_values(quizzes):
+    # Plain dicts from .values() rows, rendered with json.dumps
+    return JSONRenderer().render(quiz_data(quizzes.order_by('created_at', 'id')))
+
+
+def render_fast(quizzes):
+    return FastJSONRenderer().render(quiz_data(quizzes.order_by('created_at', 'id')))
+
+
+class Command(BaseCommand):
+    help = (
+        'Compare rendering full quizzes with the DRF serializers and with quizzes.fast_serializers, '
+        'queries included. Everything is rolled back.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--quizzes', type=int, default=50)
+        parser.add_argument('--questions', type=int, default=20)
+        parser.add_argument('--choices', type=int, default=4)
+        parser.add_argument('--repeat', type=int, default=5)
+
+    def handle(self, *args, **options):
+        paths = [('drf', render_drf), ('values', render_values)]
+        if fast_serializers.orjson is not None:
+            paths.append(('values+orjson', render_fast))
+        else:
+            self.stdout.write('orjson is not installed; skipping the orjson path')
+
+        with transaction.atomic():
+            serializer = QuizNestedCreateSerializer()
+            ids = [
+                serializer.create(build_payload(options['questions'], options['choices'])).pk
+                for _ in range(options['quizzes'])
+            ]
+            quizzes = Quiz.objects.filter(pk__in=ids)
+
+            expected = render_drf(quizzes)
+            self.stdout.write(f"{'path':>14} {'best ms':>10} {'quizzes/s':>10} {'identical':>10}")
+            for name, render in paths:
+                timings = []
+                for _ in range(options['repeat']):
+                    start = time.perf_counter()
+                    body = render(quizzes)
+                    timings.append(time.perf_counter() - start)
+                best = min(timings)
+                self.stdout.write(
+                    f"{name:>14} {best * 1000:>10.1f} {len(ids) / best:>10.0f} {'yes' if body == expected else 'NO':>10}"
+                )
+            transaction.set_rollback(True)
@@ -0,0 +1,27 @@
+import sys
+from contextlib import nullcontext
+
+from django.core.management.base import BaseCommand
+
+from quizzes.bulk import export_quizzes
+
+
+class Command(BaseCommand):
+    help = 'Export every quiz as newline-delimited JSON, one quiz per line (see quizzes.bulk).'
+
+    def add_arguments(self, parser):
+        parser.add_argument('file', nargs='?', default='-', help='Output file, or - for stdout (default)')
+        parser.add_argument('--chunk-size', type=int, default=500, help='Quizzes loaded per round of queries')
+
+    def handle(self, *args, **options):
+        exported = 0
+        chunk_size = options['chunk_size']
+        # Progress goes to stderr, as stdout may be the export itself
+        path = options['file']
+        with nullcontext(sys.stdout.buffer) if path == '-' else open(path, 'wb') as out:
+            for line in export_quizzes(chunk_size=chunk_size):
+                out.write(line)
+                exported += 1
+                if exported % chunk_size == 0:
+                    self.stderr.write(f'{exported} quiz(zes) exported')
+        self.stderr.write(self.style.SUCCESS(f'Exported {exported} quiz(zes)'))
@@ -0,0 +1,27 @@
+import json
+import sys
+from contextlib import nullcontext
+
+from django.core.management.base import BaseCommand
+
+from quizzes.bulk import import_quizzes
+
+
+class Command(BaseCommand):
+    help = 'Import quizzes from newline-delimited JSON, one quiz per line (see quizzes.bulk).'
+
+    def add_arguments(self, parser):
+        parser.add_argument('file', help='NDJSON file, or - for stdin')
+        parser.add_argument('--batch-size', type=int, default=500, help='Quizzes validated and written per transaction')
+
+    def handle(self, *args, **options):
+        def progress(p):
+            self.stdout.write(f'{p.lines} line(s) read, {p.created} quiz(zes) created, {p.failed} failed')
+
+        path = options['file']
+        with nullcontext(sys.stdin.buffer) if path == '-' else open(path, 'rb') as lines:
+            created, errors = import_quizzes(lines, options['batch_size'], progress)
+        for line, detail in errors:
+            self.stderr.write(f'line {line}: {json.dumps(detail)}')
+        style = self.style.WARNING if errors else self.style.SUCCESS
+        self.stdout.write(style(f'Imported {created} quiz(zes), skipped {len(errors)} invalid line(s)'))
@@ -0,0 +1,20 @@
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+
+from quizzes.stats import rebuild_stats
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the dashboard stats tables from the raw attempt history.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('usernames', nargs='*', help='Only rebuild these users (default: everyone)')
+
+    def handle(self, *args, **options):
+        user_ids = None
+        if options['usernames']:
+            user_ids = list(User.objects.filter(username__in=options['usernames']).values_list('id', flat=True))
+            if len(user_ids) != len(set(options['usernames'])):
+                raise CommandError('Unknown username in: ' + ', '.join(options['usernames']))
+        rebuilt = rebuild_stats(user_ids)
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt dashboard stats for {rebuilt} user(s)'))
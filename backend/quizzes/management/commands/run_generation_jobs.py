@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from quizzes.jobs import run_job
+from quizzes.models import GenerationJob
+
+
+class Command(BaseCommand):
+    help = 'Run pending quiz generation jobs in this process, e.g. jobs left behind by a server restart.'
+
+    def handle(self, *args, **options):
+        pending = GenerationJob.objects.filter(status=GenerationJob.PENDING).order_by('created_at')
+        job_ids = list(pending.values_list('id', flat=True))
+        for job_id in job_ids:
+            run_job(job_id)
+            job = GenerationJob.objects.get(pk=job_id)
+            self.stdout.write(f'{job_id} {job.status}')
+        self.stdout.write(self.style.SUCCESS(f'Ran {len(job_ids)} job(s)'))
@@ -0,0 +1,46 @@
+# Generated by Django 5.2.7 on 2026-10-18 21:19
+
+import django.db.models.deletion
+import uuid
+from django.conf import settings
+from django.db import migrations, models
+
+
+def backfill_leaderboard(apps, schema_editor):
+    # Each user's best score on each quiz, and when it was first reached
+    QuizAttempt = apps.get_model('quizzes', 'QuizAttempt')
+    LeaderboardEntry = apps.get_model('quizzes', 'LeaderboardEntry')
+    entries = {}
+    attempts = QuizAttempt.objects.order_by('-score', 'completed_at').values_list('user_id', 'quiz_id', 'score', 'completed_at')
+    for user_id, quiz_id, score, completed_at in attempts.iterator():
+        if (user_id, quiz_id) not in entries:
+            entries[user_id, quiz_id] = LeaderboardEntry(
+                user_id=user_id, quiz_id=quiz_id, best_score=score, achieved_at=completed_at,
+            )
+    LeaderboardEntry.objects.bulk_create(entries.values(), batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('quizzes', '0008_query_pattern_indexes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LeaderboardEntry',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('best_score', models.FloatField()),
+                ('achieved_at', models.DateTimeField()),
+                ('quiz', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='quizzes.quiz')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['quiz', '-best_score', 'achieved_at'], name='leaderboard_quiz_rank_idx')],
+                'unique_together': {('user', 'quiz')},
+            },
+        ),
+        migrations.RunPython(backfill_leaderboard, migrations.RunPython.noop),
+    ]
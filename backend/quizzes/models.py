@@ -1,5 +1,6 @@
 from django.db import models
 from django.contrib.auth.models import User 
+from django.utils import timezone
 import uuid
 # Create your models here.
 class Quiz(models.Model):
@@ -7,9 +8,28 @@ class Quiz(models.Model):
  title = models.CharField(max_length=200)
  description = models.TextField(blank=True, null=True)
  created_at = models.DateTimeField(auto_now_add=True)
+ # Content version, bumped by quizzes.signals whenever the quiz, its questions or its choices change
+ version = models.PositiveIntegerField(default=1, editable=False)
+ # When the version was last bumped, i.e. the Last-Modified of the quiz's content
+ updated_at = models.DateTimeField(default=timezone.now, editable=False)
+
+ class Meta:
+  indexes = [
+   # Keyset pagination of the quiz list
+   models.Index(fields=['created_at', 'id'], name='quiz_created_id_idx'),
+  ]
 
  def __str__(self):
   return self.title
+
+ def save(self, *args, **kwargs):
+  # Never write back a version read before a concurrent bump
+  if not self._state.adding and kwargs.get('update_fields') is None:
+   kwargs['update_fields'] = [
+    field.name for field in self._meta.concrete_fields
+    if not field.primary_key and field.name not in ('version', 'updated_at')
+   ]
+  super().save(*args, **kwargs)
  
 class Question(models.Model):
  id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
@@ -24,6 +44,14 @@ class Choice(models.Model):
  question = models.ForeignKey(Question, on_delete=models.CASCADE)
  text = models.CharField(max_length=200)
  is_correct = models.BooleanField(default=False)
+
+ class Meta:
+  indexes = [
+   # A question's choices with their correctness, as the answer key reads them
+   models.Index(fields=['question', 'is_correct'], name='choice_question_correct_idx'),
+   # Only the correct choices, a small fraction of the table
+   models.Index(fields=['question'], condition=models.Q(is_correct=True), name='choice_correct_idx'),
+  ]
  
  def __str__(self):
   return self.text
@@ -35,6 +63,14 @@ class QuizAttempt(models.Model):
  score = models.FloatField(default=0)
  completed_at = models.DateTimeField(auto_now_add=True)
 
+ class Meta:
+  indexes = [
+   # Keyset pagination of a user's attempt history, newest first by scanning it backwards
+   models.Index(fields=['user', 'completed_at', 'id'], name='attempt_user_completed_idx'),
+   # A quiz's attempts grouped by user, as the per-quiz stats are rebuilt
+   models.Index(fields=['quiz', 'user'], name='attempt_quiz_user_idx'),
+  ]
+
  def __str__(self):
   return f"{self.user.username} - {self.quiz.title} ({self.score}%)"
 
@@ -50,3 +86,80 @@ class UserAnswer(models.Model):
  def __str__(self):
   return f"{self.attempt.user.username}: {self.question.text[:30]}"
  
+
+class UserStats(models.Model):
+ # Running totals over a user's attempts, kept up to date by quizzes.stats
+ user = models.OneToOneField(User, on_delete=models.CASCADE, primary_key=True)
+ total_attempts = models.PositiveIntegerField(default=0)
+ score_sum = models.FloatField(default=0)
+ correct_answers = models.PositiveIntegerField(default=0)
+ wrong_answers = models.PositiveIntegerField(default=0)
+
+ @property
+ def avg_score(self):
+  return self.score_sum / self.total_attempts if self.total_attempts else 0
+
+ def __str__(self):
+  return f"{self.user.username} ({self.total_attempts} attempts)"
+
+class UserQuizStats(models.Model):
+ id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+ user = models.ForeignKey(User, on_delete=models.CASCADE)
+ quiz = models.ForeignKey(Quiz, on_delete=models.CASCADE)
+ attempts = models.PositiveIntegerField(default=0)
+ score_sum = models.FloatField(default=0)
+ avg_score = models.FloatField(default=0)
+
+ class Meta:
+  unique_together = ('user', 'quiz')
+  indexes = [
+   # Dashboard's best quizzes per user
+   models.Index(fields=['user', '-avg_score'], name='userquizstats_user_avg_idx'),
+  ]
+
+ def __str__(self):
+  return f"{self.user.username} - {self.quiz.title} ({self.avg_score}%)"
+
+class LeaderboardEntry(models.Model):
+ # A user's best score on a quiz, kept up to date by quizzes.leaderboard
+ id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+ user = models.ForeignKey(User, on_delete=models.CASCADE)
+ quiz = models.ForeignKey(Quiz, on_delete=models.CASCADE)
+ best_score = models.FloatField()
+ # When best_score was first reached; the earlier of two equal scores ranks higher
+ achieved_at = models.DateTimeField()
+
+ class Meta:
+  unique_together = ('user', 'quiz')
+  indexes = [
+   # A quiz's ranking in index order, so top-N and rank counts are range scans
+   models.Index(fields=['quiz', '-best_score', 'achieved_at'], name='leaderboard_quiz_rank_idx'),
+  ]
+
+ def __str__(self):
+  return f"{self.user.username} - {self.quiz.title} ({self.best_score}%)"
+
+class GenerationJob(models.Model):
+ PENDING = 'pending'
+ RUNNING = 'running'
+ SUCCEEDED = 'succeeded'
+ FAILED = 'failed'
+ STATUS_CHOICES = [
+  (PENDING, 'Pending'),
+  (RUNNING, 'Running'),
+  (SUCCEEDED, 'Succeeded'),
+  (FAILED, 'Failed'),
+ ]
+
+ id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+ user = models.ForeignKey(User, on_delete=models.CASCADE)
+ topic = models.CharField(max_length=200)
+ num_questions = models.PositiveIntegerField(default=5)
+ status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=PENDING)
+ quiz = models.ForeignKey(Quiz, on_delete=models.SET_NULL, null=True, blank=True)
+ error = models.JSONField(null=True, blank=True)
+ created_at = models.DateTimeField(auto_now_add=True)
+ updated_at = models.DateTimeField(auto_now=True)
+
+ def __str__(self):
+  return f"{self.user.username} - {self.topic} ({self.status})"
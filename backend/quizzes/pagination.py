@@ -0,0 +1,93 @@
+import base64
+import json
+import uuid
+
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import replace_query_param
+
+
+class KeysetPagination(BasePagination):
+    """
+    Keyset pagination over a (timestamp, id) ordering.
+
+    The cursor is the key of the last row of the previous page, so every page is
+    a range scan on the matching composite index, with no COUNT(*) and no OFFSET.
+    Pass an empty ``cursor`` to get the first page.
+    """
+    page_size = api_settings.PAGE_SIZE
+    cursor_query_param = 'cursor'
+    ordering = ('created_at', 'id')
+    invalid_cursor_message = 'Invalid cursor'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        field, tiebreaker = (name.lstrip('-') for name in self.ordering)
+        lookup = 'lt' if self.ordering[0].startswith('-') else 'gt'
+
+        queryset = queryset.order_by(*self.ordering)
+        position = self.decode_cursor(request)
+        if position is not None:
+            value, pk = position
+            # (field, id) > (value, pk), written so the index range starts at value
+            queryset = queryset.filter(**{f'{field}__{lookup}e': value}).filter(
+                Q(**{f'{field}__{lookup}': value}) | Q(**{f'{tiebreaker}__{lookup}': pk})
+            )
+
+        rows = list(queryset[:self.page_size + 1])
+        self.page = rows[:self.page_size]
+        self.next_position = None
+        if len(rows) > self.page_size:
+            last = self.page[-1]
+            self.next_position = (getattr(last, field), getattr(last, tiebreaker))
+        return self.page
+
+    def get_paginated_response(self, data):
+        return Response({
+            'next': self.get_next_link(),
+            'results': data,
+        })
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'required': ['results'],
+            'properties': {
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'results': schema,
+            },
+        }
+
+    def get_next_link(self):
+        if self.next_position is None:
+            return None
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, self.cursor_query_param, self.encode_cursor(self.next_position))
+
+    def encode_cursor(self, position):
+        value, pk = position
+        raw = json.dumps([value.isoformat(), str(pk)]).encode()
+        return base64.urlsafe_b64encode(raw).decode()
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+        try:
+            value, pk = json.loads(base64.urlsafe_b64decode(encoded.encode()))
+            value = parse_datetime(value)
+            pk = uuid.UUID(pk)
+        except (TypeError, ValueError, AttributeError):
+            raise NotFound(self.invalid_cursor_message)
+        if value is None:
+            raise NotFound(self.invalid_cursor_message)
+        return value, pk
+
+
+class AttemptKeysetPagination(KeysetPagination):
+    # Most recent attempts first
+    ordering = ('-completed_at', '-id')
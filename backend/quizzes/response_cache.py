@@ -0,0 +1,219 @@
+"""
+Cache of the rendered JSON of the public quiz reads, the quiz detail and the
+quiz list pages, so a hit skips both the queries and the serializers.
+
+Entries live in a size-bounded LRU in each process and, when ``SHARED`` names a
+cache alias, in that cache too so every worker can serve them. Writes invalidate
+through quizzes.signals: in this process exactly the quiz's detail and the list
+pages showing it are dropped, or every list page when a quiz is created or
+deleted since each page carries the total count. The shared tier stamps entries
+with a generation number, one per quiz for details and one for all list pages,
+which invalidation moves on, so an entry rendered from rows read before a write
+can never be stored as current.
+
+A write in one process cannot reach another process's in-process tier, so
+those entries are only trusted for ``LOCAL_TTL`` seconds.
+"""
+import hashlib
+import threading
+import time
+from collections import OrderedDict, namedtuple
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+
+SHARED_PREFIX = 'quizzes:response'
+
+# JSON bytes, the headers sent with them and the ids of the quizzes they show
+CachedResponse = namedtuple('CachedResponse', ['body', 'headers', 'quiz_ids'])
+
+# Handed out on a miss and given back to store(): the invalidations seen before
+# the rows were read
+Ticket = namedtuple('Ticket', ['epoch', 'generation'])
+
+
+def detail_key(quiz_id):
+    return ('detail', str(quiz_id))
+
+
+def list_key(url):
+    return ('list', url)
+
+
+class ResponseCache:
+    def __init__(self, max_bytes=32 * 1024 * 1024, local_ttl=5, shared=None, shared_ttl=60 * 60, clock=time.monotonic):
+        self.max_bytes = max_bytes
+        self.local_ttl = local_ttl
+        self.shared_alias = shared
+        self.shared_ttl = shared_ttl
+        self.clock = clock
+        self.size = 0
+        self.local_hits = 0
+        self.shared_hits = 0
+        self.misses = 0
+        self.bytes_served = 0
+        self.evictions = 0
+        self._entries = OrderedDict()
+        self._keys_by_quiz = {}
+        # Moves on with every invalidation; a store() that saw an older epoch is dropped
+        self._epoch = 0
+        self._lock = threading.Lock()
+
+    @property
+    def shared(self):
+        return caches[self.shared_alias] if self.shared_alias else None
+
+    def get(self, key):
+        """``(response, None)`` on a hit, ``(None, ticket)`` on a miss."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                expires_at, response = entry
+                if expires_at is None or expires_at > self.clock():
+                    self._entries.move_to_end(key)
+                    self.local_hits += 1
+                    self.bytes_served += len(response.body)
+                    return response, None
+                self._remove(key)
+            epoch = self._epoch
+
+        generation = None
+        shared = self.shared
+        if shared is not None:
+            shared_key, generation_key = self._shared_key(key), self._generation_key(key)
+            found = shared.get_many([shared_key, generation_key])
+            generation = found.get(generation_key)
+            if generation is None:
+                generation = self._start_generation(generation_key)
+            stamped = found.get(shared_key)
+            if stamped is not None and stamped[0] == generation:
+                response = stamped[1]
+                with self._lock:
+                    self.shared_hits += 1
+                    self.bytes_served += len(response.body)
+                    if self._epoch == epoch:
+                        self._put(key, response)
+                return response, None
+
+        with self._lock:
+            self.misses += 1
+        return None, Ticket(epoch, generation)
+
+    def store(self, key, ticket, response):
+        if ticket.generation is not None and self.shared is not None:
+            self.shared.set(self._shared_key(key), (ticket.generation, response), self.shared_ttl)
+        with self._lock:
+            if self._epoch == ticket.epoch:
+                self._put(key, response)
+
+    def invalidate(self, quiz_id, lists=False):
+        """
+        Drop every response showing quiz ``quiz_id``, and with ``lists`` every list
+        page, as when the quiz is created or deleted.
+        """
+        quiz_id = str(quiz_id)
+        with self._lock:
+            self._epoch += 1
+            keys = set(self._keys_by_quiz.get(quiz_id, ()))
+            if lists:
+                keys.update(key for key in self._entries if key[0] == 'list')
+            for key in keys:
+                self._remove(key)
+
+        shared = self.shared
+        if shared is not None:
+            # Which shared list pages show the quiz is not recorded, so they all go
+            for generation_key in (self._generation_key(detail_key(quiz_id)), self._generation_key(list_key(None))):
+                try:
+                    shared.incr(generation_key)
+                except ValueError:
+                    self._start_generation(generation_key)
+
+    def clear(self):
+        with self._lock:
+            self._epoch += 1
+            self._entries.clear()
+            self._keys_by_quiz.clear()
+            self.size = 0
+            self.local_hits = self.shared_hits = self.misses = 0
+            self.bytes_served = self.evictions = 0
+
+    def stats(self):
+        with self._lock:
+            hits = self.local_hits + self.shared_hits
+            lookups = hits + self.misses
+            return {
+                "local_hits": self.local_hits,
+                "shared_hits": self.shared_hits,
+                "misses": self.misses,
+                "hit_ratio": hits / lookups if lookups else 0,
+                "bytes_served": self.bytes_served,
+                "entries": len(self._entries),
+                "bytes": self.size,
+                "max_bytes": self.max_bytes,
+                "evictions": self.evictions,
+            }
+
+    def _put(self, key, response):
+        size = len(response.body)
+        if size > self.max_bytes:
+            return
+        if key in self._entries:
+            self._remove(key)
+        expires_at = None if self.local_ttl is None else self.clock() + self.local_ttl
+        self._entries[key] = (expires_at, response)
+        self.size += size
+        for quiz_id in response.quiz_ids:
+            self._keys_by_quiz.setdefault(quiz_id, set()).add(key)
+        while self.size > self.max_bytes:
+            self._remove(next(iter(self._entries)))
+            self.evictions += 1
+
+    def _remove(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        response = entry[1]
+        self.size -= len(response.body)
+        for quiz_id in response.quiz_ids:
+            keys = self._keys_by_quiz.get(quiz_id)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._keys_by_quiz[quiz_id]
+
+    def _shared_key(self, key):
+        kind, ident = key
+        return f'{SHARED_PREFIX}:{kind}:{hashlib.sha1(ident.encode()).hexdigest()}'
+
+    def _generation_key(self, key):
+        kind, ident = key
+        return f'{SHARED_PREFIX}:generation:' + (ident if kind == 'detail' else 'lists')
+
+    def _start_generation(self, generation_key):
+        # Starting from the clock, a generation evicted from the shared cache
+        # can't restart at a number old entries are stamped with
+        self.shared.add(generation_key, time.time_ns(), None)
+        return self.shared.get(generation_key)
+
+
+_response_cache = None
+
+
+def get_response_cache():
+    global _response_cache
+    if _response_cache is None:
+        config = settings.QUIZ_RESPONSE_CACHE
+        _response_cache = ResponseCache(
+            config['MAX_BYTES'], config['LOCAL_TTL'], config['SHARED'], config['SHARED_TTL'],
+        )
+    return _response_cache
+
+
+@receiver(setting_changed)
+def reset_response_cache(setting, **kwargs):
+    global _response_cache
+    if setting == 'QUIZ_RESPONSE_CACHE':
+        _response_cache = None
@@ -1,5 +1,8 @@
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, Prefetch
 from rest_framework import serializers
-from .models import Quiz, Question, Choice
+from .models import Quiz, Question, Choice, QuizAttempt, GenerationJob
 
 # -------------------- READ-ONLY SERIALIZERS --------------------
 class ChoiceSerializer(serializers.ModelSerializer):
@@ -7,6 +10,10 @@ class ChoiceSerializer(serializers.ModelSerializer):
         model = Choice
         fields = ['id', 'question', 'text', 'is_correct']
 
+    @staticmethod
+    def setup_eager_loading(queryset):
+        return queryset.only('id', 'question_id', 'text', 'is_correct')
+
 class QuestionSerializer(serializers.ModelSerializer):
     choices = ChoiceSerializer(many=True, read_only=True, source='choice_set')
 
@@ -14,6 +21,14 @@ class QuestionSerializer(serializers.ModelSerializer):
         model = Question
         fields = ['id', 'quiz', 'text', 'choices']
 
+    @staticmethod
+    def setup_eager_loading(queryset):
+        # The choices of every question in the queryset, in one extra query
+        choices = ChoiceSerializer.setup_eager_loading(Choice.objects.all())
+        return queryset.only('id', 'quiz_id', 'text').prefetch_related(
+            Prefetch('choice_set', queryset=choices)
+        )
+
 class QuizSerializer(serializers.ModelSerializer):
     questions = QuestionSerializer(many=True, read_only=True, source='question_set')
 
@@ -21,6 +36,38 @@ class QuizSerializer(serializers.ModelSerializer):
         model = Quiz
         fields = ['id', 'title', 'description', 'created_at', 'questions']
 
+    @staticmethod
+    def setup_eager_loading(queryset):
+        # Questions and choices are fetched in two queries whatever the page size
+        questions = QuestionSerializer.setup_eager_loading(Question.objects.all())
+        return queryset.order_by('created_at', 'id').prefetch_related(
+            Prefetch('question_set', queryset=questions)
+        )
+
+class QuizCatalogSerializer(serializers.ModelSerializer):
+    question_count = serializers.IntegerField(read_only=True)
+
+    class Meta:
+        model = Quiz
+        fields = ['id', 'title', 'description', 'created_at', 'question_count']
+
+    @staticmethod
+    def setup_eager_loading(queryset):
+        return queryset.annotate(question_count=Count('question')).order_by('created_at', 'id')
+
+class QuizAttemptSerializer(serializers.ModelSerializer):
+    quiz_title = serializers.CharField(source='quiz.title', read_only=True)
+
+    class Meta:
+        model = QuizAttempt
+        fields = ['id', 'quiz', 'quiz_title', 'score', 'completed_at']
+
+    @staticmethod
+    def setup_eager_loading(queryset):
+        return queryset.select_related('quiz').only(
+            'id', 'quiz_id', 'quiz__title', 'score', 'completed_at'
+        )
+
 
 # -------------------- WRITABLE NESTED SERIALIZERS --------------------
 class ChoiceCreateSerializer(serializers.ModelSerializer):
@@ -43,11 +90,38 @@ class QuizNestedCreateSerializer(serializers.ModelSerializer):
         fields = ['id', 'title', 'description', 'questions']
 
     def create(self, validated_data):
+        quiz, questions, choices = self.build(validated_data)
+        with transaction.atomic():
+            quiz.save(force_insert=True)
+            Question.objects.bulk_create(questions)
+            Choice.objects.bulk_create(choices)
+        return quiz
+
+    @staticmethod
+    def build(validated_data):
+        """Unsaved (quiz, questions, choices) for validated data, ready for bulk_create."""
         questions_data = validated_data.pop('questions', [])
-        quiz = Quiz.objects.create(**validated_data)
+        # Primary keys are generated client side, so every child can be linked in
+        # memory and written with one bulk INSERT per model
+        quiz = Quiz(**validated_data)
+        questions = []
+        choices = []
         for q_data in questions_data:
             choices_data = q_data.pop('choices', [])
-            question = Question.objects.create(quiz=quiz, **q_data)
+            question = Question(quiz=quiz, **q_data)
+            questions.append(question)
             for c_data in choices_data:
-                Choice.objects.create(question=question, **c_data)
-        return quiz
+                choices.append(Choice(question=question, **c_data))
+        return quiz, questions, choices
+
+
+# -------------------- AI GENERATION --------------------
+class GenerateQuizRequestSerializer(serializers.Serializer):
+    topic = serializers.CharField(max_length=200)
+    num_questions = serializers.IntegerField(min_value=1, max_value=settings.QUIZ_GENERATION_MAX_QUESTIONS, default=5)
+
+class GenerationJobSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = GenerationJob
+        fields = ['id', 'topic', 'num_questions', 'status', 'quiz', 'error', 'created_at', 'updated_at']
+        read_only_fields = fields
@@ -0,0 +1,93 @@
+from django.db.models import F, QuerySet
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete, pre_delete, pre_save
+from django.dispatch import receiver
+from django.utils import timezone
+from .models import Quiz, Question, Choice, UserAnswer
+from .response_cache import get_response_cache
+from .stats import forget_answer_stats, forget_quiz_stats
+
+
+def bump_quiz_version(**filters):
+    Quiz.objects.filter(**filters).update(version=F('version') + 1, updated_at=timezone.now())
+
+
+def forget_responses(quiz_id, lists=False):
+    # Now for the writer's own reads, and again on commit for readers that loaded
+    # the old rows while the write was in flight
+    get_response_cache().invalidate(quiz_id, lists)
+    transaction.on_commit(lambda: get_response_cache().invalidate(quiz_id, lists))
+
+
+def deleted_by_cascade(origin, *parents):
+    # post_delete's origin is the instance or queryset delete() was called on
+    model = origin.model if isinstance(origin, QuerySet) else type(origin)
+    return model in parents
+
+@receiver(post_save, sender=Quiz)
+def quiz_saved(sender, instance, created, **kwargs):
+    if not created:
+        bump_quiz_version(pk=instance.pk)
+    # A new quiz changes the count on every list page
+    forget_responses(instance.pk, lists=created)
+
+@receiver(pre_delete, sender=Quiz)
+def quiz_deleting(sender, instance, **kwargs):
+    # Attempts go with the quiz, so they leave the dashboard totals too
+    forget_quiz_stats(instance)
+
+@receiver(post_delete, sender=Quiz)
+def quiz_deleted(sender, instance, **kwargs):
+    forget_responses(instance.pk, lists=True)
+
+def forget_moved_from(instance, quiz_id):
+    # An update can move a question or choice to another quiz, which changes too
+    previous = getattr(instance, '_previous_quiz_id', None)
+    if previous is not None and previous != quiz_id:
+        bump_quiz_version(pk=previous)
+        forget_responses(previous)
+
+@receiver(pre_save, sender=Question)
+def question_saving(sender, instance, **kwargs):
+    if not instance._state.adding:
+        instance._previous_quiz_id = Question.objects.filter(pk=instance.pk).values_list('quiz_id', flat=True).first()
+
+@receiver(post_save, sender=Question)
+def question_saved(sender, instance, **kwargs):
+    bump_quiz_version(pk=instance.quiz_id)
+    forget_responses(instance.quiz_id)
+    forget_moved_from(instance, instance.quiz_id)
+
+@receiver(pre_delete, sender=Question)
+def question_deleting(sender, instance, origin=None, **kwargs):
+    # Its answers go with it; the attempts and their scores stay
+    if not deleted_by_cascade(origin, Quiz):
+        forget_answer_stats(UserAnswer.objects.filter(question=instance))
+
+@receiver(post_delete, sender=Question)
+def question_deleted(sender, instance, origin=None, **kwargs):
+    if not deleted_by_cascade(origin, Quiz):
+        bump_quiz_version(pk=instance.quiz_id)
+        forget_responses(instance.quiz_id)
+
+@receiver(pre_save, sender=Choice)
+def choice_saving(sender, instance, **kwargs):
+    if not instance._state.adding:
+        instance._previous_quiz_id = Choice.objects.filter(pk=instance.pk).values_list('question__quiz_id', flat=True).first()
+
+@receiver(post_save, sender=Choice)
+def choice_saved(sender, instance, **kwargs):
+    bump_quiz_version(question__id=instance.question_id)
+    forget_responses(instance.question.quiz_id)
+    forget_moved_from(instance, instance.question.quiz_id)
+
+@receiver(pre_delete, sender=Choice)
+def choice_deleting(sender, instance, origin=None, **kwargs):
+    if not deleted_by_cascade(origin, Quiz, Question):
+        forget_answer_stats(UserAnswer.objects.filter(selected_choice=instance))
+
+@receiver(post_delete, sender=Choice)
+def choice_deleted(sender, instance, origin=None, **kwargs):
+    if not deleted_by_cascade(origin, Quiz, Question):
+        bump_quiz_version(question__id=instance.question_id)
+        forget_responses(instance.question.quiz_id)
@@ -0,0 +1,230 @@
+from django.apps import apps as global_apps
+from django.db import IntegrityError, transaction
+from django.db.models import Avg, Count, F, Q, Sum
+
+from .models import QuizAttempt, UserAnswer, UserStats, UserQuizStats
+
+
+# -------------------- QUERIES --------------------
+# Each query has an async twin (a-prefixed) built on the async ORM for ASGI views
+def _summary_query(attempts):
+    per_attempt = attempts.order_by().annotate(
+        correct=Count('useranswer', filter=Q(useranswer__selected_choice__is_correct=True)),
+        wrong=Count('useranswer', filter=Q(useranswer__selected_choice__is_correct=False)),
+    )
+    return per_attempt, dict(
+        total_attempts=Count('id'),
+        avg_score=Avg('score'),
+        correct_answers=Sum('correct'),
+        wrong_answers=Sum('wrong'),
+    )
+
+
+def attempt_summary(attempts):
+    """
+    Totals over any QuizAttempt queryset in a single query: attempt count, average
+    score, and correct/wrong answer counts from conditional aggregates.
+    """
+    per_attempt, aggregates = _summary_query(attempts)
+    summary = per_attempt.aggregate(**aggregates)
+    return {key: value or 0 for key, value in summary.items()}
+
+
+async def aattempt_summary(attempts):
+    per_attempt, aggregates = _summary_query(attempts)
+    summary = await per_attempt.aaggregate(**aggregates)
+    return {key: value or 0 for key, value in summary.items()}
+
+
+def _stats_summary(stats):
+    return {
+        'total_attempts': stats.total_attempts,
+        'avg_score': stats.avg_score,
+        'correct_answers': stats.correct_answers,
+        'wrong_answers': stats.wrong_answers,
+    }
+
+
+def user_summary(user):
+    """A user's totals from UserStats, or live from the raw history when no row exists yet."""
+    stats = UserStats.objects.filter(user_id=user.pk).first()
+    if stats is None:
+        return attempt_summary(QuizAttempt.objects.filter(user_id=user.pk)), False
+    return _stats_summary(stats), True
+
+
+async def auser_summary(user):
+    stats = await UserStats.objects.filter(user_id=user.pk).afirst()
+    if stats is None:
+        return await aattempt_summary(QuizAttempt.objects.filter(user_id=user.pk)), False
+    return _stats_summary(stats), True
+
+
+def quiz_averages_query(user, limit, materialized):
+    """The queryset behind quiz_averages(): quiz_title, average and total rows, best first."""
+    if materialized:
+        rows = UserQuizStats.objects.filter(user_id=user.pk).values(
+            quiz_title=F('quiz__title'), average=F('avg_score'), total=F('attempts'),
+        ).order_by('-avg_score')
+    else:
+        rows = QuizAttempt.objects.filter(user_id=user.pk).values(quiz_title=F('quiz__title')).annotate(
+            average=Avg('score'), total=Count('id'),
+        ).order_by('-average')
+    return rows[:limit]
+
+
+def _quiz_average(row):
+    return {'quiz_title': row['quiz_title'], 'avg_score': round(row['average'] or 0, 2), 'attempts': row['total']}
+
+
+def quiz_averages(user, limit=10, materialized=True):
+    """A user's best quizzes by average score, as (quiz_title, avg_score, attempts) dicts."""
+    return [_quiz_average(row) for row in quiz_averages_query(user, limit, materialized)]
+
+
+async def aquiz_averages(user, limit=10, materialized=True):
+    return [_quiz_average(row) async for row in quiz_averages_query(user, limit, materialized)]
+
+
+def recent_attempts_query(user, limit):
+    """The queryset behind recent_attempts(): the user's latest attempts with their quiz titles."""
+    return QuizAttempt.objects.filter(user_id=user.pk).select_related('quiz').only(
+        'id', 'quiz__title', 'score', 'completed_at'
+    ).order_by('-completed_at')[:limit]
+
+
+def _recent_attempt(a):
+    return {'id': a.id, 'quiz_title': a.quiz.title, 'score': a.score, 'completed_at': a.completed_at}
+
+
+def recent_attempts(user, limit=5):
+    return [_recent_attempt(a) for a in recent_attempts_query(user, limit)]
+
+
+async def arecent_attempts(user, limit=5):
+    return [_recent_attempt(a) async for a in recent_attempts_query(user, limit)]
+
+
+# -------------------- MAINTENANCE --------------------
+def update_or_create_row(model, lookup, updates, defaults):
+    """
+    Apply ``updates`` (F() expressions) to the row matching ``lookup`` in one UPDATE,
+    or create it from ``defaults`` when there is none. A concurrent first write
+    that loses the INSERT race falls back to the UPDATE.
+    """
+    if model.objects.filter(**lookup).update(**updates):
+        return
+    try:
+        with transaction.atomic():
+            model.objects.create(**lookup, **defaults)
+    except IntegrityError:
+        model.objects.filter(**lookup).update(**updates)
+
+
+def answer_counts(answers):
+    return answers.values('attempt__user').annotate(
+        correct=Count('id', filter=Q(selected_choice__is_correct=True)),
+        wrong=Count('id', filter=Q(selected_choice__is_correct=False)),
+    )
+
+
+def record_attempt_stats(attempt, grade):
+    """Fold one graded attempt into the user's running totals."""
+    correct = grade.correct
+    wrong = len(grade.selections) - grade.correct
+    update_or_create_row(
+        UserStats,
+        {'user_id': attempt.user_id},
+        {
+            'total_attempts': F('total_attempts') + 1,
+            'score_sum': F('score_sum') + attempt.score,
+            'correct_answers': F('correct_answers') + correct,
+            'wrong_answers': F('wrong_answers') + wrong,
+        },
+        {'total_attempts': 1, 'score_sum': attempt.score, 'correct_answers': correct, 'wrong_answers': wrong},
+    )
+    update_or_create_row(
+        UserQuizStats,
+        {'user_id': attempt.user_id, 'quiz_id': attempt.quiz_id},
+        {
+            'attempts': F('attempts') + 1,
+            'score_sum': F('score_sum') + attempt.score,
+            # Right-hand sides see the row before the update
+            'avg_score': (F('score_sum') + attempt.score) / (F('attempts') + 1),
+        },
+        {'attempts': 1, 'score_sum': attempt.score, 'avg_score': attempt.score},
+    )
+
+
+def forget_quiz_stats(quiz):
+    """Take a quiz's attempts out of the running totals before it is deleted."""
+    answers = {row['attempt__user']: row for row in answer_counts(UserAnswer.objects.filter(attempt__quiz=quiz))}
+    attempts = QuizAttempt.objects.filter(quiz=quiz).values('user').annotate(total=Count('id'), score_sum=Sum('score'))
+    for row in attempts:
+        counts = answers.get(row['user'], {'correct': 0, 'wrong': 0})
+        UserStats.objects.filter(user_id=row['user']).update(
+            total_attempts=F('total_attempts') - row['total'],
+            score_sum=F('score_sum') - row['score_sum'],
+            correct_answers=F('correct_answers') - counts['correct'],
+            wrong_answers=F('wrong_answers') - counts['wrong'],
+        )
+
+
+def forget_answer_stats(answers):
+    """Take answers out of the correct/wrong totals before they are deleted with their question or choice."""
+    for row in answer_counts(answers):
+        UserStats.objects.filter(user_id=row['attempt__user']).update(
+            correct_answers=F('correct_answers') - row['correct'],
+            wrong_answers=F('wrong_answers') - row['wrong'],
+        )
+
+
+def rebuild_stats(user_ids=None, apps=None):
+    """
+    Recompute UserStats and UserQuizStats from the raw attempt history. Migrations
+    pass their ``apps`` so the historical models are used.
+    """
+    QuizAttempt, UserAnswer, UserStats, UserQuizStats = (
+        (apps or global_apps).get_model('quizzes', name) for name in ('QuizAttempt', 'UserAnswer', 'UserStats', 'UserQuizStats')
+    )
+    attempts = QuizAttempt.objects.all()
+    answers = UserAnswer.objects.all()
+    if user_ids is not None:
+        attempts = attempts.filter(user_id__in=user_ids)
+        answers = answers.filter(attempt__user_id__in=user_ids)
+
+    with transaction.atomic():
+        counts_by_user = {row['attempt__user']: row for row in answer_counts(answers)}
+        user_stats = []
+        for row in attempts.values('user').annotate(total=Count('id'), score_sum=Sum('score')):
+            counts = counts_by_user.get(row['user'], {'correct': 0, 'wrong': 0})
+            user_stats.append(UserStats(
+                user_id=row['user'],
+                total_attempts=row['total'],
+                score_sum=row['score_sum'],
+                correct_answers=counts['correct'],
+                wrong_answers=counts['wrong'],
+            ))
+        quiz_stats = [
+            UserQuizStats(
+                user_id=row['user'],
+                quiz_id=row['quiz'],
+                attempts=row['total'],
+                score_sum=row['score_sum'],
+                avg_score=row['avg_score'],
+            )
+            for row in attempts.values('user', 'quiz').annotate(
+                total=Count('id'), score_sum=Sum('score'), avg_score=Avg('score'),
+            )
+        ]
+
+        stale_users = UserStats.objects.all()
+        stale_quizzes = UserQuizStats.objects.all()
+        if user_ids is not None:
+            stale_users = stale_users.filter(user_id__in=user_ids)
+            stale_quizzes = stale_quizzes.filter(user_id__in=user_ids)
+        stale_users.delete()
+        stale_quizzes.delete()
+        UserStats.objects.bulk_create(user_stats)
+        UserQuizStats.objects.bulk_create(quiz_stats)
+    return len(user_stats)
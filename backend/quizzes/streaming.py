@@ -0,0 +1,112 @@
+import json
+
+
+class QuizStreamParser:
+    """
+    Incremental parser for quiz JSON arriving in fragments from an LLM.
+
+    ``feed()`` returns every question object whose closing brace has arrived,
+    so questions can be validated and saved while the model is still writing,
+    and a truncated response still yields every complete question. Scalar
+    top-level fields that precede the questions (title, description) are
+    collected in ``header``. Text before the opening brace, such as a markdown
+    fence, is ignored.
+    """
+
+    def __init__(self):
+        self.header = {}
+        self.count = 0
+        self.done = False
+        self.preview = ''
+        self._buffer = ''
+        self._pos = 0
+        self._stack = []
+        self._in_string = False
+        self._escape = False
+        self._string_start = None
+        self._key = None
+        self._expect_key = False
+        self._questions_depth = None
+        self._question_start = None
+
+    def feed(self, text):
+        if len(self.preview) < 500:
+            self.preview += text[:500 - len(self.preview)]
+        self._buffer += text
+        questions = []
+        buffer = self._buffer
+        while self._pos < len(buffer) and not self.done:
+            ch = buffer[self._pos]
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif ch == '\\':
+                    self._escape = True
+                elif ch == '"':
+                    self._in_string = False
+                    self._end_string(buffer[self._string_start:self._pos + 1])
+            elif not self._stack:
+                if ch == '{':
+                    self._stack.append(ch)
+                    self._expect_key = True
+            elif ch == '"':
+                self._in_string = True
+                self._string_start = self._pos
+            elif ch in '{[':
+                if ch == '[' and len(self._stack) == 1 and self._key == 'questions':
+                    self._questions_depth = 2
+                elif ch == '{' and len(self._stack) == self._questions_depth:
+                    self._question_start = self._pos
+                self._stack.append(ch)
+            elif ch in '}]':
+                self._stack.pop()
+                depth = len(self._stack)
+                if ch == '}' and self._question_start is not None and depth == self._questions_depth:
+                    question = self._load(buffer[self._question_start:self._pos + 1])
+                    self._question_start = None
+                    if isinstance(question, dict):
+                        self.count += 1
+                        questions.append(question)
+                elif ch == ']' and depth == 1 and self._questions_depth:
+                    self._questions_depth = None
+                elif depth == 0:
+                    self.done = True
+            elif len(self._stack) == 1:
+                if ch == ',':
+                    self._expect_key = True
+                    self._key = None
+                elif ch == ':':
+                    self._expect_key = False
+            self._pos += 1
+        self._compact()
+        return questions
+
+    def _end_string(self, token):
+        if len(self._stack) != 1:
+            return
+        value = self._load(token)
+        if self._expect_key:
+            self._key = value
+        elif self._key is not None and self._key != 'questions':
+            self.header[self._key] = value
+
+    def _load(self, text):
+        try:
+            return json.loads(text)
+        except ValueError:
+            return None
+
+    def _compact(self):
+        # Only the text of an unfinished question or string is needed again
+        keep_from = self._pos
+        if self._question_start is not None:
+            keep_from = self._question_start
+        elif self._in_string:
+            keep_from = self._string_start
+        if keep_from:
+            self._buffer = self._buffer[keep_from:]
+            self._pos -= keep_from
+            if self._question_start is not None:
+                self._question_start -= keep_from
+            if self._string_start is not None:
+                self._string_start -= keep_from
@@ -1,3 +1,1672 @@
-from django.test import TestCase
+import asyncio
+import json
+import os
+import tempfile
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from io import StringIO
+from unittest import mock
 
-# Create your tests here.
+import httpx
+from asgiref.sync import async_to_sync, sync_to_async
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache, caches
+from django.core.management import call_command
+from django.db import OperationalError, connection
+from django.test import AsyncClient, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from . import jobs
+from .bulk import export_quizzes, import_quizzes
+from .generation import (
+    GenerationCache, GenerationError, QuizWriter, chunk_sizes, complete, generate_quiz, get_generation_cache,
+    astream_questions, question_fingerprint, stream_questions,
+)
+from .llm import CircuitOpenError, GeminiBackend, LLMBackend, LLMConnectionError, LLMHTTPError
+from .grading import Grade, record_attempt
+from .fast_serializers import FastJSONRenderer, choice_data, question_data, quiz_data
+from .leaderboard import LeaderboardCache, SortedBoard
+from .models import Quiz, Question, Choice, QuizAttempt, UserAnswer, UserStats, UserQuizStats, GenerationJob, LeaderboardEntry
+from .response_cache import CachedResponse, ResponseCache, detail_key, get_response_cache, list_key
+from .serializers import ChoiceSerializer, QuestionSerializer, QuizNestedCreateSerializer, QuizSerializer
+from .stats import attempt_summary
+from users.models import UserProfile, level_for
+from .streaming import QuizStreamParser
+from quiz_platform.throttling import GenerationThrottle
+
+
+def stub_quiz_json(topic, num_questions, part=1):
+    return json.dumps({
+        'title': f'{topic} Quiz',
+        'description': 'Generated',
+        'questions': [
+            {'text': f'{topic} question {part}.{i}', 'choices': [
+                {'text': 'Right', 'is_correct': True},
+                {'text': 'Wrong', 'is_correct': False},
+            ]}
+            for i in range(num_questions)
+        ],
+    })
+
+
+def parse_stub_prompt(prompt):
+    topic = prompt.split("topic '")[1].split("'")[0]
+    num_questions = int(prompt.split(' with ')[1].split()[0])
+    part = int(prompt.split('part ')[1].split()[0]) if 'part ' in prompt else 1
+    return topic, num_questions, part
+
+
+class StubLLMBackend(LLMBackend):
+    # Stands in for Gemini: answers with a well-formed quiz for the prompt's topic
+    calls = 0
+
+    def generate(self, prompt, **options):
+        StubLLMBackend.calls += 1
+        topic, num_questions, part = parse_stub_prompt(prompt)
+        return '```json\n' + stub_quiz_json(topic, num_questions, part) + '\n```'
+
+
+class RepetitiveLLMBackend(LLMBackend):
+    # Every chunk asks the same questions
+    def generate(self, prompt, **options):
+        topic, num_questions, part = parse_stub_prompt(prompt)
+        return stub_quiz_json(topic, num_questions)
+
+
+class SlowLLMBackend(StubLLMBackend):
+    lock = threading.Lock()
+    in_flight = 0
+    peak = 0
+
+    def generate(self, prompt, **options):
+        cls = SlowLLMBackend
+        with cls.lock:
+            cls.in_flight += 1
+            cls.peak = max(cls.peak, cls.in_flight)
+        time.sleep(0.05)
+        with cls.lock:
+            cls.in_flight -= 1
+        if 'part 2 of' in prompt and 'Flaky' in prompt:
+            return 'truncated {'
+        return super().generate(prompt, **options)
+
+
+class GarbageLLMBackend(LLMBackend):
+    def generate(self, prompt, **options):
+        return 'not json at all'
+
+
+class CrashingLLMBackend(LLMBackend):
+    # A bug in the backend rather than a failed LLM call
+    def generate(self, prompt, **options):
+        raise RuntimeError('backend bug')
+
+
+class TruncatedStreamLLMBackend(LLMBackend):
+    # Streams a quiz in small fragments and drops the connection inside the third
+    # question, noting how many questions were already saved at each fragment
+    saved_while_streaming = []
+
+    def stream(self, prompt, **options):
+        topic, num_questions, part = parse_stub_prompt(prompt)
+        text = stub_quiz_json(topic, num_questions)
+        cut = text.index(f'{topic} question 1.2')
+        for i in range(0, cut, 7):
+            TruncatedStreamLLMBackend.saved_while_streaming.append(Question.objects.filter(quiz__title=f'{topic} Quiz').count())
+            yield text[i:min(i + 7, cut)]
+        raise LLMConnectionError('connection reset')
+
+
+class SteppedStreamLLMBackend(LLMBackend):
+    # Streams the stub quiz a few characters at a time, counting what has been sent
+    sent = 0
+    total = 0
+
+    def stream(self, prompt, **options):
+        topic, num_questions, part = parse_stub_prompt(prompt)
+        text = stub_quiz_json(topic, num_questions)
+        SteppedStreamLLMBackend.sent = 0
+        SteppedStreamLLMBackend.total = len(text)
+        for i in range(0, len(text), 10):
+            SteppedStreamLLMBackend.sent = i + 10
+            yield text[i:i + 10]
+
+
+class AsyncSlowLLMBackend(LLMBackend):
+    # Waits on the event loop like a slow Gemini call, tracking how many overlap
+    in_flight = 0
+    peak = 0
+
+    async def agenerate(self, prompt, **options):
+        cls = AsyncSlowLLMBackend
+        cls.in_flight += 1
+        cls.peak = max(cls.peak, cls.in_flight)
+        await asyncio.sleep(0.2)
+        cls.in_flight -= 1
+        topic, num_questions, part = parse_stub_prompt(prompt)
+        return stub_quiz_json(topic, num_questions, part)
+
+
+STUB_LLM = {'BACKEND': 'quizzes.tests.StubLLMBackend'}
+
+
+def make_quiz(title='Quiz', num_questions=2, num_choices=2):
+    quiz = Quiz.objects.create(title=title, description='')
+    for i in range(num_questions):
+        question = Question.objects.create(quiz=quiz, text=f'Question {i}')
+        for j in range(num_choices):
+            Choice.objects.create(question=question, text=f'Choice {j}', is_correct=(j == 0))
+    return quiz
+
+
+class QuizReadQueryCountTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        get_response_cache().clear()
+
+    def test_list_query_count_is_constant(self):
+        make_quiz(num_questions=1)
+        # COUNT, quizzes, questions, choices
+        with self.assertNumQueries(4):
+            response = self.client.get(reverse('quiz-list-create'))
+        self.assertEqual(len(response.data['results']), 1)
+
+        for i in range(10):
+            make_quiz(title=f'Quiz {i}', num_questions=8, num_choices=4)
+        with self.assertNumQueries(4):
+            response = self.client.get(reverse('quiz-list-create'))
+        self.assertEqual(len(response.data['results']), 6)
+        self.assertEqual(len(response.data['results'][1]['questions']), 8)
+        self.assertEqual(len(response.data['results'][1]['questions'][0]['choices']), 4)
+
+    def test_detail_query_count_is_constant(self):
+        quiz = make_quiz(num_questions=20, num_choices=4)
+        with self.assertNumQueries(3):
+            response = self.client.get(reverse('quiz-detail', args=[quiz.id]))
+        self.assertEqual(len(response.data['questions']), 20)
+
+    def test_question_list_query_count_is_constant(self):
+        quiz = make_quiz(num_questions=15, num_choices=3)
+        # Quiz version, questions, choices
+        with self.assertNumQueries(3):
+            response = self.client.get(reverse('question-list-create', args=[quiz.id]))
+        self.assertEqual(len(response.data), 15)
+        self.assertEqual(len(response.data[0]['choices']), 3)
+
+
+class ConditionalGetTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        get_response_cache().clear()
+        self.user = User.objects.create_user(username='editor', password='pw')
+        self.quiz = make_quiz(num_questions=3, num_choices=2)
+        self.question = self.quiz.question_set.first()
+
+    def urls(self):
+        return [
+            reverse('quiz-detail', args=[self.quiz.id]),
+            reverse('question-list-create', args=[self.quiz.id]),
+            reverse('choice-list-create', args=[self.question.id]),
+        ]
+
+    def test_reads_carry_validators(self):
+        etags = set()
+        for url in self.urls():
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            self.assertTrue(response['ETag'].startswith(f'"{self.quiz.id}.'))
+            self.assertIn('Last-Modified', response)
+            self.assertEqual(response['Cache-Control'], 'no-cache')
+            etags.add(response['ETag'])
+        # Each representation has its own tag
+        self.assertEqual(len(etags), 3)
+
+    def test_matching_etag_is_answered_without_loading_content(self):
+        # The detail's validators come from the response cache, the lists' from one query
+        for url, queries in zip(self.urls(), [0, 1, 1]):
+            etag = self.client.get(url)['ETag']
+            with self.assertNumQueries(queries):
+                response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+            self.assertEqual(response.status_code, 304)
+            self.assertEqual(response.content, b'')
+            self.assertEqual(response['ETag'], etag)
+
+    def test_if_modified_since_is_honoured(self):
+        url = reverse('quiz-detail', args=[self.quiz.id])
+        last_modified = self.client.get(url)['Last-Modified']
+        response = self.client.get(url, HTTP_IF_MODIFIED_SINCE=last_modified)
+        self.assertEqual(response.status_code, 304)
+
+    def test_edits_change_the_etag(self):
+        url = reverse('quiz-detail', args=[self.quiz.id])
+        self.client.force_authenticate(self.user)
+        edits = [
+            lambda: self.client.put(reverse('quiz-detail', args=[self.quiz.id]), {'title': 'Renamed', 'description': ''}, format='json'),
+            lambda: self.client.post(reverse('question-list-create', args=[self.quiz.id]), {'text': 'New question'}, format='json'),
+            lambda: self.client.post(reverse('choice-list-create', args=[self.question.id]), {'text': 'New choice', 'is_correct': False}, format='json'),
+            lambda: self.client.delete(reverse('choice-detail', args=[self.question.choice_set.first().id])),
+        ]
+        etag = self.client.get(url)['ETag']
+        for edit in edits:
+            self.assertLess(edit().status_code, 300)
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+            self.assertEqual(response.status_code, 200)
+            self.assertNotEqual(response['ETag'], etag)
+            etag = response['ETag']
+
+    def test_updated_at_follows_version_bumps(self):
+        before = self.quiz.updated_at
+        Choice.objects.create(question=self.question, text='Extra', is_correct=False)
+        self.quiz.refresh_from_db()
+        self.assertGreater(self.quiz.updated_at, before)
+
+    def test_unknown_quiz_has_no_validators(self):
+        response = self.client.get(reverse('quiz-detail', args=[uuid.uuid4()]))
+        self.assertEqual(response.status_code, 404)
+        self.assertNotIn('ETag', response)
+
+
+class FastSerializerTests(TestCase):
+    def setUp(self):
+        get_response_cache().clear()
+        self.quiz = make_quiz(num_questions=3, num_choices=3)
+        question = self.quiz.question_set.first()
+        # Quotes, escapes, control characters, non-ASCII and the separators JSONRenderer escapes
+        question.text = 'Say "hi"\\ \x01\t caf\u00e9 \U0001F600 \u2028\u2029'
+        question.save()
+        Quiz.objects.create(title='Empty', description=None)
+
+    def assertSameBytes(self, fast, drf):
+        self.assertEqual(fast, drf)
+        self.assertEqual(FastJSONRenderer().render(fast), JSONRenderer().render(drf))
+        with mock.patch('quizzes.fast_serializers.orjson', None):
+            self.assertEqual(FastJSONRenderer().render(fast), JSONRenderer().render(drf))
+
+    def test_quiz_data_matches_quiz_serializer(self):
+        quizzes = QuizSerializer.setup_eager_loading(Quiz.objects.all())
+        drf = QuizSerializer(quizzes, many=True).data
+        self.assertSameBytes(quiz_data(Quiz.objects.order_by('created_at', 'id')), drf)
+
+    def test_question_and_choice_data_match_their_serializers(self):
+        questions = Question.objects.filter(quiz=self.quiz)
+        drf = QuestionSerializer(QuestionSerializer.setup_eager_loading(questions), many=True).data
+        self.assertSameBytes(question_data(questions), drf)
+        choices = Choice.objects.filter(question__quiz=self.quiz)
+        self.assertSameBytes(choice_data(choices), ChoiceSerializer(choices, many=True).data)
+
+    def test_endpoints_render_the_serializer_bytes(self):
+        client = APIClient()
+        quiz = QuizSerializer.setup_eager_loading(Quiz.objects.filter(pk=self.quiz.pk)).get()
+        response = client.get(reverse('quiz-detail', args=[self.quiz.id]))
+        self.assertEqual(response.content, JSONRenderer().render(QuizSerializer(quiz).data))
+        response = client.get(reverse('quiz-list-create'))
+        self.assertEqual(
+            json.loads(response.content)['results'],
+            json.loads(JSONRenderer().render(QuizSerializer(QuizSerializer.setup_eager_loading(Quiz.objects.all()), many=True).data)),
+        )
+        self.assertIn(b'\\u2028', response.content)
+
+    def test_indented_output_falls_back_to_json_dumps(self):
+        data = quiz_data([self.quiz])
+        self.assertEqual(
+            FastJSONRenderer().render(data, 'application/json; indent=2'),
+            JSONRenderer().render(data, 'application/json; indent=2'),
+        )
+
+
+class ResponseCacheTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        get_response_cache().clear()
+
+    def test_detail_hit_serves_the_same_bytes_without_queries(self):
+        quiz = make_quiz(num_questions=3, num_choices=2)
+        url = reverse('quiz-detail', args=[quiz.id])
+        miss = self.client.get(url)
+        with self.assertNumQueries(0):
+            hit = self.client.get(url)
+        self.assertEqual(hit.status_code, 200)
+        self.assertEqual(hit.content, miss.content)
+        self.assertEqual(hit['Content-Type'], miss['Content-Type'])
+        self.assertEqual(hit['ETag'], miss['ETag'])
+        stats = get_response_cache().stats()
+        self.assertEqual((stats['local_hits'], stats['misses']), (1, 1))
+        self.assertEqual(stats['bytes_served'], len(miss.content))
+
+    def test_edits_drop_only_the_pages_showing_the_quiz(self):
+        quizzes = [make_quiz(title=f'Quiz {i}', num_questions=1) for i in range(8)]
+        url = reverse('quiz-list-create')
+        self.client.get(url)
+        self.client.get(url, {'page': 2})
+        question = quizzes[7].question_set.get()
+        question.text = 'Edited'
+        question.save()
+        with self.assertNumQueries(0):
+            self.client.get(url)
+        with self.assertNumQueries(4):
+            response = self.client.get(url, {'page': 2})
+        self.assertEqual(response.data['results'][1]['questions'][0]['text'], 'Edited')
+
+    def test_created_and_deleted_quizzes_drop_every_list_page(self):
+        make_quiz(title='First')
+        url = reverse('quiz-list-create')
+        catalog = {'mode': 'catalog'}
+        self.assertEqual(self.client.get(url, catalog).json()['count'], 1)
+        second = make_quiz(title='Second')
+        self.assertEqual(self.client.get(url, catalog).json()['count'], 2)
+        second.delete()
+        self.assertEqual(self.client.get(url, catalog).json()['count'], 1)
+
+    def test_api_writes_are_seen_by_the_next_read(self):
+        user = User.objects.create_user(username='editor', password='pw')
+        quiz = make_quiz(num_questions=1, num_choices=2)
+        choice = Choice.objects.filter(question__quiz=quiz).first()
+        url = reverse('quiz-detail', args=[quiz.id])
+        self.client.get(url)
+        self.client.force_authenticate(user)
+        self.client.put(
+            reverse('choice-detail', args=[choice.id]),
+            {'question': str(choice.question_id), 'text': 'Renamed', 'is_correct': True}, format='json',
+        )
+        self.client.force_authenticate(None)
+        texts = [c['text'] for c in self.client.get(url).json()['questions'][0]['choices']]
+        self.assertIn('Renamed', texts)
+
+    def test_indented_renderings_are_not_cached(self):
+        quiz = make_quiz(num_questions=1)
+        url = reverse('quiz-detail', args=[quiz.id])
+        self.client.get(url, HTTP_ACCEPT='application/json; indent=4')
+        self.client.get(url, HTTP_ACCEPT='application/json; indent=4')
+        self.assertEqual(get_response_cache().stats()['entries'], 0)
+
+    def test_stats_are_staff_only(self):
+        user = User.objects.create_user(username='viewer', password='pw')
+        self.client.force_authenticate(user)
+        self.assertEqual(self.client.get(reverse('response-cache-stats')).status_code, 403)
+        user.is_staff = True
+        user.save()
+        self.assertIn('hit_ratio', self.client.get(reverse('response-cache-stats')).data)
+
+
+class ResponseCacheUnitTests(TestCase):
+    def response(self, body, *quiz_ids):
+        return CachedResponse(body, {}, list(quiz_ids))
+
+    def test_lru_is_bounded_by_bytes(self):
+        cache = ResponseCache(max_bytes=10, local_ttl=None)
+        for name in 'abc':
+            _, ticket = cache.get(detail_key(name))
+            cache.store(detail_key(name), ticket, self.response(b'1234', name))
+        self.assertIsNone(cache.get(detail_key('a'))[0])
+        self.assertEqual(cache.get(detail_key('c'))[0].body, b'1234')
+        self.assertEqual((cache.stats()['bytes'], cache.stats()['evictions']), (8, 1))
+
+    def test_local_entries_expire(self):
+        now = [0]
+        cache = ResponseCache(local_ttl=5, clock=lambda: now[0])
+        _, ticket = cache.get(detail_key('a'))
+        cache.store(detail_key('a'), ticket, self.response(b'{}', 'a'))
+        now[0] = 6
+        self.assertIsNone(cache.get(detail_key('a'))[0])
+
+    def test_store_after_an_invalidation_is_dropped(self):
+        # Rows read before a write must not be cached as current after it
+        cache = ResponseCache()
+        _, ticket = cache.get(detail_key('a'))
+        cache.invalidate('a')
+        cache.store(detail_key('a'), ticket, self.response(b'stale', 'a'))
+        self.assertIsNone(cache.get(detail_key('a'))[0])
+
+    def test_shared_tier_is_seen_and_invalidated_across_processes(self):
+        caches['default'].clear()
+        writer = ResponseCache(shared='default')
+        reader = ResponseCache(shared='default', local_ttl=0)
+        _, ticket = writer.get(detail_key('a'))
+        writer.store(detail_key('a'), ticket, self.response(b'v1', 'a'))
+        self.assertEqual(reader.get(detail_key('a'))[0].body, b'v1')
+        self.assertEqual(reader.stats()['shared_hits'], 1)
+
+        _, stale_ticket = reader.get(list_key('http://testserver/api/quizzes/'))
+        writer.invalidate('a')
+        self.assertIsNone(reader.get(detail_key('a'))[0])
+        # A list page rendered before the write is stamped with the old generation
+        reader.store(list_key('http://testserver/api/quizzes/'), stale_ticket, self.response(b'stale', 'a'))
+        self.assertIsNone(writer.get(list_key('http://testserver/api/quizzes/'))[0])
+
+
+class QuizCatalogTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        get_response_cache().clear()
+
+    def test_catalog_mode_returns_counts_without_nested_payload(self):
+        make_quiz(title='Small', num_questions=1)
+        make_quiz(title='Large', num_questions=7)
+        # COUNT and one aggregate query for the page
+        with self.assertNumQueries(2):
+            response = self.client.get(reverse('quiz-list-create'), {'mode': 'catalog'})
+        self.assertEqual(response.data['count'], 2)
+        results = {quiz['title']: quiz for quiz in response.data['results']}
+        self.assertEqual(results['Small']['question_count'], 1)
+        self.assertEqual(results['Large']['question_count'], 7)
+        self.assertEqual(
+            set(results['Large']),
+            {'id', 'title', 'description', 'created_at', 'question_count'},
+        )
+
+    def test_next_link_keeps_catalog_mode(self):
+        for i in range(7):
+            make_quiz(title=f'Quiz {i}', num_questions=0)
+        response = self.client.get(reverse('quiz-list-create'), {'mode': 'catalog'})
+        self.assertIn('mode=catalog', response.data['next'])
+        self.assertIn('page=2', response.data['next'])
+
+
+class KeysetPaginationTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        get_response_cache().clear()
+
+    def collect(self, url, params):
+        seen = []
+        while url:
+            response = self.client.get(url, params)
+            self.assertEqual(response.status_code, 200)
+            seen.extend(item['id'] for item in response.data['results'])
+            url, params = response.data['next'], None
+        return seen
+
+    def test_cursor_walks_every_quiz_once_in_order(self):
+        for i in range(14):
+            make_quiz(title=f'Quiz {i}', num_questions=0)
+        # Ties on created_at are broken by id
+        Quiz.objects.filter(title__in=['Quiz 3', 'Quiz 4', 'Quiz 5', 'Quiz 6']).update(created_at=timezone.now())
+        expected = [str(pk) for pk in Quiz.objects.order_by('created_at', 'id').values_list('id', flat=True)]
+        seen = self.collect(reverse('quiz-list-create'), {'cursor': '', 'mode': 'catalog'})
+        self.assertEqual(seen, expected)
+
+    def test_cursor_page_skips_count(self):
+        make_quiz(num_questions=0)
+        with self.assertNumQueries(1):
+            response = self.client.get(reverse('quiz-list-create'), {'cursor': '', 'mode': 'catalog'})
+        self.assertNotIn('count', response.data)
+        self.assertIsNone(response.data['next'])
+
+    def test_invalid_cursor_is_rejected(self):
+        response = self.client.get(reverse('quiz-list-create'), {'cursor': 'not-a-cursor'})
+        self.assertEqual(response.status_code, 404)
+
+    def test_attempt_history_is_newest_first_and_per_user(self):
+        user = User.objects.create_user(username='alice', password='pass12345')
+        other = User.objects.create_user(username='bob', password='pass12345')
+        quiz = make_quiz(num_questions=0)
+        for _ in range(13):
+            QuizAttempt.objects.create(user=user, quiz=quiz)
+        QuizAttempt.objects.create(user=other, quiz=quiz)
+        self.client.force_authenticate(user)
+        expected = [
+            str(pk) for pk in
+            QuizAttempt.objects.filter(user=user).order_by('-completed_at', '-id').values_list('id', flat=True)
+        ]
+        seen = self.collect(reverse('attempt-history'), {})
+        self.assertEqual(seen, expected)
+
+
+class SubmitQuizTests(TestCase):
+    def setUp(self):
+        caches['throttle'].clear()
+        cache.clear()
+        self.client = APIClient()
+        self.user = User.objects.create_user(username='alice', password='pass12345')
+        self.client.force_authenticate(self.user)
+
+    def answers_for(self, quiz, correct=True):
+        answers = []
+        for question in quiz.question_set.all():
+            choice = question.choice_set.get(is_correct=correct) if correct else question.choice_set.filter(is_correct=False).first()
+            answers.append({'question': str(question.id), 'choice': str(choice.id)})
+        return answers
+
+    def test_scores_and_records_answers(self):
+        quiz = make_quiz(num_questions=4, num_choices=3)
+        answers = self.answers_for(quiz)
+        answers[0]['choice'] = str(Choice.objects.filter(question_id=answers[0]['question'], is_correct=False).first().id)
+        response = self.client.post(reverse('submit-quiz', args=[quiz.id]), {'answers': answers}, format='json')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data['score'], 75)
+        attempt = QuizAttempt.objects.get(user=self.user)
+        self.assertEqual(attempt.score, 75)
+        self.assertEqual(UserAnswer.objects.filter(attempt=attempt).count(), 4)
+
+    def test_query_count_does_not_grow_with_answers(self):
+        small = make_quiz(num_questions=2)
+        large = make_quiz(num_questions=50, num_choices=4)
+        counts = []
+        for quiz in (small, large):
+            answers = self.answers_for(quiz)
+            # A fresh user each time so both submissions create their stats rows
+            self.client.force_authenticate(User.objects.create_user(username=f'user-{quiz.id}'))
+            with CaptureQueriesContext(connection) as ctx:
+                self.client.post(reverse('submit-quiz', args=[quiz.id]), {'answers': answers}, format='json')
+            counts.append(len(ctx.captured_queries))
+        self.assertEqual(counts[0], counts[1])
+        self.assertEqual(QuizAttempt.objects.get(quiz=large).score, 100)
+
+    def test_rejects_question_from_another_quiz(self):
+        quiz = make_quiz()
+        other = make_quiz()
+        answers = self.answers_for(other)[:1]
+        response = self.client.post(reverse('submit-quiz', args=[quiz.id]), {'answers': answers}, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(QuizAttempt.objects.exists())
+
+    def test_rejects_choice_from_another_question(self):
+        quiz = make_quiz()
+        first, second = self.answers_for(quiz)
+        answers = [{'question': first['question'], 'choice': second['choice']}]
+        response = self.client.post(reverse('submit-quiz', args=[quiz.id]), {'answers': answers}, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(QuizAttempt.objects.exists())
+
+    def test_rejects_duplicate_and_malformed_answers(self):
+        quiz = make_quiz()
+        answer = self.answers_for(quiz)[0]
+        for answers in ([answer, answer], [{'question': 'x'}], 'nope'):
+            response = self.client.post(reverse('submit-quiz', args=[quiz.id]), {'answers': answers}, format='json')
+            self.assertEqual(response.status_code, 400)
+        self.assertFalse(QuizAttempt.objects.exists())
+
+
+class AnswerKeyCacheTests(TestCase):
+    def setUp(self):
+        caches['throttle'].clear()
+        cache.clear()
+        self.client = APIClient()
+        self.user = User.objects.create_user(username='alice', password='pass12345')
+        self.client.force_authenticate(self.user)
+        self.quiz = make_quiz(num_questions=1, num_choices=2)
+        self.question = self.quiz.question_set.get()
+        self.right = self.question.choice_set.get(is_correct=True)
+        self.wrong = self.question.choice_set.get(is_correct=False)
+
+    def submit(self, choice):
+        answers = [{'question': str(self.question.id), 'choice': str(choice.id)}]
+        response = self.client.post(reverse('submit-quiz', args=[self.quiz.id]), {'answers': answers}, format='json')
+        return response.data['score']
+
+    def test_warm_submission_does_not_read_choices(self):
+        self.submit(self.right)
+        # quiz, savepoint, attempt, answers, two stats updates, best score update and
+        # check, profile update, release
+        with self.assertNumQueries(10) as ctx:
+            self.submit(self.right)
+        self.assertFalse(any('quizzes_choice' in query['sql'] for query in ctx.captured_queries))
+
+    def test_choice_update_invalidates_key(self):
+        self.assertEqual(self.submit(self.wrong), 0)
+        response = self.client.put(
+            reverse('choice-detail', args=[self.wrong.id]),
+            {'question': str(self.question.id), 'text': self.wrong.text, 'is_correct': True},
+            format='json',
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.submit(self.wrong), 100)
+
+    def test_delete_and_add_invalidate_key(self):
+        self.assertEqual(self.submit(self.right), 100)
+        self.client.delete(reverse('choice-detail', args=[self.right.id]))
+        self.client.post(
+            reverse('question-list-create', args=[self.quiz.id]), {'text': 'Another question'}, format='json'
+        )
+        # Two questions, and the only choice left on the first one is wrong
+        self.assertEqual(self.submit(self.wrong), 0)
+
+    def test_moving_a_question_invalidates_the_quiz_it_left(self):
+        other = make_quiz(num_questions=1)
+        get_response_cache().clear()
+        self.assertEqual(len(self.client.get(reverse('quiz-detail', args=[self.quiz.id])).data['questions']), 1)
+        self.assertEqual(self.submit(self.right), 100)
+        version = Quiz.objects.get(pk=self.quiz.pk).version
+        response = self.client.put(
+            reverse('question-detail', args=[self.question.id]), {'quiz': str(other.id), 'text': 'Moved'}, format='json',
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(Quiz.objects.get(pk=self.quiz.pk).version, version + 1)
+        self.assertEqual(self.client.get(reverse('quiz-detail', args=[self.quiz.id])).data['questions'], [])
+        answers = [{'question': str(self.question.id), 'choice': str(self.right.id)}]
+        response = self.client.post(reverse('submit-quiz', args=[self.quiz.id]), {'answers': answers}, format='json')
+        self.assertEqual(response.status_code, 400)
+
+    def test_moving_a_choice_invalidates_the_quiz_it_left(self):
+        other = make_quiz(num_questions=1)
+        self.assertEqual(self.submit(self.wrong), 0)
+        version = Quiz.objects.get(pk=self.quiz.pk).version
+        response = self.client.put(
+            reverse('choice-detail', args=[self.wrong.id]),
+            {'question': str(other.question_set.get().id), 'text': self.wrong.text, 'is_correct': False},
+            format='json',
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(Quiz.objects.get(pk=self.quiz.pk).version, version + 1)
+        answers = [{'question': str(self.question.id), 'choice': str(self.wrong.id)}]
+        response = self.client.post(reverse('submit-quiz', args=[self.quiz.id]), {'answers': answers}, format='json')
+        self.assertEqual(response.status_code, 400)
+
+    def test_quiz_save_keeps_concurrent_version_bump(self):
+        stale = Quiz.objects.get(pk=self.quiz.pk)
+        Choice.objects.create(question=self.question, text='New choice')
+        stale.title = 'Renamed'
+        stale.save()
+        self.quiz.refresh_from_db()
+        self.assertEqual(self.quiz.title, 'Renamed')
+        self.assertEqual(self.quiz.version, stale.version + 2)
+
+
+class NestedCreateTests(TestCase):
+    def payload(self, num_questions):
+        return {
+            'title': 'Imported',
+            'description': '',
+            'questions': [
+                {'text': f'Question {i}', 'choices': [
+                    {'text': 'Right', 'is_correct': True},
+                    {'text': 'Wrong', 'is_correct': False},
+                ]}
+                for i in range(num_questions)
+            ],
+        }
+
+    def test_insert_count_does_not_grow_with_questions(self):
+        for num_questions in (1, 40):
+            serializer = QuizNestedCreateSerializer(data=self.payload(num_questions))
+            self.assertTrue(serializer.is_valid(), serializer.errors)
+            # savepoint, quiz, questions, choices, release
+            with self.assertNumQueries(5):
+                quiz = serializer.save()
+            self.assertEqual(quiz.question_set.count(), num_questions)
+            self.assertEqual(Choice.objects.filter(question__quiz=quiz, is_correct=True).count(), num_questions)
+
+    def test_create_endpoint_returns_nested_quiz(self):
+        client = APIClient()
+        client.force_authenticate(User.objects.create_user(username='alice', password='pass12345'))
+        response = client.post(reverse('quiz-list-create'), self.payload(3), format='json')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(len(response.data['questions']), 3)
+        self.assertEqual(len(response.data['questions'][0]['choices']), 2)
+
+
+def ndjson(*items):
+    return [(item if isinstance(item, str) else json.dumps(item)) + '\n' for item in items]
+
+
+class BulkImportExportTests(TestCase):
+    def setUp(self):
+        get_response_cache().clear()
+        self.client = APIClient()
+        self.admin = User.objects.create_user(username='admin', password='pw', is_staff=True)
+
+    def quiz(self, title, num_questions=2):
+        return {'title': title, 'description': '', 'questions': [
+            {'text': f'{title} {i}', 'choices': [{'text': 'Right', 'is_correct': True}, {'text': 'Wrong', 'is_correct': False}]}
+            for i in range(num_questions)
+        ]}
+
+    def test_import_skips_invalid_lines_and_reports_progress(self):
+        lines = ndjson(self.quiz('One'), '{not json', '', {'description': 'no title'}, '[1, 2]', self.quiz('Two', 3))
+        progress = []
+        created, errors = import_quizzes(lines, batch_size=2, progress=progress.append)
+        self.assertEqual(created, 2)
+        self.assertEqual([line for line, _ in errors], [2, 4, 5])
+        self.assertIn('title', errors[1][1])
+        self.assertEqual([(p.lines, p.created, p.failed) for p in progress], [(2, 1, 1), (4, 1, 2), (6, 2, 3)])
+        two = Quiz.objects.get(title='Two')
+        self.assertEqual(two.question_set.count(), 3)
+        self.assertEqual(Choice.objects.filter(question__quiz=two, is_correct=True).count(), 3)
+
+    def test_import_writes_each_batch_with_bulk_inserts(self):
+        lines = ndjson(*[self.quiz(f'Quiz {i}', 5) for i in range(10)])
+        # Per batch: savepoint, quizzes, questions, choices, release
+        with self.assertNumQueries(2 * 5):
+            created, _ = import_quizzes(lines, batch_size=5)
+        self.assertEqual(created, 10)
+
+    def test_export_round_trips_through_import(self):
+        for i in range(5):
+            make_quiz(title=f'Quiz {i}', num_questions=2, num_choices=3)
+        # One quiz query, then questions and choices per chunk of two
+        with self.assertNumQueries(1 + 2 * 3):
+            lines = list(export_quizzes(chunk_size=2))
+        exported = [json.loads(line) for line in lines]
+        self.assertEqual(exported, json.loads(json.dumps(quiz_data(Quiz.objects.order_by('created_at', 'id')), default=str)))
+        created, errors = import_quizzes(lines)
+        self.assertEqual((created, errors), (5, []))
+        self.assertEqual(Quiz.objects.filter(title='Quiz 3').count(), 2)
+        self.assertEqual(Choice.objects.count(), 2 * 5 * 2 * 3)
+
+    def test_bulk_api(self):
+        make_quiz(title='Existing')
+        url = reverse('quiz-bulk')
+        self.assertEqual(self.client.get(url).status_code, 401)
+        self.client.force_authenticate(self.admin)
+        self.assertEqual(self.client.get(reverse('quiz-list-create')).data['count'], 1)
+
+        body = ''.join(ndjson(self.quiz('Uploaded'), {'title': ''})).encode()
+        response = self.client.post(url, body, content_type='application/x-ndjson')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual((response.data['created'], response.data['failed']), (1, 1))
+        self.assertEqual(response.data['errors'][0]['line'], 2)
+        # The cached list page went with the import
+        self.assertEqual(self.client.get(reverse('quiz-list-create')).data['count'], 2)
+
+        response = self.client.get(url, HTTP_ACCEPT='application/x-ndjson')
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        titles = [json.loads(line)['title'] for line in b''.join(response.streaming_content).splitlines()]
+        self.assertEqual(titles, ['Existing', 'Uploaded'])
+
+    def test_commands(self):
+        make_quiz(title='Exported', num_questions=3)
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'quizzes.ndjson')
+            call_command('export_quizzes', path, stderr=StringIO())
+            out = StringIO()
+            call_command('import_quizzes', path, stdout=out, stderr=StringIO())
+        self.assertIn('Imported 1 quiz(zes)', out.getvalue())
+        self.assertEqual(Quiz.objects.filter(title='Exported').count(), 2)
+
+
+class DashboardStatsTests(TestCase):
+    def setUp(self):
+        caches['throttle'].clear()
+        cache.clear()
+        self.client = APIClient()
+        self.user = User.objects.create_user(username='alice', password='pass12345')
+        self.client.force_authenticate(self.user)
+
+    def submit(self, quiz, num_correct):
+        answers = []
+        for i, question in enumerate(quiz.question_set.all()):
+            choice = question.choice_set.get(is_correct=i < num_correct)
+            answers.append({'question': str(question.id), 'choice': str(choice.id)})
+        self.client.post(reverse('submit-quiz', args=[quiz.id]), {'answers': answers}, format='json')
+
+    def dashboard(self):
+        return self.client.get(reverse('dashboard-stats')).data
+
+    def test_stats_follow_submissions(self):
+        first = make_quiz(title='First', num_questions=4)
+        second = make_quiz(title='Second', num_questions=2)
+        self.submit(first, 4)
+        self.submit(first, 2)
+        self.submit(second, 0)
+
+        data = self.dashboard()
+        self.assertEqual(data['total_attempts'], 3)
+        self.assertAlmostEqual(data['avg_score'], 50)
+        self.assertEqual(data['correct_answers'], 6)
+        self.assertEqual(data['wrong_answers'], 4)
+        self.assertEqual(data['per_quiz_list'], [
+            {'quiz_title': 'First', 'avg_score': 75, 'attempts': 2},
+            {'quiz_title': 'Second', 'avg_score': 0, 'attempts': 1},
+        ])
+        self.assertEqual([a['quiz_title'] for a in data['recent_attempts']], ['Second', 'First', 'First'])
+
+    def test_query_count_does_not_grow_with_history(self):
+        quiz = make_quiz(num_questions=3)
+        for _ in range(8):
+            self.submit(quiz, 1)
+        # stats row, recent attempts, per-quiz averages
+        with self.assertNumQueries(3):
+            self.dashboard()
+
+    def test_deleting_a_quiz_removes_its_attempts_from_totals(self):
+        kept = make_quiz(num_questions=2)
+        dropped = make_quiz(num_questions=2)
+        self.submit(kept, 2)
+        self.submit(dropped, 1)
+        dropped.delete()
+        data = self.dashboard()
+        self.assertEqual(data['total_attempts'], 1)
+        self.assertEqual(data['avg_score'], 100)
+        self.assertEqual((data['correct_answers'], data['wrong_answers']), (2, 0))
+
+    def test_deleting_a_question_or_choice_removes_its_answers_from_totals(self):
+        quiz = make_quiz(num_questions=3)
+        self.submit(quiz, 2)
+        self.submit(quiz, 1)
+        questions = list(quiz.question_set.order_by('text'))
+        questions[0].delete()
+        questions[1].choice_set.get(is_correct=False).delete()
+        materialized = self.dashboard()
+        self.assertEqual((materialized['correct_answers'], materialized['wrong_answers']), (1, 2))
+        UserStats.objects.all().delete()
+        UserQuizStats.objects.all().delete()
+        self.assertEqual(self.dashboard(), materialized)
+
+    def test_rebuild_command_matches_incremental_totals(self):
+        quiz = make_quiz(num_questions=4)
+        self.submit(quiz, 3)
+        self.submit(quiz, 1)
+        before = self.dashboard()
+        UserStats.objects.all().delete()
+        UserQuizStats.objects.all().delete()
+        call_command('rebuild_dashboard_stats', stdout=StringIO())
+        self.assertEqual(self.dashboard(), before)
+
+    def test_live_fallback_matches_stats_tables(self):
+        first = make_quiz(title='First', num_questions=4)
+        second = make_quiz(title='Second', num_questions=2)
+        self.submit(first, 3)
+        self.submit(second, 1)
+        self.submit(first, 0)
+        materialized = self.dashboard()
+        UserStats.objects.all().delete()
+        UserQuizStats.objects.all().delete()
+        # stats row miss, live summary, recent attempts, per-quiz averages
+        with self.assertNumQueries(4):
+            live = self.dashboard()
+        self.assertEqual(live, materialized)
+
+    def test_attempt_summary_is_one_query(self):
+        quiz = make_quiz(num_questions=3)
+        self.submit(quiz, 3)
+        self.submit(quiz, 1)
+        QuizAttempt.objects.create(user=self.user, quiz=quiz)
+        with self.assertNumQueries(1):
+            summary = attempt_summary(QuizAttempt.objects.filter(user=self.user))
+        self.assertEqual(summary['total_attempts'], 3)
+        self.assertAlmostEqual(summary['avg_score'], (100 + 100 / 3) / 3)
+        self.assertEqual((summary['correct_answers'], summary['wrong_answers']), (4, 2))
+
+    def test_new_user_gets_zeros(self):
+        data = self.dashboard()
+        self.assertEqual(
+            (data['total_attempts'], data['avg_score'], data['correct_answers'], data['wrong_answers']),
+            (0, 0, 0, 0),
+        )
+        self.assertEqual(data['per_quiz_list'], [])
+
+
+class LeaderboardTests(TestCase):
+    def setUp(self):
+        caches['throttle'].clear()
+        cache.clear()
+        self.client = APIClient()
+        self.quiz = make_quiz(num_questions=4)
+
+    def submit(self, username, num_correct, quiz=None):
+        quiz = quiz or self.quiz
+        user = User.objects.get_or_create(username=username)[0]
+        self.client.force_authenticate(user)
+        answers = []
+        for i, question in enumerate(quiz.question_set.all()):
+            choice = question.choice_set.get(is_correct=i < num_correct)
+            answers.append({'question': str(question.id), 'choice': str(choice.id)})
+        self.client.post(reverse('submit-quiz', args=[quiz.id]), {'answers': answers}, format='json')
+        return user
+
+    def board(self, user=None, quiz=None, **params):
+        self.client.force_authenticate(user)
+        url = reverse('quiz-leaderboard', args=[quiz.id]) if quiz else reverse('global-leaderboard')
+        return self.client.get(url, params).data
+
+    def test_quiz_board_keeps_best_score_per_user(self):
+        alice = self.submit('alice', 2)
+        self.submit('bob', 3)
+        self.submit('alice', 4)
+        self.submit('alice', 1)
+        data = self.board(alice, self.quiz)
+        self.assertEqual([(r['rank'], r['username'], r['best_score']) for r in data['top']], [(1, 'alice', 100), (2, 'bob', 75)])
+        self.assertEqual((data['me']['rank'], data['me']['best_score']), (1, 100))
+        self.assertEqual(LeaderboardEntry.objects.count(), 2)
+
+    def test_earlier_score_ranks_first_on_ties(self):
+        self.submit('alice', 3)
+        bob = self.submit('bob', 3)
+        # Matching the best score again keeps its original time
+        self.submit('alice', 3)
+        data = self.board(bob, self.quiz)
+        self.assertEqual([r['username'] for r in data['top']], ['alice', 'bob'])
+        self.assertEqual(data['me']['rank'], 2)
+
+    def test_profile_points_and_level_follow_submissions(self):
+        other = make_quiz(num_questions=2)
+        for _ in range(5):
+            self.submit('alice', 4)
+        self.submit('alice', 1, other)
+        profile = UserProfile.objects.get(user__username='alice')
+        self.assertEqual(profile.total_score, 550)
+        self.assertEqual(profile.level, 'Intermediate')
+        self.assertEqual(level_for(profile.total_score), 'Intermediate')
+
+    def test_profile_is_updated_without_reading_it(self):
+        self.submit('alice', 4)
+        with CaptureQueriesContext(connection) as ctx:
+            self.submit('alice', 2)
+        profile_queries = [q['sql'] for q in ctx.captured_queries if 'users_userprofile' in q['sql']]
+        self.assertEqual(len(profile_queries), 1)
+        self.assertTrue(profile_queries[0].startswith('UPDATE'))
+        self.assertEqual(UserProfile.objects.get(user__username='alice').total_score, 150)
+
+    def test_level_is_worked_out_by_the_update(self):
+        user = User.objects.create_user(username='alice')
+        UserProfile.objects.create(user=user, total_score=1950)
+        self.submit('alice', 2)
+        self.assertEqual(UserProfile.objects.filter(user=user).values_list('total_score', 'level').get(), (2000, 'Advanced'))
+
+    def test_global_board_shares_ranks_on_equal_totals(self):
+        self.submit('alice', 2)
+        self.submit('bob', 4)
+        carol = self.submit('carol', 2)
+        data = self.board(carol, limit=3)
+        self.assertEqual([(r['rank'], r['username'], r['total_score']) for r in data['top']], [
+            (1, 'bob', 100), (2, 'alice', 50), (2, 'carol', 50),
+        ])
+        self.assertEqual(data['me']['rank'], 2)
+
+    def test_limit_and_anonymous_reads(self):
+        for i in range(4):
+            self.submit(f'user-{i}', i)
+        data = self.board(quiz=self.quiz, limit=2)
+        self.assertEqual([r['best_score'] for r in data['top']], [75, 50])
+        self.assertIsNone(data['me'])
+        self.assertEqual(len(self.board(quiz=self.quiz, limit='x')['top']), 4)
+        self.assertEqual(self.client.get(reverse('quiz-leaderboard', args=[uuid.uuid4()])).status_code, 404)
+
+    def test_quiz_board_query_count(self):
+        for i in range(20):
+            self.submit(f'user-{i}', i % 5)
+        user = User.objects.get(username='user-7')
+        # quiz exists, top, user's entry, count ahead
+        self.client.force_authenticate(user)
+        with self.assertNumQueries(4):
+            self.client.get(reverse('quiz-leaderboard', args=[self.quiz.id]))
+
+    def test_sorted_cache_matches_database(self):
+        for i, correct in enumerate([1, 4, 2, 4, 0]):
+            self.submit(f'user-{i}', correct)
+        user = User.objects.get(username='user-2')
+        expected = (self.board(user, self.quiz), self.board(user))
+        with override_settings(LEADERBOARD_CACHE={'ENABLED': True, 'TTL': 60}):
+            self.assertEqual((self.board(user, self.quiz), self.board(user)), expected)
+            with self.captureOnCommitCallbacks(execute=True):
+                self.submit('user-2', 4)
+            # Applied to the loaded boards without reloading them
+            with self.assertNumQueries(1):
+                data = self.board(user, self.quiz)
+            self.assertEqual([r['username'] for r in data['top']], ['user-1', 'user-3', 'user-2', 'user-0', 'user-4'])
+            self.assertEqual(self.board(user)['me']['total_score'], 150)
+
+    def test_sorted_board_ranks(self):
+        board = SortedBoard([(1, {'total_score': 5}), (2, {'total_score': 9})], lambda row: (-row['total_score'],))
+        board.update(3, {'total_score': 5})
+        board.update(1, {'total_score': 12})
+        self.assertEqual([row['rank'] for row in board.top(10)], [1, 2, 3])
+        self.assertEqual(board.rank(3)['rank'], 3)
+        board.update(2, {'total_score': 5})
+        self.assertEqual((board.rank(2)['rank'], board.rank(3)['rank']), (2, 2))
+        self.assertIsNone(board.rank(4))
+        self.assertEqual(len(board), 3)
+
+    def test_cache_reloads_after_ttl(self):
+        now = [0]
+        boards = LeaderboardCache(ttl=10, clock=lambda: now[0])
+        self.submit('alice', 2)
+        self.assertEqual(len(boards.board('global')), 1)
+        self.submit('bob', 2)
+        self.assertEqual(len(boards.board('global')), 1)
+        now[0] = 11
+        self.assertEqual(len(boards.board('global')), 2)
+
+
+class ConcurrentScoreTests(TransactionTestCase):
+    # SQLite serializes the writers anyway; on PostgreSQL the submissions really
+    # interleave, which a read-modify-write of the profile would not survive
+    def test_parallel_submissions_lose_no_points(self):
+        user = User.objects.create_user(username='alice')
+        quiz = make_quiz(num_questions=4)
+        questions = [
+            (question.id, question.choice_set.get(is_correct=True).id, question.choice_set.get(is_correct=False).id)
+            for question in quiz.question_set.all()
+        ]
+        threads, per_thread = 8, 5
+        barrier = threading.Barrier(threads)
+        errors = []
+
+        def record(grade):
+            # SQLite's shared test database fails a write that meets a lock instead of
+            # waiting for it; the submission rolls back whole, so it is simply retried
+            while True:
+                try:
+                    return record_attempt(user, quiz, grade)
+                except OperationalError as e:
+                    if 'locked' not in str(e):
+                        raise
+                    time.sleep(0.001)
+
+        def submit(num_correct):
+            selections = [(question, right if i < num_correct else wrong) for i, (question, right, wrong) in enumerate(questions)]
+            grade = Grade(selections, num_correct, len(questions), num_correct / len(questions) * 100)
+            try:
+                barrier.wait()
+                for _ in range(per_thread):
+                    record(grade)
+            except Exception as e:
+                errors.append(e)
+            finally:
+                connection.close()
+
+        workers = [threading.Thread(target=submit, args=(i % 5,)) for i in range(threads)]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+
+        self.assertEqual(errors, [])
+        expected = sum(round(i % 5 * 25) for i in range(threads)) * per_thread
+        profile = UserProfile.objects.get(user=user)
+        self.assertEqual(profile.total_score, expected)
+        self.assertEqual(profile.level, level_for(expected))
+        self.assertEqual(QuizAttempt.objects.count(), threads * per_thread)
+        self.assertEqual(LeaderboardEntry.objects.get(user=user).best_score, 100)
+
+
+@override_settings(LLM_BACKEND=STUB_LLM, GENERATION_JOBS_EAGER=True)
+class GenerationJobTests(TestCase):
+    def setUp(self):
+        caches['throttle'].clear()
+        get_generation_cache().clear()
+        self.client = APIClient()
+        self.user = User.objects.create_user(username='alice', password='pass12345')
+        self.client.force_authenticate(self.user)
+
+    def test_sync_endpoint_still_returns_the_quiz(self):
+        response = self.client.post(reverse('generate-quiz'), {'topic': 'Python', 'num_questions': 3}, format='json')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data['title'], 'Python Quiz')
+        self.assertEqual(len(response.data['questions']), 3)
+
+    def test_job_is_accepted_and_polled(self):
+        response = self.client.post(reverse('generation-job-create'), {'topic': 'Django', 'num_questions': 2}, format='json')
+        self.assertEqual(response.status_code, 202)
+        self.assertTrue(response.data['status_url'].endswith(reverse('generation-job-detail', args=[response.data['id']])))
+
+        status = self.client.get(response.data['status_url'])
+        self.assertEqual(status.data['status'], GenerationJob.SUCCEEDED)
+        quiz = Quiz.objects.get(pk=status.data['quiz'])
+        self.assertEqual(quiz.question_set.count(), 2)
+
+    @override_settings(LLM_BACKEND={'BACKEND': 'quizzes.tests.GarbageLLMBackend'})
+    def test_failed_generation_is_reported_on_the_job(self):
+        response = self.client.post(reverse('generation-job-create'), {'topic': 'Django'}, format='json')
+        status = self.client.get(response.data['status_url'])
+        self.assertEqual(status.data['status'], GenerationJob.FAILED)
+        self.assertEqual(status.data['error']['error'], 'Incomplete JSON response from AI')
+        self.assertIsNone(status.data['quiz'])
+
+    def test_jobs_are_private_and_validated(self):
+        response = self.client.post(reverse('generation-job-create'), {'topic': 'Django'}, format='json')
+        self.client.force_authenticate(User.objects.create_user(username='bob'))
+        self.assertEqual(self.client.get(response.data['status_url']).status_code, 404)
+        response = self.client.post(reverse('generation-job-create'), {'num_questions': 'many'}, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(set(response.data), {'topic', 'num_questions'})
+
+
+@override_settings(LLM_BACKEND=STUB_LLM)
+class GenerationWorkerPoolTests(TransactionTestCase):
+    def test_job_runs_on_the_worker_pool(self):
+        get_generation_cache().clear()
+        user = User.objects.create_user(username='alice', password='pass12345')
+        job = GenerationJob.objects.create(user=user, topic='Threads', num_questions=2)
+        jobs.get_executor().submit(jobs._run_in_worker, job.pk).result(timeout=10)
+        job.refresh_from_db()
+        self.assertEqual(job.status, GenerationJob.SUCCEEDED)
+        self.assertEqual(job.quiz.question_set.count(), 2)
+
+
+class FakeGeminiServer:
+    """Local HTTP server speaking just enough of the Gemini API, answering from a script."""
+
+    def __init__(self, responses):
+        self.responses = list(responses)
+        self.requests = []
+        self.connections = set()
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def do_POST(self):
+                body = self.rfile.read(int(self.headers['Content-Length']))
+                fake.requests.append((self.path, dict(self.headers), json.loads(body)))
+                fake.connections.add(self.client_address)
+                status, payload = fake.responses.pop(0)
+                if isinstance(payload, str):
+                    data, content_type = payload.encode(), 'text/event-stream'
+                else:
+                    data, content_type = json.dumps(payload).encode(), 'application/json'
+                self.send_response(status)
+                self.send_header('Content-Type', content_type)
+                self.send_header('Content-Length', str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.url = f'http://127.0.0.1:{self.server.server_address[1]}'
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+def gemini_text(text):
+    return 200, {'candidates': [{'content': {'parts': [{'text': text}]}}]}
+
+
+def gemini_sse(*fragments):
+    return 200, ''.join(f'data: {json.dumps(gemini_text(text)[1])}\r\n\r\n' for text in fragments)
+
+
+class GeminiBackendTests(TestCase):
+    def backend(self, responses, **options):
+        server = FakeGeminiServer(responses)
+        self.addCleanup(server.close)
+        backend = GeminiBackend(api_key='test-key', base_url=server.url, sleep=lambda seconds: None, **options)
+        self.addCleanup(backend.session.close)
+        return server, backend
+
+    def test_reuses_one_pooled_connection(self):
+        server, backend = self.backend([gemini_text('one'), gemini_text('two')])
+        self.assertEqual(backend.generate('first'), 'one')
+        self.assertEqual(backend.generate('second'), 'two')
+        self.assertEqual(len(server.connections), 1)
+        path, headers, body = server.requests[0]
+        self.assertEqual(path, '/v1/models/gemini-2.5-flash:generateContent')
+        self.assertEqual(headers['x-goog-api-key'], 'test-key')
+        self.assertEqual(body['contents'][0]['parts'][0]['text'], 'first')
+
+    def test_retries_rate_limits_and_server_errors(self):
+        server, backend = self.backend([(429, {}), (503, {}), gemini_text('finally')], max_retries=3)
+        self.assertEqual(backend.generate('prompt'), 'finally')
+        self.assertEqual(len(server.requests), 3)
+
+    def test_client_errors_are_not_retried(self):
+        server, backend = self.backend([(400, {'error': {'message': 'bad prompt'}})])
+        with self.assertRaises(LLMHTTPError) as ctx:
+            backend.generate('prompt')
+        self.assertEqual(ctx.exception.status_code, 400)
+        self.assertEqual(len(server.requests), 1)
+
+    def test_circuit_opens_after_repeated_failures(self):
+        server, backend = self.backend([(503, {})] * 4, max_retries=1, failure_threshold=2)
+        for _ in range(2):
+            with self.assertRaises(LLMHTTPError):
+                backend.generate('prompt')
+        with self.assertRaises(CircuitOpenError):
+            backend.generate('prompt')
+        self.assertEqual(len(server.requests), 4)
+
+    def test_trial_ending_without_a_verdict_lets_the_next_call_try(self):
+        server, backend = self.backend([(503, {}), gemini_text('back')], max_retries=0, failure_threshold=1)
+        with self.assertRaises(LLMHTTPError):
+            backend.generate('prompt')
+        backend.breaker.opened_at -= backend.breaker.reset_timeout
+        # A trial cancelled by a client that went away, then one failing unexpectedly
+        with mock.patch.object(httpx.AsyncClient, 'send', side_effect=asyncio.CancelledError):
+            with self.assertRaises(asyncio.CancelledError):
+                async_to_sync(backend.agenerate)('prompt')
+        with mock.patch.object(backend.session, 'request', side_effect=RuntimeError('boom')):
+            with self.assertRaises(RuntimeError):
+                backend.generate('prompt')
+        self.assertEqual(backend.generate('prompt'), 'back')
+        self.assertEqual(backend.breaker.state, 'closed')
+
+    def test_streams_text_fragments(self):
+        server, backend = self.backend([gemini_sse('{"title": ', '"Caf\u00e9"}')])
+        self.assertEqual(list(backend.stream('prompt')), ['{"title": ', '"Caf\u00e9"}'])
+        path, headers, body = server.requests[0]
+        self.assertEqual(path, '/v1/models/gemini-2.5-flash:streamGenerateContent?alt=sse')
+
+    def test_errors_map_to_generation_payloads(self):
+        server = FakeGeminiServer([(400, {'error': {'message': 'bad prompt'}})])
+        self.addCleanup(server.close)
+        with override_settings(LLM_BACKEND={'BACKEND': 'quizzes.llm.GeminiBackend', 'OPTIONS': {
+            'api_key': 'test-key', 'base_url': server.url,
+        }}):
+            with self.assertRaises(GenerationError) as ctx:
+                complete('prompt')
+        self.assertEqual(ctx.exception.status, 400)
+        self.assertEqual(ctx.exception.payload, {'error': 'Bad request to Gemini API', 'details': 'bad prompt'})
+
+
+@override_settings(LLM_BACKEND=STUB_LLM)
+class GenerationCacheTests(TestCase):
+    def setUp(self):
+        caches['throttle'].clear()
+        get_generation_cache().clear()
+        StubLLMBackend.calls = 0
+        self.client = APIClient()
+        self.user = User.objects.create_user(username='alice', password='pass12345')
+        self.client.force_authenticate(self.user)
+
+    def generate(self, topic, num_questions=3):
+        response = self.client.post(reverse('generate-quiz'), {'topic': topic, 'num_questions': num_questions}, format='json')
+        self.assertEqual(response.status_code, 201)
+        return response.data
+
+    def test_identical_requests_share_one_llm_call(self):
+        first = self.generate('Python')
+        second = self.generate('  python ')
+        self.generate('Python', num_questions=4)
+        self.assertEqual(StubLLMBackend.calls, 2)
+        # Each requester gets its own copy
+        self.assertNotEqual(first['id'], second['id'])
+        self.assertEqual(
+            [q['text'] for q in first['questions']],
+            [q['text'] for q in second['questions']],
+        )
+        self.assertEqual(get_generation_cache().stats()['hits'], 1)
+
+    @override_settings(QUIZ_GENERATION_CACHE={'MAX_ENTRIES': 8, 'TTL': 60, 'CLONE': False})
+    def test_reuses_the_same_quiz_when_cloning_is_off(self):
+        first = self.generate('Python')
+        second = self.generate('Python')
+        self.assertEqual(first['id'], second['id'])
+        self.assertEqual(Quiz.objects.count(), 1)
+
+    @override_settings(LLM_BACKEND={'BACKEND': 'quizzes.tests.TruncatedStreamLLMBackend'})
+    def test_short_quizzes_are_not_cached(self):
+        # The stream breaks off inside the third question, so two are saved
+        first = self.generate('Python')
+        second = self.generate('Python')
+        self.assertEqual((len(first['questions']), len(second['questions'])), (2, 2))
+        self.assertNotEqual(first['id'], second['id'])
+        stats = get_generation_cache().stats()
+        self.assertEqual((stats['hits'], stats['misses'], stats['entries']), (0, 2, 0))
+
+    def test_stats_are_staff_only(self):
+        self.assertEqual(self.client.get(reverse('generation-cache-stats')).status_code, 403)
+        self.user.is_staff = True
+        self.user.save()
+        self.generate('Python')
+        response = self.client.get(reverse('generation-cache-stats'))
+        self.assertEqual((response.data['misses'], response.data['entries']), (1, 1))
+
+
+class GenerationCacheUnitTests(TestCase):
+    def test_ttl_and_lru_eviction(self):
+        now = [0]
+        cache = GenerationCache(max_entries=2, ttl=10, clock=lambda: now[0])
+        cache.get_or_compute('a', lambda: 'A')
+        cache.get_or_compute('b', lambda: 'B')
+        cache.get_or_compute('a', lambda: 'stale')  # hit, 'a' is now most recent
+        cache.get_or_compute('c', lambda: 'C')  # evicts 'b'
+        self.assertEqual(cache.get_or_compute('b', lambda: 'B2'), 'B2')
+        now[0] = 11
+        self.assertEqual(cache.get_or_compute('c', lambda: 'C2'), 'C2')
+        self.assertEqual(cache.stats()['hits'], 1)
+
+    def test_concurrent_misses_are_coalesced(self):
+        cache = GenerationCache()
+        release = threading.Event()
+        calls = []
+
+        def slow():
+            calls.append(1)
+            release.wait(5)
+            return 'value'
+
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(cache.get_or_compute('k', slow))) for _ in range(5)]
+        for thread in threads:
+            thread.start()
+        while cache.stats()['coalesced'] < 4:
+            time.sleep(0.01)
+        release.set()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(results, ['value'] * 5)
+        self.assertEqual(len(calls), 1)
+
+    def test_failures_are_not_cached(self):
+        cache = GenerationCache()
+
+        def fail():
+            raise GenerationError({'error': 'boom'})
+
+        with self.assertRaises(GenerationError):
+            cache.get_or_compute('k', fail)
+        self.assertEqual(cache.get_or_compute('k', lambda: 'ok'), 'ok')
+
+
+@override_settings(LLM_BACKEND=STUB_LLM, QUIZ_GENERATION_CHUNK_SIZE=5)
+class ChunkedGenerationTests(TestCase):
+    def setUp(self):
+        get_generation_cache().clear()
+        StubLLMBackend.calls = 0
+
+    def test_large_quiz_is_generated_in_chunks(self):
+        quiz = generate_quiz('Python', 12)
+        self.assertEqual(StubLLMBackend.calls, 3)
+        self.assertEqual(quiz.question_set.count(), 12)
+        self.assertEqual(quiz.title, 'Python Quiz')
+
+    @override_settings(LLM_BACKEND={'BACKEND': 'quizzes.tests.RepetitiveLLMBackend'})
+    def test_duplicate_questions_across_chunks_are_dropped(self):
+        quiz = generate_quiz('Python', 10)
+        self.assertEqual(sorted(quiz.question_set.values_list('text', flat=True)), [
+            f'Python question 1.{i}' for i in range(5)
+        ])
+
+    @override_settings(LLM_BACKEND={'BACKEND': 'quizzes.tests.SlowLLMBackend'})
+    def test_chunks_run_concurrently_and_failures_are_dropped(self):
+        SlowLLMBackend.peak = 0
+        quiz = generate_quiz('Flaky', 20)
+        self.assertGreater(SlowLLMBackend.peak, 1)
+        # Part 2 came back unparseable; the other three parts are kept
+        self.assertEqual(quiz.question_set.count(), 15)
+        self.assertFalse(quiz.question_set.filter(text__startswith='Flaky question 2.').exists())
+
+    @override_settings(LLM_BACKEND={'BACKEND': 'quizzes.tests.CrashingLLMBackend'})
+    def test_unexpected_chunk_errors_are_raised(self):
+        with self.assertLogs('quizzes.generation', 'ERROR'):
+            with self.assertRaisesMessage(RuntimeError, 'backend bug'):
+                list(stream_questions('Python', 12))
+
+    @override_settings(LLM_BACKEND={'BACKEND': 'quizzes.tests.CrashingLLMBackend'})
+    def test_unexpected_async_chunk_errors_are_raised(self):
+        async def collect():
+            return [item async for item in astream_questions('Python', 12)]
+
+        with self.assertLogs('quizzes.generation', 'ERROR'):
+            with self.assertRaisesMessage(RuntimeError, 'backend bug'):
+                async_to_sync(collect)()
+
+    def test_chunks_stop_when_the_reader_does(self):
+        # One worker, so every chunk after the first is still queued
+        executor = ThreadPoolExecutor(max_workers=1)
+        with mock.patch('quizzes.generation._chunk_executor', executor):
+            questions = stream_questions('Python', 40)
+            next(questions)
+            questions.close()
+            executor.shutdown(wait=True)
+        self.assertEqual(StubLLMBackend.calls, 1)
+
+    def test_chunk_sizes_and_fingerprints(self):
+        self.assertEqual(chunk_sizes(12, 5), [5, 5, 2])
+        self.assertEqual(chunk_sizes(10, 5), [5, 5])
+        self.assertEqual(question_fingerprint({'text': 'What is  Python?'}), question_fingerprint({'text': 'what is python'}))
+
+
+class QuizStreamParserTests(TestCase):
+    text = '```json\n' + json.dumps({
+        'title': 'Tricky {quiz}',
+        'description': 'Quotes \\" and [brackets]',
+        'questions': [
+            {'text': 'What is "{}"?', 'choices': [{'text': 'a dict', 'is_correct': True}]},
+            {'text': 'Escapes \\\\ end', 'choices': [{'text': '}', 'is_correct': False}]},
+        ],
+    }) + '\n```'
+
+    def parse(self, text, step):
+        parser = QuizStreamParser()
+        questions = []
+        for i in range(0, len(text), step):
+            questions.extend(parser.feed(text[i:i + step]))
+        return parser, questions
+
+    def test_fragment_boundaries_do_not_matter(self):
+        expected = json.loads(self.text[8:-4])
+        for step in (1, 2, 3, 7, len(self.text)):
+            parser, questions = self.parse(self.text, step)
+            self.assertEqual(questions, expected['questions'])
+            self.assertEqual(parser.header, {'title': 'Tricky {quiz}', 'description': expected['description']})
+            self.assertTrue(parser.done)
+
+    def test_truncated_output_keeps_complete_questions(self):
+        cut = self.text.index('Escapes')
+        parser, questions = self.parse(self.text[:cut], 5)
+        self.assertEqual([q['text'] for q in questions], ['What is "{}"?'])
+        self.assertFalse(parser.done)
+
+
+@override_settings(LLM_BACKEND={'BACKEND': 'quizzes.tests.TruncatedStreamLLMBackend'})
+class StreamingGenerationTests(TestCase):
+    def setUp(self):
+        get_generation_cache().clear()
+        TruncatedStreamLLMBackend.saved_while_streaming = []
+
+    def test_questions_are_saved_as_they_arrive_and_survive_truncation(self):
+        with self.assertLogs('quizzes.generation', 'WARNING'):
+            quiz = generate_quiz('Python', 5)
+        self.assertEqual(list(quiz.question_set.order_by('text').values_list('text', flat=True)), [
+            'Python question 1.0', 'Python question 1.1',
+        ])
+        self.assertEqual(quiz.question_set.first().choice_set.count(), 2)
+        # The first question was in the database before the stream ended
+        self.assertEqual(TruncatedStreamLLMBackend.saved_while_streaming[-1], 2)
+        self.assertIn(1, TruncatedStreamLLMBackend.saved_while_streaming)
+
+    @override_settings(LLM_BACKEND=STUB_LLM)
+    def test_invalid_questions_are_skipped(self):
+        writer = QuizWriter('Python', 5)
+        header = {'title': 'Python Quiz'}
+        self.assertIsNone(writer.add(header, {'text': 'No choices'}))
+        self.assertIsNotNone(writer.add(header, {'text': 'Fine', 'choices': [{'text': 'a', 'is_correct': True}]}))
+        self.assertIsNone(writer.add(header, {'text': 'fine!', 'choices': []}))
+        self.assertEqual(writer.finish().question_set.count(), 1)
+
+    def test_nothing_parsed_is_an_error(self):
+        writer = QuizWriter('Python', 5)
+        writer.add({}, {'text': 'x' * 400, 'choices': []})
+        with self.assertRaises(GenerationError) as ctx:
+            writer.finish()
+        self.assertEqual(ctx.exception.status, 400)
+        self.assertFalse(Quiz.objects.exists())
+
+
+def read_events(response):
+    for block in b''.join(response.streaming_content).decode().split('\n\n'):
+        if block:
+            event, data = block.split('\n')
+            yield event[len('event: '):], json.loads(data[len('data: '):])
+
+
+class GenerateQuizStreamTests(TestCase):
+    def setUp(self):
+        caches['throttle'].clear()
+        self.client = APIClient()
+        self.client.force_authenticate(User.objects.create_user(username='alice', password='pass12345'))
+
+    def stream(self, data, **extra):
+        return self.client.post(reverse('generate-quiz-stream'), data, format='json', **extra)
+
+    def test_streams_questions_from_gemini_then_the_quiz_id(self):
+        text = stub_quiz_json('Python', 2)
+        server = FakeGeminiServer([gemini_sse(*[text[i:i + 25] for i in range(0, len(text), 25)])])
+        self.addCleanup(server.close)
+        with override_settings(LLM_BACKEND={'BACKEND': 'quizzes.llm.GeminiBackend', 'OPTIONS': {
+            'api_key': 'test-key', 'base_url': server.url,
+        }}):
+            response = self.stream({'topic': 'Python', 'num_questions': 2}, HTTP_ACCEPT='text/event-stream')
+            self.assertEqual(response['Content-Type'], 'text/event-stream')
+            events = list(read_events(response))
+
+        self.assertEqual([event for event, data in events], ['quiz', 'question', 'question', 'done'])
+        quiz = Quiz.objects.get(pk=events[-1][1]['quiz_id'])
+        self.assertEqual(events[0][1]['id'], str(quiz.pk))
+        self.assertEqual(events[-1][1]['num_questions'], 2)
+        self.assertEqual([data['text'] for event, data in events[1:3]], ['Python question 1.0', 'Python question 1.1'])
+        self.assertEqual(len(events[1][1]['choices']), 2)
+        self.assertEqual(quiz.question_set.count(), 2)
+
+    @override_settings(LLM_BACKEND={'BACKEND': 'quizzes.tests.SteppedStreamLLMBackend'})
+    def test_first_question_arrives_before_generation_finishes(self):
+        response = self.stream({'topic': 'Python', 'num_questions': 3})
+        for chunk in response.streaming_content:
+            if chunk.startswith(b'event: question'):
+                break
+        self.assertLess(SteppedStreamLLMBackend.sent, SteppedStreamLLMBackend.total / 2)
+        response.close()
+
+    @override_settings(LLM_BACKEND={'BACKEND': 'quizzes.tests.GarbageLLMBackend'})
+    def test_generation_failure_is_an_error_event(self):
+        events = list(read_events(self.stream({'topic': 'Python'})))
+        self.assertEqual(len(events), 1)
+        self.assertEqual(events[0][0], 'error')
+        self.assertEqual(events[0][1]['error'], 'Incomplete JSON response from AI')
+        self.assertFalse(Quiz.objects.exists())
+
+    def test_invalid_request_is_rejected_before_streaming(self):
+        response = self.stream({'num_questions': 0}, HTTP_ACCEPT='text/event-stream')
+        self.assertEqual(response.status_code, 400)
+        self.assertTrue(response.content.startswith(b'event: error\ndata: {"topic"'))
+
+
+class AsyncViewTests(TestCase):
+    def setUp(self):
+        caches['throttle'].clear()
+        get_generation_cache().clear()
+        self.user = User.objects.create_user(username='alice', password='pass12345')
+        token = RefreshToken.for_user(self.user).access_token
+        self.async_client = AsyncClient()
+        self.auth = {'Authorization': f'Bearer {token}'}
+
+    def generate(self, topic, num_questions=2):
+        return self.async_client.post(
+            reverse('generate-quiz-async'), {'topic': topic, 'num_questions': num_questions},
+            content_type='application/json', headers=self.auth,
+        )
+
+    async def test_dashboard_matches_the_sync_view(self):
+        quiz = await sync_to_async(make_quiz)()
+        choices = [c async for c in Choice.objects.filter(question__quiz=quiz, is_correct=True)]
+        client = APIClient()
+        client.force_authenticate(self.user)
+        await sync_to_async(client.post)(reverse('submit-quiz', args=[quiz.id]), {
+            'answers': [{'question': str(c.question_id), 'choice': str(c.id)} for c in choices],
+        }, format='json')
+
+        response = await self.async_client.get(reverse('dashboard-stats-async'), headers=self.auth)
+        self.assertEqual(response.status_code, 200)
+        sync_response = await sync_to_async(client.get)(reverse('dashboard-stats'))
+        self.assertEqual(response.json(), json.loads(sync_response.content))
+        self.assertEqual(response.json()['total_attempts'], 1)
+
+    async def test_requires_a_valid_token(self):
+        response = await AsyncClient().get(reverse('dashboard-stats-async'))
+        self.assertEqual(response.status_code, 401)
+        self.assertIn('Bearer', response['WWW-Authenticate'])
+        response = await AsyncClient().get(reverse('dashboard-stats-async'), headers={'Authorization': 'Bearer nope'})
+        self.assertEqual(response.status_code, 401)
+
+    async def test_generation_streams_from_gemini_over_httpx(self):
+        text = stub_quiz_json('Python', 2)
+        server = FakeGeminiServer([(503, {}), gemini_sse(text[:40], text[40:])])
+        self.addCleanup(server.close)
+        options = {'api_key': 'test-key', 'base_url': server.url, 'asleep': lambda seconds: asyncio.sleep(0)}
+        with override_settings(LLM_BACKEND={'BACKEND': 'quizzes.llm.GeminiBackend', 'OPTIONS': options}):
+            response = await self.generate('Python')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.json()['title'], 'Python Quiz')
+        self.assertEqual(len(response.json()['questions']), 2)
+        self.assertEqual(server.requests[-1][0], '/v1/models/gemini-2.5-flash:streamGenerateContent?alt=sse')
+
+    @override_settings(LLM_BACKEND={'BACKEND': 'quizzes.tests.AsyncSlowLLMBackend'}, QUIZ_GENERATION_CHUNK_SIZE=5)
+    async def test_slow_generations_overlap_on_one_event_loop(self):
+        AsyncSlowLLMBackend.peak = 0
+        start = time.perf_counter()
+        responses = await asyncio.gather(*[self.generate(f'Topic {i}', num_questions=7) for i in range(5)])
+        elapsed = time.perf_counter() - start
+        self.assertEqual([r.status_code for r in responses], [201] * 5)
+        self.assertEqual({len(r.json()['questions']) for r in responses}, {7})
+        # Ten chunk calls of 0.2s each, all waiting at once
+        self.assertEqual(AsyncSlowLLMBackend.peak, 10)
+        self.assertLess(elapsed, 1)
+
+    @override_settings(LLM_BACKEND={'BACKEND': 'quizzes.tests.GarbageLLMBackend'})
+    async def test_generation_errors_and_validation(self):
+        response = await self.generate('Python')
+        self.assertEqual(response.status_code, 500)
+        self.assertEqual(response.json()['error'], 'Incomplete JSON response from AI')
+        response = await self.generate('', num_questions=0)
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(set(response.json()), {'topic', 'num_questions'})
+
+
+THROTTLE_RATES = {'generation': '10/hour', 'generation_global': '15/hour', 'submission': '2/min', 'login': '2/min'}
+
+
+@override_settings(LLM_BACKEND=STUB_LLM, REST_FRAMEWORK={**settings.REST_FRAMEWORK, 'DEFAULT_THROTTLE_RATES': THROTTLE_RATES})
+class ThrottleTests(TestCase):
+    def setUp(self):
+        caches['throttle'].clear()
+        get_generation_cache().clear()
+        self.client = APIClient()
+        self.user = User.objects.create_user(username='alice', password='pass12345')
+        self.client.force_authenticate(self.user)
+
+    def generate(self, num_questions, user=None):
+        self.client.force_authenticate(user or self.user)
+        return self.client.post(reverse('generate-quiz'), {'topic': 'Python', 'num_questions': num_questions}, format='json')
+
+    def test_submissions_are_limited_per_user(self):
+        quiz = make_quiz()
+        url = reverse('submit-quiz', args=[quiz.id])
+        self.assertEqual([self.client.post(url, {'answers': []}, format='json').status_code for _ in range(3)], [201, 201, 429])
+        response = self.client.post(url, {'answers': []}, format='json')
+        self.assertAlmostEqual(int(response['Retry-After']), 30, delta=2)
+        self.client.force_authenticate(User.objects.create_user(username='bob'))
+        self.assertEqual(self.client.post(url, {'answers': []}, format='json').status_code, 201)
+
+    def test_generation_cost_is_weighted_by_question_count(self):
+        self.assertEqual(self.generate(6).status_code, 201)
+        response = self.generate(6)
+        self.assertEqual(response.status_code, 429)
+        # Two more tokens at ten an hour
+        self.assertAlmostEqual(int(response['Retry-After']), 720, delta=5)
+        self.assertEqual(self.generate(4).status_code, 201)
+
+    def test_global_bucket_is_shared_between_users(self):
+        self.assertEqual(self.generate(10).status_code, 201)
+        bob = User.objects.create_user(username='bob')
+        self.assertEqual(self.generate(5, user=bob).status_code, 201)
+        self.assertEqual(self.generate(1, user=bob).status_code, 429)
+        # Refused requests spend nothing: bob's own bucket is still at 5
+        self.assertEqual(caches['throttle'].get(f'throttle_generation_{bob.pk}')[0], 5)
+
+    def test_async_generation_is_throttled(self):
+        token = RefreshToken.for_user(self.user).access_token
+        self.assertEqual(self.generate(10).status_code, 201)
+        response = async_to_sync(AsyncClient().post)(
+            reverse('generate-quiz-async'), {'topic': 'Python', 'num_questions': 1},
+            content_type='application/json', headers={'Authorization': f'Bearer {token}'},
+        )
+        self.assertEqual(response.status_code, 429)
+        self.assertAlmostEqual(int(response['Retry-After']), 360, delta=5)
+
+    def test_bucket_refills_over_time(self):
+        now = [1000.0]
+        throttle = GenerationThrottle()
+        throttle.timer = lambda: now[0]
+        request = type('Request', (), {'user': self.user, 'data': {'num_questions': 10}})()
+        self.assertTrue(throttle.allow_request(request, None))
+        self.assertFalse(throttle.allow_request(request, None))
+        self.assertEqual(throttle.wait(), 3600)
+        now[0] += 1800
+        request.data = {'num_questions': 5}
+        self.assertTrue(throttle.allow_request(request, None))
+        self.assertFalse(throttle.allow_request(request, None))
@@ -1,10 +1,13 @@
 from django.urls import path
-from .views import QuizListCreateView, QuizDetailView, QuestionListCreateView, QuestionDetailView, ChoiceListCreateView, ChoiceDetailView, SubmitQuizView, GenerateQuizAPIView, DashboardAPIView
+from .async_views import AsyncGenerateQuizView, AsyncDashboardAPIView
+from .views import QuizListCreateView, QuizDetailView, QuestionListCreateView, QuestionDetailView, ChoiceListCreateView, ChoiceDetailView, SubmitQuizView, AttemptHistoryView, GenerateQuizAPIView, GenerateQuizStreamView, GenerationJobCreateView, GenerationJobDetailView, GenerationCacheStatsView, ResponseCacheStatsView, QuizBulkView, QuizLeaderboardView, GlobalLeaderboardView, DashboardAPIView
 
 urlpatterns = [
  # Quiz URLs
  path('', QuizListCreateView.as_view(), name="quiz-list-create"),
  path('<uuid:pk>/', QuizDetailView.as_view(), name="quiz-detail"),
+ path('response-cache/stats/', ResponseCacheStatsView.as_view(), name='response-cache-stats'),
+ path('bulk/', QuizBulkView.as_view(), name='quiz-bulk'),
  
  # Question URLs
  path('<uuid:quiz_id>/questions/', QuestionListCreateView.as_view(), name="question-list-create"),
@@ -17,9 +20,22 @@ urlpatterns = [
  # SubmitQuiz URL
  path('<uuid:quiz_id>/submit/', SubmitQuizView.as_view(), name="submit-quiz"),
 
+ # Leaderboard URLs
+ path('<uuid:quiz_id>/leaderboard/', QuizLeaderboardView.as_view(), name="quiz-leaderboard"),
+ path('leaderboard/', GlobalLeaderboardView.as_view(), name="global-leaderboard"),
+
+ # Attempt history URL
+ path('attempts/', AttemptHistoryView.as_view(), name="attempt-history"),
+
  # AI Generate quiz
  path('generate-quiz/', GenerateQuizAPIView.as_view(), name='generate-quiz'), 
+ path('generate-quiz/async/', AsyncGenerateQuizView.as_view(), name='generate-quiz-async'),
+ path('generate-quiz/stream/', GenerateQuizStreamView.as_view(), name='generate-quiz-stream'),
+ path('generate-quiz/jobs/', GenerationJobCreateView.as_view(), name='generation-job-create'),
+ path('generate-quiz/jobs/<uuid:pk>/', GenerationJobDetailView.as_view(), name='generation-job-detail'),
+ path('generate-quiz/cache-stats/', GenerationCacheStatsView.as_view(), name='generation-cache-stats'),
 
  # Dashboard URL
- path('dashboard/stats/', DashboardAPIView.as_view(), name='dashboard-stats')
+ path('dashboard/stats/', DashboardAPIView.as_view(), name='dashboard-stats'),
+ path('dashboard/stats/async/', AsyncDashboardAPIView.as_view(), name='dashboard-stats-async'),
 ]
\ No newline at end of file
@@ -1,44 +1,129 @@
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status
-from rest_framework.permissions import IsAuthenticated, AllowAny
-from dotenv import load_dotenv
-from django.db.models import Avg, Count, F
-import dotenv
-import os
+from rest_framework.permissions import IsAuthenticated, IsAdminUser, AllowAny
+from rest_framework.renderers import BaseRenderer, BrowsableAPIRenderer, JSONRenderer
+from django.http import HttpResponse, StreamingHttpResponse
 from django.shortcuts import get_object_or_404
-from .models import Quiz, Question, Choice, QuizAttempt, UserAnswer
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, parse_http_date
+from django.urls import reverse
+from quiz_platform.throttling import GenerationThrottle, SubmissionThrottle
+from users.authentication import StatelessJWTAuthentication, user_must_exist
+from .models import Quiz, Question, Choice, QuizAttempt, GenerationJob
+from . import bulk, jobs, leaderboard, stats
+from .fast_serializers import FastJSONRenderer, choice_data, question_data, quiz_data
+from .generation import GenerationError, generate_quiz, generate_quiz_stream, get_generation_cache
 from rest_framework.pagination import PageNumberPagination
-from .serializers import QuizSerializer, QuestionSerializer, ChoiceSerializer, QuizNestedCreateSerializer
-import requests
+from .grading import GradingError, get_answer_key, record_attempt
+from .pagination import KeysetPagination, AttemptKeysetPagination
+from .response_cache import CachedResponse, detail_key, get_response_cache, list_key
+from .serializers import QuizSerializer, QuizCatalogSerializer, QuestionSerializer, ChoiceSerializer, QuizNestedCreateSerializer, QuizAttemptSerializer, GenerateQuizRequestSerializer, GenerationJobSerializer
+
+# ------------------- CONDITIONAL GETS -------------------
+def content_validators(quiz, representation):
+    """
+    ETag and Last-Modified of one representation of a quiz's content. Both follow
+    the quiz version, which every write to the quiz, its questions or choices bumps.
+    """
+    return {
+        'ETag': f'"{quiz.pk}.{quiz.version}.{representation}"',
+        'Last-Modified': http_date(quiz.updated_at.timestamp()),
+        # Cacheable, but always revalidated so an edit is seen on the next read
+        'Cache-Control': 'no-cache',
+    }
+
+
+def not_modified(request, headers):
+    """The 304 (or 412) response when the client's copy is current, else None."""
+    last_modified = headers.get('Last-Modified')
+    response = get_conditional_response(
+        request, etag=headers.get('ETag'), last_modified=last_modified and parse_http_date(last_modified),
+    )
+    if response is not None:
+        for name, value in headers.items():
+            response[name] = value
+    return response
+
+
+# ------------------- RESPONSE CACHE -------------------
+def cached_read(request, key):
+    """
+    ``(response, None)`` when the read is served from the response cache, else
+    ``(None, ticket)``; the ticket is None when this rendering isn't cached.
+    """
+    # Only plain JSON is cached, not the browsable API or ?indent= renderings
+    if request.accepted_media_type != JSONRenderer.media_type:
+        return None, None
+    cached, ticket = get_response_cache().get(key)
+    if cached is None:
+        return None, ticket
+    response = not_modified(request, cached.headers)
+    if response is None:
+        response = HttpResponse(cached.body, content_type=JSONRenderer.media_type, headers=cached.headers)
+    return response, None
+
+
+def cache_response(key, ticket, response, quiz_ids):
+    """Store ``response``'s bytes under ``key`` once DRF has rendered them."""
+    headers = {name: value for name, value in response.items() if name != 'Content-Type'}
+    quiz_ids = [str(pk) for pk in quiz_ids]
+    response.add_post_render_callback(
+        lambda rendered: get_response_cache().store(key, ticket, CachedResponse(rendered.content, headers, quiz_ids))
+    )
+    return response
 
-load_dotenv()
-GOOGLE_API_KEY = os.getenv("GOOGLE_GEMINI_API_KEY")
 
 # ------------------- QUIZ CRUD -------------------
 class QuizListCreateView(APIView):
+    renderer_classes = [FastJSONRenderer, BrowsableAPIRenderer]
+
     def get_permissions(self):
         if self.request.method == 'POST':
             return [IsAuthenticated()]
         return [AllowAny()]
     
     def get(self, request):
-        quizzes = Quiz.objects.all()
-        paginator = PageNumberPagination()
-        paginator.page_size = 6
+        # Pages are cached by full URL, as the pagination links in them are absolute
+        key = list_key(request.build_absolute_uri())
+        response, ticket = cached_read(request, key)
+        if response is not None:
+            return response
+        # ?mode=catalog returns summaries with a question count instead of nested questions
+        catalog = request.query_params.get('mode') == 'catalog'
+        if catalog:
+            quizzes = QuizCatalogSerializer.setup_eager_loading(Quiz.objects.all())
+        else:
+            quizzes = Quiz.objects.order_by('created_at', 'id')
+        # ?cursor= switches from page numbers to keyset pagination
+        if 'cursor' in request.query_params:
+            paginator = KeysetPagination()
+        else:
+            paginator = PageNumberPagination()
+            paginator.page_size = 6
         result_page = paginator.paginate_queryset(quizzes, request)
-        serializer = QuizSerializer(result_page, many=True)
-        return paginator.get_paginated_response(serializer.data)
+        if catalog:
+            data = QuizCatalogSerializer(result_page, many=True).data
+        else:
+            # Questions and choices in two queries, as plain dicts (quizzes.fast_serializers)
+            data = quiz_data(result_page)
+        response = paginator.get_paginated_response(data)
+        if ticket is not None:
+            cache_response(key, ticket, response, [quiz.pk for quiz in result_page])
+        return response
     
     def post(self, request):
         serializer = QuizNestedCreateSerializer(data=request.data)
         if serializer.is_valid():
             quiz = serializer.save()
+            quiz = QuizSerializer.setup_eager_loading(Quiz.objects.filter(pk=quiz.pk)).get()
             return Response(QuizSerializer(quiz).data, status=status.HTTP_201_CREATED)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
 
 class QuizDetailView(APIView):
+    renderer_classes = [FastJSONRenderer, BrowsableAPIRenderer]
+
     def get_permissions(self):
         if self.request.method == 'PUT' or self.request.method == 'DELETE':
             return [IsAuthenticated()]
@@ -51,11 +136,22 @@ class QuizDetailView(APIView):
             return None
 
     def get(self, request, pk):
+        key = detail_key(pk)
+        response, ticket = cached_read(request, key)
+        if response is not None:
+            return response
         quiz = self.get_object(pk)
         if quiz is None:
             return Response({'error': 'Quiz not found'}, status=status.HTTP_404_NOT_FOUND)
-        serializer = QuizSerializer(quiz)
-        return Response(serializer.data)
+        headers = content_validators(quiz, 'quiz')
+        response = not_modified(request, headers)
+        if response is not None:
+            return response
+        # Questions and choices are only loaded once the client's copy is known to be stale
+        response = Response(quiz_data([quiz])[0], headers=headers)
+        if ticket is not None:
+            cache_response(key, ticket, response, [quiz.pk])
+        return response
 
     def put(self, request, pk):
         quiz = self.get_object(pk)
@@ -77,15 +173,22 @@ class QuizDetailView(APIView):
 
 # ------------------- QUESTION CRUD -------------------
 class QuestionListCreateView(APIView):
+    renderer_classes = [FastJSONRenderer, BrowsableAPIRenderer]
+
     def get_permissions(self):
         if self.request.method == 'POST':
             return [IsAuthenticated()]
         return [AllowAny()]
     
     def get(self, request, quiz_id):
-        questions = Question.objects.filter(quiz_id=quiz_id)        
-        serializer = QuestionSerializer(questions, many=True)
-        return Response(serializer.data)
+        quiz = Quiz.objects.only('version', 'updated_at').filter(pk=quiz_id).first()
+        if quiz is None:
+            return Response([])
+        headers = content_validators(quiz, 'questions')
+        response = not_modified(request, headers)
+        if response is not None:
+            return response
+        return Response(question_data(Question.objects.filter(quiz_id=quiz_id)), headers=headers)
 
     def post(self, request, quiz_id):
         request.data['quiz'] = quiz_id
@@ -136,15 +239,23 @@ class QuestionDetailView(APIView):
 
 # ------------------- CHOICE CRUD -------------------
 class ChoiceListCreateView(APIView):
+    renderer_classes = [FastJSONRenderer, BrowsableAPIRenderer]
+
     def get_permissions(self):
         if self.request.method == 'POST':
             return [IsAuthenticated()]
         return [AllowAny()]
     
     def get(self, request, question_id):
-        choices = Choice.objects.filter(question_id=question_id)
-        serializer = ChoiceSerializer(choices, many=True)
-        return Response(serializer.data)
+        quiz = Quiz.objects.only('version', 'updated_at').filter(question__id=question_id).first()
+        if quiz is None:
+            return Response([])
+        # The ETag names the question: its choices are one of many such lists in the quiz
+        headers = content_validators(quiz, f'choices.{question_id}')
+        response = not_modified(request, headers)
+        if response is not None:
+            return response
+        return Response(choice_data(Choice.objects.filter(question_id=question_id)), headers=headers)
 
     def post(self, request, question_id):
         request.data['question'] = question_id
@@ -191,184 +302,204 @@ class ChoiceDetailView(APIView):
         return Response(status=status.HTTP_204_NO_CONTENT)
 
 class SubmitQuizView(APIView):
+    # Needs only the user's id and username, which the token carries
+    authentication_classes = [StatelessJWTAuthentication]
     permission_classes = [IsAuthenticated]
+    throttle_classes = [SubmissionThrottle]
     def post(self, request, quiz_id):
         user = request.user
         quiz = get_object_or_404(Quiz, id=quiz_id)
         answers = request.data.get('answers', [])
 
-        # Create QuizAttempt
-        attempt = QuizAttempt.objects.create(user=user, quiz=quiz)
-        user_answers = []
-
-        correct = 0
-        for ans in answers:
-            question = get_object_or_404(Question, id=ans['question'])
-            choice = get_object_or_404(Choice, id=ans['choice'])
-            
-            if choice.is_correct:
-                correct += 1
-            
-            user_answers.append(
-                UserAnswer(
-                    attempt=attempt,
-                    question=question,
-                    selected_choice=choice
-                )
-            )
-
-        # Bulk insert all answers
-        UserAnswer.objects.bulk_create(user_answers)
-
-        # Compute score
-        total_questions = quiz.question_set.count()
-        score = (correct / total_questions * 100) if total_questions > 0 else 0
-        attempt.score = score
-        attempt.save()
-        return Response({"score":score}, status=status.HTTP_201_CREATED)
+        # Validate and score every answer against the quiz's (cached) answer key in memory
+        answer_key = get_answer_key(quiz)
+        try:
+            grade = answer_key.grade(answers)
+        except GradingError as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        # Attempt and answers are written together
+        with user_must_exist(user):
+            record_attempt(user, quiz, grade)
+        return Response({"score":grade.score}, status=status.HTTP_201_CREATED)
+
+class AttemptHistoryView(APIView):
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        attempts = QuizAttemptSerializer.setup_eager_loading(QuizAttempt.objects.filter(user=request.user))
+        paginator = AttemptKeysetPagination()
+        result_page = paginator.paginate_queryset(attempts, request)
+        serializer = QuizAttemptSerializer(result_page, many=True)
+        return paginator.get_paginated_response(serializer.data)
 
 class GenerateQuizAPIView(APIView):
     permission_classes = [IsAuthenticated]
+    throttle_classes = [GenerationThrottle]
     def post(self, request):
-        topic = request.data.get("topic")
-        num_questions = request.data.get("num_questions", 5)
-
-        if not topic:
-            return Response({"error":"Topic is required"}, status=400)
-        
-        if not GOOGLE_API_KEY:
-            return Response({"error":"Google Gemini API key not configured"}, status=500)
-
-        prompt = f"""
-        Generate a quiz on the topic '{topic}' with {num_questions} multiple-choice questions.
-        Provide JSON in this format:
-        {{
-            "title": "{topic} Quiz",
-            "description": "Quiz description",
-            "questions": [
-                {{
-                    "text": "Question text",
-                    "choices": [
-                        {{"text": "Choice 1", "is_correct": true}},
-                        {{"text": "Choice 2", "is_correct": false}}
-                    ]
-                }}
-            ]
-        }}
-        """
-
-        model_name = "gemini-2.5-flash"
-        url = f"https://generativelanguage.googleapis.com/v1/models/{model_name}:generateContent?key={GOOGLE_API_KEY}"
-        headers = {
-            "Content-Type": "application/json"
-        }
-        data = {
-            "contents": [{
-                "parts": [{"text": prompt}]
-            }],
-            "generationConfig": {
-                "temperature": 0.7,
-                "maxOutputTokens": 2000
-            }
-        }
+        params = GenerateQuizRequestSerializer(data=request.data)
+        if not params.is_valid():
+            return Response(params.errors, status=400)
 
         try:
-            response = requests.post(url, json=data, headers=headers)            
-            
-            if response.status_code == 400:
-                error_data = response.json() if response.text else {}
-                return Response({
-                    "error": "Bad request to Gemini API", 
-                    "details": error_data.get("error", {}).get("message", response.text)
-                }, status=400)
-            elif response.status_code == 403:
-                return Response({
-                    "error": "API key invalid or quota exceeded", 
-                    "details": "Check your GOOGLE_GEMINI_API_KEY and usage limits"
-                }, status=403)
-            elif response.status_code != 200:            
-                return Response({
-                    "error": "AI generation failed", 
-                    "details": response.text,
-                    "status_code": response.status_code
-                }, status=500)
-        except requests.exceptions.RequestException as e:
-            return Response({
-                "error": "Network error connecting to Gemini API", 
-                "details": str(e)
-            }, status=500)
-
-        import json
+            quiz = generate_quiz(params.validated_data["topic"], params.validated_data["num_questions"])
+        except GenerationError as e:
+            return Response(e.payload, status=e.status)
+
+        quiz = QuizSerializer.setup_eager_loading(Quiz.objects.filter(pk=quiz.pk)).get()
+        return Response(QuizSerializer(quiz).data, status=201)
+
+def sse_event(event, data):
+    return b'event: ' + event.encode() + b'\ndata: ' + JSONRenderer().render(data) + b'\n\n'
+
+class EventStreamRenderer(BaseRenderer):
+    # Lets EventSource-style clients (Accept: text/event-stream) through content
+    # negotiation; errors raised before streaming starts arrive as an error event
+    media_type = 'text/event-stream'
+    format = 'sse'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        return sse_event('error', data)
+
+def generation_events(topic, num_questions):
+    # quiz (once the quiz row exists), question (one per saved question), then done or error
+    count = 0
+    try:
+        for quiz, question in generate_quiz_stream(topic, num_questions):
+            if count == 0:
+                yield sse_event('quiz', {'id': quiz.id, 'title': quiz.title, 'description': quiz.description})
+            count += 1
+            yield sse_event('question', QuestionSerializer(question).data)
+    except GenerationError as e:
+        yield sse_event('error', e.payload)
+        return
+    yield sse_event('done', {'quiz_id': quiz.id, 'num_questions': count})
+
+class GenerateQuizStreamView(APIView):
+    permission_classes = [IsAuthenticated]
+    throttle_classes = [GenerationThrottle]
+    renderer_classes = [JSONRenderer, EventStreamRenderer]
+
+    def post(self, request):
+        params = GenerateQuizRequestSerializer(data=request.data)
+        if not params.is_valid():
+            return Response(params.errors, status=status.HTTP_400_BAD_REQUEST)
+
+        # Server-sent events: each question is pushed as soon as the LLM finishes it
+        response = StreamingHttpResponse(
+            generation_events(params.validated_data["topic"], params.validated_data["num_questions"]),
+            content_type='text/event-stream',
+        )
+        response['Cache-Control'] = 'no-cache'
+        response['X-Accel-Buffering'] = 'no'
+        return response
+
+class GenerationJobCreateView(APIView):
+    permission_classes = [IsAuthenticated]
+    throttle_classes = [GenerationThrottle]
+
+    def post(self, request):
+        params = GenerateQuizRequestSerializer(data=request.data)
+        if not params.is_valid():
+            return Response(params.errors, status=status.HTTP_400_BAD_REQUEST)
+
+        # The LLM call runs on the job worker pool; poll the status URL for the result
+        job = GenerationJob.objects.create(user=request.user, **params.validated_data)
+        jobs.enqueue(job)
+        data = GenerationJobSerializer(job).data
+        data["status_url"] = request.build_absolute_uri(reverse("generation-job-detail", args=[job.id]))
+        return Response(data, status=status.HTTP_202_ACCEPTED)
+
+class GenerationJobDetailView(APIView):
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request, pk):
+        job = get_object_or_404(GenerationJob, id=pk, user=request.user)
+        return Response(GenerationJobSerializer(job).data)
+
+class GenerationCacheStatsView(APIView):
+    permission_classes = [IsAdminUser]
+
+    def get(self, request):
+        return Response(get_generation_cache().stats())
+
+class ResponseCacheStatsView(APIView):
+    permission_classes = [IsAdminUser]
+
+    def get(self, request):
+        return Response(get_response_cache().stats())
+
+# ------------------- LEADERBOARDS -------------------
+class LeaderboardView(APIView):
+    permission_classes = [AllowAny]
+    default_limit = 10
+    max_limit = 100
+
+    def get_limit(self, request):
         try:
-            response_data = response.json()
-            if "candidates" not in response_data or not response_data["candidates"]:
-                return Response({"error": "No content generated", "details": response_data}, status=500)
-            
-            content_str = response_data["candidates"][0]["content"]["parts"][0]["text"]
-            
-            # Remove markdown code blocks if present
-            json_content = content_str.strip()
-            if json_content.startswith('```json'):
-                json_content = json_content[7:]  # Remove ```json
-            if json_content.endswith('```'):
-                json_content = json_content[:-3]  # Remove ```
-            json_content = json_content.strip()
-            
-            # Check if JSON is complete (has proper closing braces)
-            if not json_content.endswith('}'):
-                # Try to find the last complete object
-                last_brace = json_content.rfind('}')
-                if last_brace > 0:
-                    json_content = json_content[:last_brace + 1]
-                else:
-                    return Response({
-                        "error": "Incomplete JSON response from AI", 
-                        "details": "Response was truncated. Try reducing the number of questions.",
-                        "raw_content": content_str[:500] + "..."
-                    }, status=500)
-            
-            quiz_json = json.loads(json_content)
-        except (KeyError, IndexError, json.JSONDecodeError) as e:
-            return Response({"error": "Failed to parse AI response", "details": str(e), "raw_response": response.text}, status=500)
-
-        serializer = QuizNestedCreateSerializer(data=quiz_json)
-        if serializer.is_valid():
-            quiz = serializer.save()
-            return Response(QuizSerializer(quiz).data, status=201)
-        else:
-            return Response(serializer.errors, status=400)
+            limit = int(request.query_params.get('limit', self.default_limit))
+        except ValueError:
+            return self.default_limit
+        return min(max(limit, 1), self.max_limit)
+
+class QuizLeaderboardView(LeaderboardView):
+    def get(self, request, quiz_id):
+        get_object_or_404(Quiz.objects.only('id'), id=quiz_id)
+        # "me" is the signed-in user's place, wherever it is on the board
+        me = leaderboard.quiz_rank(quiz_id, request.user) if request.user.is_authenticated else None
+        return Response({"top": leaderboard.quiz_top(quiz_id, self.get_limit(request)), "me": me})
+
+class GlobalLeaderboardView(LeaderboardView):
+    def get(self, request):
+        me = leaderboard.global_rank(request.user) if request.user.is_authenticated else None
+        return Response({"top": leaderboard.global_top(self.get_limit(request)), "me": me})
+
+# ------------------- BULK IMPORT / EXPORT -------------------
+class NDJSONRenderer(BaseRenderer):
+    # Lets NDJSON clients through content negotiation; errors raised before
+    # streaming starts arrive as a single line
+    media_type = bulk.NDJSON_MEDIA_TYPE
+    format = 'ndjson'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        return JSONRenderer().render(data) + b'\n'
+
+class QuizBulkView(APIView):
+    permission_classes = [IsAdminUser]
+    parser_classes = [bulk.NDJSONParser]
+    renderer_classes = [JSONRenderer, NDJSONRenderer]
+    max_reported_errors = 100
+
+    def get(self, request):
+        # Streamed chunk by chunk, so memory stays flat however many quizzes there are
+        response = StreamingHttpResponse(bulk.export_quizzes(), content_type=bulk.NDJSON_MEDIA_TYPE)
+        response['Content-Disposition'] = 'attachment; filename="quizzes.ndjson"'
+        return response
+
+    def post(self, request):
+        created, errors = bulk.import_quizzes(request.data)
+        return Response({
+            "created": created,
+            "failed": len(errors),
+            "errors": [{"line": line, "errors": detail} for line, detail in errors[:self.max_reported_errors]],
+        })
 
 class DashboardAPIView(APIView):
+    authentication_classes = [StatelessJWTAuthentication]
     permission_classes = [IsAuthenticated]
     
     def get(self, request):
         user = request.user
-        # Total attempts
-        total_attempts = QuizAttempt.objects.filter(user=user).count()
-        # Average score accros attempts
-        avg_score = QuizAttempt.objects.filter(user=user).aggregate(avg=Avg('score'))['avg'] or 0
-        # Recent attempts (limit 5)
-        recent_attempts_queryset = QuizAttempt.objects.filter(user=user).order_by('-completed_at')[:5]
-        recent_attempts = []
-        for a in recent_attempts_queryset:
-            recent_attempts.append({"id":a.id, "quiz_title":a.quiz.title, "score":a.score, "completed_at":a.completed_at})
-        # Correct vs Wrong (all attempts)
-        answers = UserAnswer.objects.filter(attempt__user=user)
-        correct_answers = answers.filter(selected_choice__is_correct=True).count()
-        wrong_answers = answers.filter(selected_choice__is_correct=False).count()
-        # Average score per quiz (for quizzes user attempted)
-        per_quiz = QuizAttempt.objects.filter(user=user).values(quiz_title=F('quiz__title')).annotate(avg_score=Avg('score'), attempts=Count('id')).order_by('-avg_score')[:10]
-        per_quiz_list = []
-        for q in per_quiz:
-            per_quiz_list.append({"quiz_title": q["quiz_title"], "avg_score": round(q["avg_score"] or 0, 2), "attempts": q["attempts"]})
-
+        # Totals come from the stats tables, or one conditional aggregate over the
+        # raw history for users who have no stats row yet
+        summary, materialized = stats.user_summary(user)
         payload = {
             "user_name":user.username,
-            "total_attempts":total_attempts,
-            "avg_score": avg_score,
-            "recent_attempts": recent_attempts,
-            "correct_answers":correct_answers,
-            "wrong_answers":wrong_answers,
-            "per_quiz_list":per_quiz_list
+            "total_attempts":summary["total_attempts"],
+            "avg_score": summary["avg_score"],
+            "recent_attempts": stats.recent_attempts(user),
+            "correct_answers":summary["correct_answers"],
+            "wrong_answers":summary["wrong_answers"],
+            "per_quiz_list":stats.quiz_averages(user, materialized=materialized)
         }
-        return Response(payload)
\ No newline at end of file
+        return Response(payload)
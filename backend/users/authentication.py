@@ -0,0 +1,148 @@
+"""
+JWT authentication without the per-request User query.
+
+simplejwt's JWTAuthentication loads the User row on every authenticated request.
+Views that only need the user's id, username and is_staff use
+StatelessJWTAuthentication instead, which builds a ClaimsUser from the token
+itself. ClaimsRefreshToken writes those claims into every token issued at login
+or by the token endpoint, and refreshed access tokens copy them. Tokens issued
+before they carried the claims are resolved with one small query per user,
+kept in a per-process cache for ``JWT_USER_CACHE['TIMEOUT']`` seconds.
+
+Nothing is read per request, so on these views a deactivated user or a renamed
+username is only noticed once the access token expires. A deleted user is
+noticed when a write refers to them: wrap it in ``user_must_exist`` to turn the
+foreign key error into the 401 the token would have got from JWTAuthentication.
+"""
+import threading
+import time
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.signals import setting_changed
+from django.db import IntegrityError
+from django.dispatch import receiver
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+from rest_framework_simplejwt.models import TokenUser
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.tokens import RefreshToken
+
+CLAIMS = ('username', 'is_staff')
+
+
+class ClaimsRefreshToken(RefreshToken):
+    @classmethod
+    def for_user(cls, user):
+        token = super().for_user(user)
+        for claim in CLAIMS:
+            token[claim] = getattr(user, claim)
+        return token
+
+
+class ClaimsUser(TokenUser):
+    """
+    TokenUser whose id has the type of User.pk, so it can stand in for the user in
+    ``user_id=user.pk`` lookups and be compared with ids read from the database.
+    """
+
+    def __init__(self, token, id, username, is_staff):
+        super().__init__(token)
+        # Shadow TokenUser's cached properties, which read the raw claims
+        self.__dict__.update(id=id, pk=id, username=username, is_staff=is_staff)
+
+
+class UserCache:
+    """``{user_id: (username, is_staff)}`` for ``timeout`` seconds, at most ``max_entries`` users."""
+
+    def __init__(self, timeout=30, max_entries=10000, clock=time.monotonic):
+        self.timeout = timeout
+        self.max_entries = max_entries
+        self.clock = clock
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    def get(self, user_id):
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is None:
+                return None
+            if entry[0] <= self.clock():
+                del self._entries[user_id]
+                return None
+            return entry[1]
+
+    def set(self, user_id, claims):
+        with self._lock:
+            self._entries.pop(user_id, None)
+            while len(self._entries) >= self.max_entries:
+                # Oldest first, by insertion order
+                del self._entries[next(iter(self._entries))]
+            self._entries[user_id] = (self.clock() + self.timeout, claims)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+_user_cache = None
+
+
+def get_user_cache():
+    global _user_cache
+    if _user_cache is None:
+        config = settings.JWT_USER_CACHE
+        _user_cache = UserCache(config['TIMEOUT'], config['MAX_ENTRIES'])
+    return _user_cache
+
+
+@receiver(setting_changed)
+def reset_user_cache(setting, **kwargs):
+    global _user_cache
+    if setting == 'JWT_USER_CACHE':
+        _user_cache = None
+
+
+class StatelessJWTAuthentication(JWTAuthentication):
+    """JWTAuthentication that returns a ClaimsUser instead of loading the User."""
+
+    def get_user(self, validated_token):
+        try:
+            raw_id = validated_token[api_settings.USER_ID_CLAIM]
+        except KeyError:
+            raise InvalidToken(_('Token contained no recognizable user identification'))
+        user_id = self.user_model._meta.get_field(api_settings.USER_ID_FIELD).to_python(raw_id)
+
+        if all(claim in validated_token for claim in CLAIMS):
+            return ClaimsUser(validated_token, user_id, *(validated_token[claim] for claim in CLAIMS))
+
+        cache = get_user_cache()
+        claims = cache.get(user_id)
+        if claims is None:
+            row = self.user_model.objects.filter(**{api_settings.USER_ID_FIELD: user_id}).values_list(
+                *CLAIMS, 'is_active',
+            ).first()
+            if row is None:
+                raise AuthenticationFailed(_('User not found'), code='user_not_found')
+            if api_settings.CHECK_USER_IS_ACTIVE and not row[-1]:
+                raise AuthenticationFailed(_('User is inactive'), code='user_inactive')
+            claims = row[:-1]
+            cache.set(user_id, claims)
+        return ClaimsUser(validated_token, user_id, *claims)
+
+
+@contextmanager
+def user_must_exist(user):
+    """
+    Raise AuthenticationFailed instead of the IntegrityError of a write that refers
+    to a user deleted since their token was issued. Wrap the whole transaction, as
+    foreign keys may only be checked when it commits.
+    """
+    try:
+        yield
+    except IntegrityError:
+        if not get_user_model().objects.filter(**{api_settings.USER_ID_FIELD: user.pk}).exists():
+            raise AuthenticationFailed(_('User not found'), code='user_not_found')
+        raise
@@ -0,0 +1,107 @@
+import time
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.contrib.auth.models import User, update_last_login
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.db.models.signals import post_save
+from django.test import Client
+from django.test.utils import override_settings
+from django.urls import reverse
+
+from users.models import UserProfile
+
+PREFIX = 'bench-auth'
+PASSWORD = 'bench-pass-12345'
+
+
+# The post_save receivers users.signals used to connect, for the "before" numbers
+def create_user_profile(sender, instance, created, **kwargs):
+    if created:
+        UserProfile.objects.create(user=instance)
+
+
+def save_user_profile(sender, instance, **kwargs):
+    instance.userprofile.save()
+
+
+@contextmanager
+def profile_signals(connected):
+    if connected:
+        post_save.connect(create_user_profile, sender=User, dispatch_uid=f'{PREFIX}-create')
+        post_save.connect(save_user_profile, sender=User, dispatch_uid=f'{PREFIX}-save')
+    try:
+        yield
+    finally:
+        post_save.disconnect(sender=User, dispatch_uid=f'{PREFIX}-create')
+        post_save.disconnect(sender=User, dispatch_uid=f'{PREFIX}-save')
+
+
+class Command(BaseCommand):
+    help = (
+        'Compare registration and login throughput with the old per-save profile signals '
+        'and with profiles created on first use. Passwords are hashed with MD5 unless '
+        '--real-hasher is given, so the database writes are not hidden behind PBKDF2. '
+        'Everything is rolled back.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=200)
+        parser.add_argument('--real-hasher', action='store_true', help='Keep the configured PASSWORD_HASHERS')
+
+    def handle(self, *args, **options):
+        overrides = {
+            'ALLOWED_HOSTS': ['*'],
+            # The login bucket would refuse most of the run
+            'REST_FRAMEWORK': {
+                **settings.REST_FRAMEWORK,
+                'DEFAULT_THROTTLE_RATES': {**settings.REST_FRAMEWORK['DEFAULT_THROTTLE_RATES'], 'login': None},
+            },
+        }
+        if not options['real_hasher']:
+            overrides['PASSWORD_HASHERS'] = ['django.contrib.auth.hashers.MD5PasswordHasher']
+
+        with override_settings(**overrides), transaction.atomic():
+            self.stdout.write(f"{'path':<12} {'signals':<8} {'queries':>8} {'req/s':>9}")
+            for name in ('register', 'login', 'last_login'):
+                for connected in (True, False):
+                    with profile_signals(connected):
+                        queries, rate = getattr(self, f'bench_{name}')(options['requests'], connected)
+                    label = 'before' if connected else 'after'
+                    self.stdout.write(f'{name:<12} {label:<8} {queries:>8} {rate:>9.0f}')
+            transaction.set_rollback(True)
+
+    def timed(self, operations):
+        """Queries of the first operation and operations per second over all of them."""
+        # Counted with a wrapper: the test client resets connection.queries per request
+        executed = []
+        with connection.execute_wrapper(lambda execute, sql, *args: executed.append(sql) or execute(sql, *args)):
+            operations[0]()
+        start = time.perf_counter()
+        for operation in operations[1:]:
+            operation()
+        elapsed = time.perf_counter() - start
+        return len(executed), (len(operations) - 1) / elapsed
+
+    def bench_register(self, requests, connected):
+        client = Client()
+        tag = 'before' if connected else 'after'
+
+        def register(i):
+            username = f'{PREFIX}-{tag}-{i}'
+            payload = {'username': username, 'email': f'{username}@example.com', 'password': PASSWORD, 'password2': PASSWORD}
+            return lambda: client.post(reverse('register'), payload, content_type='application/json')
+
+        return self.timed([register(i) for i in range(requests)])
+
+    def bench_login(self, requests, connected):
+        client = Client()
+        username = f'{PREFIX}-{"before" if connected else "after"}-0'
+        payload = {'username': username, 'password': PASSWORD}
+        return self.timed([lambda: client.post(reverse('login'), payload, content_type='application/json')] * requests)
+
+    def bench_last_login(self, requests, connected):
+        # What every session or admin login (and simplejwt with UPDATE_LAST_LOGIN) does after authenticating
+        user = User.objects.get(username=f'{PREFIX}-{"before" if connected else "after"}-0')
+        return self.timed([lambda: update_last_login(None, user)] * requests)
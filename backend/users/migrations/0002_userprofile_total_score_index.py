@@ -0,0 +1,40 @@
+# Generated by Django 5.2.7 on 2026-10-18 21:19
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+# Copied from users.models: migrations can't rely on the current code
+LEVELS = [(5000, 'Expert'), (2000, 'Advanced'), (500, 'Intermediate'), (0, 'Beginner')]
+
+
+def backfill_total_score(apps, schema_editor):
+    # total_score was never maintained: one point per percent of every attempt so far
+    User = apps.get_model(*settings.AUTH_USER_MODEL.split('.'))
+    UserProfile = apps.get_model('users', 'UserProfile')
+    QuizAttempt = apps.get_model('quizzes', 'QuizAttempt')
+    totals = {}
+    for user_id, score in QuizAttempt.objects.values_list('user_id', 'score').iterator():
+        totals[user_id] = totals.get(user_id, 0) + round(score)
+    for user_id in User.objects.filter(userprofile__isnull=True).values_list('id', flat=True):
+        UserProfile.objects.create(user_id=user_id)
+    for user_id, total in totals.items():
+        level = next(level for threshold, level in LEVELS if total >= threshold)
+        UserProfile.objects.filter(user_id=user_id).update(total_score=total, level=level)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0001_initial'),
+        ('quizzes', '0009_leaderboardentry'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='userprofile',
+            index=models.Index(fields=['-total_score'], name='profile_total_score_idx'),
+        ),
+        migrations.RunPython(backfill_total_score, migrations.RunPython.noop),
+    ]
@@ -1,12 +1,36 @@
 from django.db import models
 from django.contrib.auth.models import User
 
+# Lowest total_score of each level, highest first
+LEVELS = [
+ (5000, 'Expert'),
+ (2000, 'Advanced'),
+ (500, 'Intermediate'),
+ (0, 'Beginner'),
+]
+
+
+def level_for(total_score):
+ for threshold, level in LEVELS:
+  if total_score >= threshold:
+   return level
+ return LEVELS[-1][1]
+
+
 # Create your models here.
 class UserProfile(models.Model):
+ # Created on first use (the profile view, a user's first points), so signing
+ # up and saving a User never write here
  user = models.OneToOneField(User, on_delete=models.CASCADE)
+ # Points over all attempts, the rounded score of each (see quizzes.leaderboard)
  total_score = models.IntegerField(default=0)
  level = models.CharField(max_length=20, default='Beginner')
 
+ class Meta:
+  indexes = [
+   # Global leaderboard order
+   models.Index(fields=['-total_score'], name='profile_total_score_idx'),
+  ]
+
  def __str__(self):
   return self.user.username
- 
\ No newline at end of file
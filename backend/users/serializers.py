@@ -1,5 +1,7 @@
 from rest_framework import serializers
 from django.contrib.auth.models import User
+from rest_framework_simplejwt.serializers import TokenObtainPairSerializer
+from .authentication import ClaimsRefreshToken
 from .models import UserProfile
 
 class UserSerializer(serializers.ModelSerializer):
@@ -28,3 +30,8 @@ class RegisterSerializer(serializers.ModelSerializer):
 class LoginSerializer(serializers.Serializer):
     username = serializers.CharField()
     password = serializers.CharField()
+
+
+class ClaimsTokenObtainPairSerializer(TokenObtainPairSerializer):
+    # Tokens StatelessJWTAuthentication can authenticate without a query
+    token_class = ClaimsRefreshToken
@@ -1,3 +1,160 @@
-from django.test import TestCase
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import caches
+from django.contrib.auth.models import update_last_login
+from django.db import connection
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import AccessToken, RefreshToken
 
-# Create your tests here.
+from quizzes.models import Choice, Question, Quiz, QuizAttempt
+from .authentication import UserCache, get_user_cache
+from .models import UserProfile
+
+
+@override_settings(REST_FRAMEWORK={**settings.REST_FRAMEWORK, 'DEFAULT_THROTTLE_RATES': {'login': '2/min'}})
+class LoginThrottleTests(TestCase):
+    def setUp(self):
+        caches['throttle'].clear()
+        self.client = APIClient()
+        User.objects.create_user(username='alice', password='pass12345')
+
+    def test_login_attempts_are_limited_per_address(self):
+        statuses = [
+            self.client.post(reverse('login'), {'username': 'alice', 'password': 'wrong'}, format='json').status_code,
+            self.client.post(reverse('login'), {'username': 'bob', 'password': 'wrong'}, format='json').status_code,
+        ]
+        response = self.client.post(reverse('login'), {'username': 'alice', 'password': 'pass12345'}, format='json')
+        self.assertEqual(statuses, [401, 401])
+        self.assertEqual(response.status_code, 429)
+        self.assertAlmostEqual(int(response['Retry-After']), 30, delta=2)
+
+    def test_token_endpoint_shares_the_login_bucket(self):
+        for _ in range(2):
+            self.client.post(reverse('login'), {'username': 'alice', 'password': 'wrong'}, format='json')
+        response = self.client.post(reverse('token_obtain_pair'), {'username': 'alice', 'password': 'pass12345'}, format='json')
+        self.assertEqual(response.status_code, 429)
+
+
+class UserProfileTests(TestCase):
+    def setUp(self):
+        caches['throttle'].clear()
+        self.client = APIClient()
+
+    def test_registration_and_user_saves_do_not_write_profiles(self):
+        response = self.client.post(reverse('register'), {
+            'username': 'alice', 'email': 'alice@example.com', 'password': 'pass12345', 'password2': 'pass12345',
+        }, format='json')
+        self.assertEqual(response.status_code, 201)
+        user = User.objects.get(username='alice')
+        with CaptureQueriesContext(connection) as ctx:
+            update_last_login(None, user)
+        self.assertEqual(len(ctx.captured_queries), 1)
+        self.assertFalse(UserProfile.objects.exists())
+
+    def test_profile_is_created_on_first_read(self):
+        user = User.objects.create_user(username='alice', password='pass12345')
+        self.client.force_authenticate(user)
+        first = self.client.get(reverse('profile')).data
+        second = self.client.get(reverse('profile')).data
+        self.assertEqual((first['total_score'], first['level']), (0, 'Beginner'))
+        self.assertEqual(first, second)
+        self.assertEqual(UserProfile.objects.filter(user=user).count(), 1)
+
+
+class StatelessJWTAuthenticationTests(TestCase):
+    def setUp(self):
+        caches['throttle'].clear()
+        get_user_cache().clear()
+        self.client = APIClient()
+        self.user = User.objects.create_user(username='alice', password='pass12345')
+
+    def login(self):
+        response = self.client.post(reverse('login'), {'username': 'alice', 'password': 'pass12345'}, format='json')
+        return response.data['access']
+
+    def user_queries(self, method, url, token, **kwargs):
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {token}')
+        with CaptureQueriesContext(connection) as ctx:
+            response = getattr(self.client, method)(url, **kwargs)
+        return response, [q['sql'] for q in ctx.captured_queries if 'FROM "auth_user"' in q['sql']]
+
+    def test_issued_tokens_carry_the_claims(self):
+        claims = AccessToken(self.login())
+        self.assertEqual((claims['username'], claims['is_staff']), ('alice', False))
+        response = self.client.post(reverse('token_obtain_pair'), {'username': 'alice', 'password': 'pass12345'}, format='json')
+        refreshed = self.client.post(reverse('token_refresh'), {'refresh': response.data['refresh']}, format='json')
+        self.assertEqual(AccessToken(refreshed.data['access'])['username'], 'alice')
+
+    def test_submit_and_dashboard_do_not_load_the_user(self):
+        quiz = Quiz.objects.create(title='Quiz', description='')
+        question = Question.objects.create(quiz=quiz, text='Question')
+        choice = Choice.objects.create(question=question, text='Right', is_correct=True)
+        token = self.login()
+        answers = {'answers': [{'question': str(question.id), 'choice': str(choice.id)}]}
+        response, queries = self.user_queries('post', reverse('submit-quiz', args=[quiz.id]), token, data=answers, format='json')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(queries, [])
+        self.assertEqual(QuizAttempt.objects.get().user, self.user)
+        response, queries = self.user_queries('get', reverse('dashboard-stats'), token)
+        self.assertEqual((response.data['user_name'], response.data['total_attempts']), ('alice', 1))
+        self.assertEqual(queries, [])
+
+    def test_profile_reads_the_user_with_the_profile(self):
+        token = self.login()
+        self.user_queries('get', reverse('profile'), token)
+        response, queries = self.user_queries('get', reverse('profile'), token)
+        self.assertEqual(response.data['user']['username'], 'alice')
+        # Joined to the profile lookup, not loaded on its own
+        self.assertEqual(queries, [])
+
+    def test_tokens_without_claims_are_resolved_once(self):
+        token = str(RefreshToken.for_user(self.user).access_token)
+        _, first = self.user_queries('get', reverse('dashboard-stats'), token)
+        response, second = self.user_queries('get', reverse('dashboard-stats'), token)
+        self.assertEqual((len(first), len(second)), (1, 0))
+        self.assertEqual(response.data['user_name'], 'alice')
+
+    def test_tokens_without_claims_of_missing_or_inactive_users_fail(self):
+        token = str(RefreshToken.for_user(self.user).access_token)
+        User.objects.filter(pk=self.user.pk).update(is_active=False)
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {token}')
+        self.assertEqual(self.client.get(reverse('dashboard-stats')).status_code, 401)
+        self.user.delete()
+        self.assertEqual(self.client.get(reverse('dashboard-stats')).status_code, 401)
+        self.client.credentials()
+        self.assertEqual(self.client.get(reverse('dashboard-stats')).status_code, 401)
+
+    def test_user_cache_expires_and_stays_bounded(self):
+        now = [0]
+        users = UserCache(timeout=10, max_entries=2, clock=lambda: now[0])
+        users.set(1, ('alice', False))
+        users.set(2, ('bob', True))
+        users.set(3, ('carol', False))
+        self.assertEqual((users.get(1), users.get(2)), (None, ('bob', True)))
+        now[0] = 10
+        self.assertIsNone(users.get(3))
+
+
+class DeletedUserTokenTests(TransactionTestCase):
+    # Foreign keys can be checked at commit, which TestCase's transaction never reaches
+    def setUp(self):
+        caches['throttle'].clear()
+        self.client = APIClient()
+        user = User.objects.create_user(username='alice', password='pass12345')
+        response = self.client.post(reverse('login'), {'username': 'alice', 'password': 'pass12345'}, format='json')
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {response.data['access']}")
+        user.delete()
+
+    def test_writes_for_a_deleted_user_fail_authentication(self):
+        quiz = Quiz.objects.create(title='Quiz', description='')
+        question = Question.objects.create(quiz=quiz, text='Question')
+        choice = Choice.objects.create(question=question, text='Right', is_correct=True)
+        answers = {'answers': [{'question': str(question.id), 'choice': str(choice.id)}]}
+        response = self.client.post(reverse('submit-quiz', args=[quiz.id]), answers, format='json')
+        self.assertEqual(response.status_code, 401)
+        self.assertFalse(QuizAttempt.objects.exists())
+        self.assertEqual(self.client.get(reverse('profile')).status_code, 401)
+        self.assertFalse(UserProfile.objects.exists())
@@ -1,4 +1,5 @@
 from django.urls import path
+from quiz_platform.throttling import LoginThrottle
 from .views import RegisterView, LoginView, UserProfileView
 from rest_framework_simplejwt.views import (
     TokenObtainPairView,
@@ -9,6 +10,6 @@ urlpatterns = [
  path('register/', RegisterView.as_view(), name='register'),
  path('login/', LoginView.as_view(), name='login'),
  path('profile/', UserProfileView.as_view(), name='profile'),
- path('api/token/', TokenObtainPairView.as_view(), name='token_obtain_pair'),
+ path('api/token/', TokenObtainPairView.as_view(throttle_classes=[LoginThrottle]), name='token_obtain_pair'),
  path('api/token/refresh/', TokenRefreshView.as_view(), name='token_refresh'),
 ]
\ No newline at end of file
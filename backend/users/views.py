@@ -3,8 +3,10 @@ from django.contrib.auth import authenticate
 from rest_framework import status, permissions
 from rest_framework.response import Response
 from rest_framework.views import APIView
-from rest_framework_simplejwt.tokens import RefreshToken
-from django.shortcuts import get_object_or_404
+
+from quiz_platform.throttling import LoginThrottle
+
+from .authentication import ClaimsRefreshToken, StatelessJWTAuthentication, user_must_exist
 
 from .serializers import RegisterSerializer, LoginSerializer, UserSerializer, UserProfileSerializer
 from .models import UserProfile
@@ -36,6 +38,8 @@ class RegisterView(APIView):
 
 
 class LoginView(APIView):
+    throttle_classes = [LoginThrottle]
+
     def post(self, request):
         serializer = LoginSerializer(data=request.data)
         if not serializer.is_valid():
@@ -48,7 +52,7 @@ class LoginView(APIView):
         if not user:
             return Response({'error': 'Invalid credentials'}, status=status.HTTP_401_UNAUTHORIZED)
 
-        refresh = RefreshToken.for_user(user)
+        refresh = ClaimsRefreshToken.for_user(user)
 
         return Response({
             'refresh': str(refresh),
@@ -59,10 +63,14 @@ class LoginView(APIView):
 
 
 class UserProfileView(APIView):
+    authentication_classes = [StatelessJWTAuthentication]
     permission_classes = [permissions.IsAuthenticated]
 
     def get(self, request):
         user = request.user
-        profile = get_object_or_404(UserProfile, user=user)
+        # Profiles are created on first use, not with every user. The User row
+        # comes joined, since request.user is only the token's claims
+        with user_must_exist(user):
+            profile, _ = UserProfile.objects.select_related('user').get_or_create(user_id=user.pk)
         serializer = UserProfileSerializer(profile)
         return Response(serializer.data, status=status.HTTP_200_OK)
@@ -7,6 +7,7 @@ const CreateQuiz = () => {
   const [formData, setFormData] = useState({ topic: '', num_questions: '' });
   const [loading, setLoading] = useState(false);
   const [error, setError] = useState(null);
+  const [generated, setGenerated] = useState(0);
   
   const navigate = useNavigate();
 
@@ -20,13 +21,16 @@ const CreateQuiz = () => {
   const handleSubmit = async (e) => {
     e.preventDefault();
     setLoading(true);
-    setError(null);    
+    setError(null);
+    setGenerated(0);
     try {
-      const quiz = await api.generateQuiz({
+      const { quiz_id } = await api.generateQuizStream({
         topic: formData.topic,
         num_questions: Number(formData.num_questions) || 5,
+      }, (event) => {
+        if (event === 'question') setGenerated((count) => count + 1);
       });
-      navigate(`/quiz/${quiz.id}`);
+      navigate(`/quiz/${quiz_id}`);
     } catch (err) {
       setError(err.message || 'Failed to generate quiz');
     } finally {
@@ -122,7 +126,9 @@ const CreateQuiz = () => {
                   {loading ? (
                     <>
                       <div className="animate-spin  h-5 w-5 border-2 border-white border-t-transparent rounded-full"></div>
-                      <span>Generating...</span>
+                      <span>
+                        {generated > 0 ? `Generating... ${generated} question${generated === 1 ? '' : 's'} ready` : 'Generating...'}
+                      </span>
                     </>
                   ) : (
                     <>
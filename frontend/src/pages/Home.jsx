@@ -13,7 +13,7 @@ const Home = () => {
   const [loading, setLoading] = useState(true);
   const [error, setError] = useState(null);
   const { isAuthenticated } = useAuth();
-  const fetchQuizzes = async (url = '/quizzes/') => {
+  const fetchQuizzes = async (url = '/quizzes/?mode=catalog') => {
       try {
         setLoading(true);
         const data = await api.getQuizzes(url);
@@ -145,7 +145,7 @@ const Home = () => {
           <button onClick={() => fetchQuizzes(pagination.previous)} className='bg-rose-100 text-rose-600 hover:bg-rose-200 transition-colors cursor-pointer p-2 rounded-md'>Previous</button>
           )}
           {Array.from({ length: pagination.totalPages }).map((_, i) => (
-            <button key={i} onClick={() => fetchQuizzes(`/quizzes/?page=${i + 1}`)} className={`bg-rose-${currentPage === i + 1 ? "300" : "100"} text-rose-600 hover:bg-rose-200 transition-colors cursor-pointer p-2 rounded-md`}>
+            <button key={i} onClick={() => fetchQuizzes(`/quizzes/?mode=catalog&page=${i + 1}`)} className={`bg-rose-${currentPage === i + 1 ? "300" : "100"} text-rose-600 hover:bg-rose-200 transition-colors cursor-pointer p-2 rounded-md`}>
               {i + 1}
             </button>
           ))}
@@ -161,7 +161,7 @@ const Home = () => {
 
 const QuizCard = ({ quiz }) => {
   const { isAuthenticated } = useAuth();
-  const questionCount = quiz.questions?.length || 0;
+  const questionCount = quiz.question_count ?? quiz.questions?.length ?? 0;
 
   return (
     <div className="bg-white rounded-xl shadow-lg hover:shadow-xl transition-shadow duration-300 overflow-hidden">
@@ -26,12 +26,13 @@ class ApiService {
       url = `${this.baseURL}${endpoint}`;
     }
     
+    // Headers passed in are added to the defaults, not swapped for them
     const config = {
+      ...options,
       headers: {
         'Content-Type': 'application/json',
         ...options.headers,
       },
-      ...options,
     };
 
     if (this.token) {
@@ -157,6 +158,34 @@ class ApiService {
     });
     return response.json();
   }
+  // Streams generation as server-sent events, calling onEvent(event, data) for
+  // each quiz/question/done/error event; resolves with the done event's data
+  async generateQuizStream(payload, onEvent) {
+    const response = await this.request('/quizzes/generate-quiz/stream/', {
+      method: 'POST',
+      headers: { Accept: 'text/event-stream' },
+      body: JSON.stringify(payload),
+    });
+    const reader = response.body.pipeThrough(new TextDecoderStream()).getReader();
+    let buffer = '';
+    for (;;) {
+      const { value, done } = await reader.read();
+      if (done) break;
+      buffer += value;
+      let end;
+      while ((end = buffer.indexOf('\n\n')) !== -1) {
+        const block = buffer.slice(0, end);
+        buffer = buffer.slice(end + 2);
+        const event = block.match(/^event: (.*)$/m)?.[1];
+        const data = JSON.parse(block.match(/^data: (.*)$/m)?.[1] ?? 'null');
+        if (event === 'error') throw new Error(data?.error || 'Failed to generate quiz');
+        onEvent?.(event, data);
+        if (event === 'done') return data;
+      }
+    }
+    throw new Error('Quiz generation ended unexpectedly');
+  }
+
   async dashboardData(){
     const response = await this.request('/quizzes/dashboard/stats/')
     return response.json();